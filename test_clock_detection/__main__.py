@@ -1,74 +1,167 @@
+import argparse
+import functools
+import itertools
 import multiprocessing
 import os
-import shutil
-from concurrent.futures.thread import ThreadPoolExecutor
-from datetime import datetime
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import asdict, replace
+from datetime import timedelta
 from pathlib import Path
+from typing import Any, TypeVar
 
-from test_clock_detection.algorithm_debugger import AlgorithmDebugger
+from test_clock_detection.algorithm_debugger import DebugLevel, DebugSettings
 from test_clock_detection.const import (
+    BATCH_SIZE,
     CALCULATED_ERRORS,
+    EXECUTOR_BACKEND,
+    EXECUTOR_BACKENDS,
+    EXECUTOR_CHUNKSIZE,
     FAIL_DELTA_THRESHOLD_SECONDS,
     PHOTO_EXTENSION,
+    PIPELINE_PREFETCH_THREADS,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_WRITER_THREADS,
+    RESULT_IMAGE_NAME,
+    RESULTS_FILE_NAME,
+    RESULTS_FLUSH_EVERY,
+    SAVE_FINAL_IMAGES,
+    SAVE_RUN_HISTORY,
+    USE_RESULT_CACHE,
+    ExecutorBackend,
 )
-from test_clock_detection.data_types import DetectTimeResult
-from test_clock_detection.detect_time import detect_time
-from test_clock_detection.result_analysis import create_report_of_test
-from test_clock_detection.utils import check_result
+from test_clock_detection.data_types import ImageTestResult
+from test_clock_detection.detect_time import DEFAULT_DETECT_PARAMS
+from test_clock_detection.frame_archive import open_frame_archive
+from test_clock_detection.pipeline import Pipeline, PipelineStage, print_pipeline_metrics
+from test_clock_detection.pipeline_stages import (
+    TestFrame,
+    detect_frames,
+    prefetch_archive,
+    prefetch_images,
+    write_results,
+)
+from test_clock_detection.result_analysis import (
+    ErrorSketch,
+    create_report_of_test,
+    save_stage_timings,
+)
+from test_clock_detection.result_cache import ResultCache
+from test_clock_detection.results_store import ResultsStore, read_results
+from test_clock_detection.run_history import RunHistory, summarize_run
+from test_clock_detection.sharding import Shard
 
+_T = TypeVar('_T')
 
-def _run_test_image(
-    root_folder: Path,
-    image_path: Path,
-    folder_for_results: Path,
-    debug_folder: Path,
-    fail_threshold_seconds: float,
-) -> None:
-    """
-    Запускает тестирование алгоритма определения времени для 1 изображения. Сохраняет результат в
-    директорию *files/Результат/Результаты*.
-    Выводит в консоль имя файла и получившуюся погрешность при определении времени алгоритмом.
 
-    :param root_folder: корневая папка проекта
-    :param image_path: путь до изображения
-    :param folder_for_results: путь для сохранения промежуточных этапов алгоритма только для
-    тестируемого изображения
-    :param debug_folder: путь до общей папки для сохранения итогового результата
-    :param fail_threshold_seconds: максимальное отклонение от реального значения, после которого
-      определение времени считается неудачным. Задается в секундах
-    :return:
-    """
+class _ProgressMeter:
+    """Скорость тестирования и оценка оставшегося времени"""
 
-    debug_folder_for_image = debug_folder / image_path.stem
-    debug_folder_for_image.mkdir(parents=True, exist_ok=True)
+    def __init__(self, total: int | None = None) -> None:
+        """
+        :param total: количество изображений, None - неизвестно до подсчета
+        """
+        self.total = total
+        """Количество изображений, None - еще не подсчитано"""
+        self.start_time = time.perf_counter()
+        """Время начала тестирования"""
 
-    debugger = AlgorithmDebugger(debug_folder_for_image)
-    result_time = detect_time(root_folder, image_path, debugger)
+    def count_in_background(self, image_paths: Iterable[Path]) -> None:
+        """
+        Подсчитывает изображения в фоновом потоке, чтобы подсчет не откладывал начало обработки.
+        Пока подсчет не закончен, выводится только скорость
 
-    result_time_dt = datetime.strptime(str(result_time), '%H:%M:%S.%f')
-    excepted_time_24h = datetime.strptime(image_path.stem, '%H:%M:%S.%f')
-    excepted_time_dt = datetime.strptime(excepted_time_24h.strftime('%I:%M:%S.%f'), '%I:%M:%S.%f')
+        :param image_paths: пути до изображений, обычно генератор, который читает каталог
+        :return:
+        """
 
-    delta_sec, success_detection = check_result(
-        excepted_time_dt, result_time_dt, fail_threshold_seconds
-    )
+        def count() -> None:
+            self.total = sum(1 for _ in image_paths)
+
+        threading.Thread(target=count, name='Подсчет изображений', daemon=True).start()
 
-    result = DetectTimeResult(
-        success_detection, delta_sec, result_time_dt, excepted_time_dt
-    ).to_str()
+    def describe(self, count_done: int) -> str:
+        """
+        :param count_done: количество обработанных изображений
+        :return: строка со скоростью, а если количество изображений известно - с долей
+          обработанных и оставшимся временем
+        """
+        elapsed_sec = time.perf_counter() - self.start_time
+        rate = count_done / elapsed_sec if elapsed_sec > 0 else 0
+        text = f'{rate:.1f} изобр./с'
+        if self.total is None or self.total == 0 or rate == 0:
+            return text
+        remaining_sec = max(self.total - count_done, 0) / rate
+        return (
+            f'{count_done / self.total * 100:.1f} % из {self.total}, {text}, '
+            f'осталось {timedelta(seconds=round(remaining_sec))}'
+        )
 
-    result_algorithm_image_path = debugger.get_image_path('Линия из центра изображения')
-    result_test_image_path = Path(f'{folder_for_results}/{result}.{PHOTO_EXTENSION}')
-    shutil.copy(result_algorithm_image_path, result_test_image_path)
-    print(f'{image_path.stem} : погрешность - {delta_sec}')
 
+def _scan_images(
+    image_folder: Path, shard: Shard | None = None, image_extension: str = PHOTO_EXTENSION
+) -> Iterator[Path]:
+    """
+    Перебирает изображения папки по мере чтения каталога, не составляя список всех файлов
 
-def run_tests(root_folder: Path) -> None:
+    :param image_folder: папка с изображениями
+    :param shard: часть набора изображений, None - все изображения
+    :param image_extension: расширение изображений
+    :return: пути до изображений в порядке каталога
+    """
+    suffix = f'.{image_extension}'
+    with os.scandir(image_folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith(suffix) or entry.name.startswith('.'):
+                continue
+            image_path = Path(entry.path)
+            if entry.is_file() and (shard is None or shard.contains(image_path.stem)):
+                yield image_path
+
+
+def _split_into_parts(items: Iterable[_T], part_size: int) -> Iterator[list[_T]]:
+    """
+    Делит изображения на части по мере их перебора
+
+    :param items: пути до изображений или номера кадров, может быть генератором
+    :param part_size: количество изображений в части
+    :return: части, последняя может быть меньше
+    """
+    iterator = iter(items)
+    while part := list(itertools.islice(iterator, part_size)):
+        yield part
+
+
+def run_tests(
+    root_folder: Path,
+    backend: ExecutorBackend = EXECUTOR_BACKEND,
+    jobs: int | None = None,
+    chunksize: int = EXECUTOR_CHUNKSIZE,
+    batch_size: int = BATCH_SIZE,
+    debug_settings: DebugSettings | None = None,
+    timings_path: Path | None = None,
+    save_final_images: bool = SAVE_FINAL_IMAGES,
+    use_cache: bool = USE_RESULT_CACHE,
+    archive_folder: Path | None = None,
+    prefetch_threads: int = PIPELINE_PREFETCH_THREADS,
+    writer_threads: int = PIPELINE_WRITER_THREADS,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    shard: Shard | None = None,
+    save_history: bool = SAVE_RUN_HISTORY,
+    results_folder: Path | None = None,
+) -> None:
     """
     Запускает тестирование алгоритма определения времени по всем изображения, которые находятся в
     указанной директории.
+    Изображения обрабатываются конвейером из трех этапов со своими исполнителями: потоки чтения
+    изображений с диска, алгоритм в пуле потоков или процессов и потоки записи результатов.
+    Поэтому диск и процессор заняты одновременно, а после тестирования выводится занятость
+    этапов и длины очередей между ними.
     Результаты различных этапов алгоритма каждого изображения находятся в папке:
     *files/Результат/Имя тестируемого изображения*
+    Результаты тестирования всех изображений записываются по мере готовности в хранилище
+    *files/Результат/Результаты.jsonl*, по которому строится отчет.
     Итоговый результат алгоритма по всех изображениям находится в папке:
     *files/Результат/Окончательные*
 
@@ -80,39 +173,322 @@ def run_tests(root_folder: Path) -> None:
     В результате тестирования в консоли будет выведена таблица, содержащая столбцы: погрешность,
     процент изображений, уложившихся в погрешность и количество изображений, не уложившихся в
     погрешность
+
+    :param root_folder: корневая папка проекта
+    :param backend: способ выполнения алгоритма. При *serial* все этапы выполняются
+      последовательно в текущем потоке
+    :param jobs: количество рабочих потоков или процессов алгоритма, по умолчанию - количество
+      ядер
+    :param chunksize: количество изображений в части, которая передается между этапами, если
+      изображения обрабатываются по одному
+    :param batch_size: количество изображений, обрабатываемых одним вызовом
+      ``detect_time_batch``. При значении 0 каждое изображение обрабатывается отдельно
+    :param debug_settings: настройки сохранения промежуточных результатов. Если сохраняются
+      итоговые изображения, итоговое изображение алгоритма сохраняется всегда, так как оно
+      копируется в папку с окончательными результатами
+    :param timings_path: путь до JSON файла для сохранения времени выполнения этапов алгоритма
+      для каждого изображения. Если не задан, время выводится только в консоль
+    :param save_final_images: сохранять итоговые изображения алгоритма в папку с окончательными
+      результатами
+    :param use_cache: использовать кэш результатов *files/Кэш результатов*. Для изображений,
+      результаты которых взяты из кэша, промежуточные и итоговые изображения не сохраняются
+    :param archive_folder: папка архива кадров (см. **frame_archive.py**). Если задана, кадры
+      берутся из архива, а не из папки с изображениями
+    :param prefetch_threads: количество потоков чтения изображений
+    :param writer_threads: количество потоков записи результатов
+    :param queue_size: максимальное количество частей в очереди перед каждым этапом
+    :param shard: часть набора изображений для тестирования на нескольких машинах. Результаты
+      части записываются в отдельное хранилище, которые затем объединяются командой
+      ``python -m test_clock_detection.sharding merge``
+    :param save_history: дописать сводку запуска в историю *files/История запусков*, запуски
+      сравниваются командой ``python -m test_clock_detection.run_history compare``
+    :param results_folder: папка для результатов тестирования вместо *files/Результаты*
     """
 
     data_folder = root_folder / 'files'
     input_photos_folder = data_folder / 'Изображения'
-    results_by_steps_folder = data_folder / 'Результаты' / 'По шагам'
-    final_results_folder = data_folder / 'Результаты' / 'Окончательные'
+    results_folder = results_folder or data_folder / 'Результаты'
+    results_by_steps_folder = results_folder / 'По шагам'
+    results_path = results_folder / (shard.results_file_name if shard else RESULTS_FILE_NAME)
+    cache_folder = data_folder / 'Кэш результатов' if use_cache else None
 
     results_by_steps_folder.mkdir(parents=True, exist_ok=True)
-    final_results_folder.mkdir(parents=True, exist_ok=True)
+    final_results_folder: Path | None = None
+    if save_final_images:
+        final_results_folder = results_folder / 'Окончательные'
+        final_results_folder.mkdir(parents=True, exist_ok=True)
+
+    if debug_settings is None:
+        debug_settings = DebugSettings()
+    if save_final_images and debug_settings.stages is not None:
+        debug_settings = replace(debug_settings, stages=debug_settings.stages | {RESULT_IMAGE_NAME})
+
+    part_size = batch_size if batch_size > 0 else chunksize
+    parts: Iterable[Any]
+    prefetch: Callable[[Any], list[TestFrame]]
+    dial = None
+    if archive_folder is not None:
+        archive = open_frame_archive(archive_folder)
+        assert len(archive) > 0, f'В архиве {archive_folder} нет кадров'
+        frame_indices = [
+            index
+            for index, name in enumerate(archive.names)
+            if shard is None or shard.contains(name)
+        ]
+        parts = _split_into_parts(frame_indices, part_size)
+        prefetch = functools.partial(prefetch_archive, archive_folder, cache_folder)
+        dial = archive.dial
+        progress = _ProgressMeter(len(frame_indices))
+    else:
+        # Каталог читается по мере обработки, а в очередях конвейера ограниченное количество
+        # частей, поэтому память не зависит от количества изображений
+        assert (
+            next(_scan_images(input_photos_folder), None) is not None
+        ), f'В папке {input_photos_folder} нет изображений с расширением .{PHOTO_EXTENSION}'
+        parts = _split_into_parts(_scan_images(input_photos_folder, shard), part_size)
+        prefetch = functools.partial(prefetch_images, cache_folder=cache_folder)
+        progress = _ProgressMeter()
+        progress.count_in_background(_scan_images(input_photos_folder, shard))
+
+    pipeline = Pipeline(
+        [
+            PipelineStage('Чтение', prefetch, prefetch_threads),
+            PipelineStage(
+                'Алгоритм',
+                functools.partial(
+                    detect_frames,
+                    debug_folder=results_by_steps_folder,
+                    debug_settings=debug_settings,
+                    batch=batch_size > 0,
+                    dial=dial,
+                    archive_folder=archive_folder,
+                    write_debug=backend == 'process',
+                ),
+                jobs if jobs is not None else multiprocessing.cpu_count(),
+                'process' if backend == 'process' else 'thread',
+            ),
+            PipelineStage(
+                'Запись',
+                functools.partial(
+                    write_results,
+                    folder_for_results=final_results_folder,
+                    fail_threshold_seconds=FAIL_DELTA_THRESHOLD_SECONDS,
+                    cache_folder=cache_folder,
+                ),
+                writer_threads,
+            ),
+        ],
+        queue_size,
+        serial=backend == 'serial',
+    )
+    count_results = _store_results(
+        itertools.chain.from_iterable(pipeline.run(parts)), results_path, progress
+    )
+    print_pipeline_metrics(pipeline)
+
+    if cache_folder is not None:
+        ResultCache(cache_folder).evict()
+    if count_results == 0:
+        # При малом наборе изображений в часть может не попасть ни одного изображения, пустое
+        # хранилище части все равно записывается, чтобы объединение нашло все части
+        if shard is not None:
+            print(f'В часть {shard} не попало ни одного изображения')
+        return
+    create_report_of_test(results_path, CALCULATED_ERRORS)
+    if save_history:
+        parameters = {
+            'backend': backend,
+            'jobs': jobs if jobs is not None else multiprocessing.cpu_count(),
+            'chunksize': chunksize,
+            'batch_size': batch_size,
+            'debug_level': debug_settings.max_level.name.lower(),
+            'debug_stages': sorted(debug_settings.stages) if debug_settings.stages else None,
+            'save_final_images': save_final_images,
+            'use_cache': use_cache,
+            'archive': str(archive_folder) if archive_folder is not None else None,
+            'shard': str(shard) if shard is not None else None,
+            **asdict(DEFAULT_DETECT_PARAMS),
+        }
+        summary, image_errors = summarize_run(
+            results_path, pipeline.wall_ms / 1000, parameters, root_folder
+        )
+        RunHistory(data_folder / 'История запусков').append(summary, image_errors)
+        print(f'Запуск {summary.run_id} сохранен в историю, {summary.images_per_sec:.2f} изобр./с')
+    if timings_path is not None:
+        save_stage_timings(timings_path, read_results(results_path))
 
-    args_list = []
-    for image_path in input_photos_folder.glob(f'*.{PHOTO_EXTENSION}'):
-        args_list.append((
-            root_folder,
-            image_path,
-            final_results_folder,
-            results_by_steps_folder,
-            FAIL_DELTA_THRESHOLD_SECONDS,
-        ))
 
-    assert (
-        len(args_list) > 0
-    ), f'В папке {input_photos_folder} нет изображений с расширением .{PHOTO_EXTENSION}'
+def _store_results(
+    test_results: Iterable[ImageTestResult], results_path: Path, progress: _ProgressMeter
+) -> int:
+    """
+    Записывает результаты тестирования в хранилище по мере их готовности и выводит их в консоль
+    вместе с промежуточной статистикой
+
+    :param test_results: результаты тестирования изображений, может быть генератором
+    :param results_path: путь до файла хранилища результатов
+    :param progress: скорость тестирования для вывода оставшегося времени
+    :return: количество результатов
+    """
+    error_sketch = ErrorSketch()
+    with ResultsStore(results_path) as results_store:
+        for test_result in test_results:
+            print(f'{test_result.image_name} : погрешность - {test_result.detect_result.error_sec}')
+            results_store.append(test_result)
+            error_sketch.add(test_result.detect_result.error_sec)
+            if error_sketch.count % RESULTS_FLUSH_EVERY == 0:
+                _print_progress(error_sketch, progress)
+    if error_sketch.count % RESULTS_FLUSH_EVERY != 0:
+        _print_progress(error_sketch, progress)
+    return error_sketch.count
+
 
-    with ThreadPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-        executor.map(_run_test_image, *zip(*args_list, strict=False))
+def _print_progress(error_sketch: ErrorSketch, progress: _ProgressMeter) -> None:
+    """
+    Выводит в консоль промежуточную статистику по уже обработанным изображениям
 
-    create_report_of_test(final_results_folder, CALCULATED_ERRORS)
+    :param error_sketch: гистограмма погрешностей обработанных изображений
+    :param progress: скорость тестирования
+    :return:
+    """
+    count_success = error_sketch.count_within(FAIL_DELTA_THRESHOLD_SECONDS)
+    print(
+        f'Обработано изображений: {error_sketch.count} ({progress.describe(error_sketch.count)}), '
+        f'уложилось в {FAIL_DELTA_THRESHOLD_SECONDS} c.: '
+        f'{count_success / error_sketch.count * 100:.2f} %'
+    )
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Тестирование алгоритма определения времени')
+    parser.add_argument(
+        '--backend',
+        choices=EXECUTOR_BACKENDS,
+        default=EXECUTOR_BACKEND,
+        help='способ параллельной обработки изображений',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help='количество рабочих потоков или процессов, по умолчанию - количество ядер',
+    )
+    parser.add_argument(
+        '--chunksize',
+        type=int,
+        default=EXECUTOR_CHUNKSIZE,
+        help='количество изображений в части, передаваемой между этапами, при обработке по одному',
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=BATCH_SIZE,
+        help='количество изображений, обрабатываемых за один вызов, 0 - по одному',
+    )
+    parser.add_argument(
+        '--debug-format',
+        default=DebugSettings.image_extension,
+        help='расширение (формат) промежуточных и окончательных изображений, например bmp или png',
+    )
+    parser.add_argument(
+        '--debug-stage',
+        action='append',
+        default=None,
+        help='имя сохраняемого промежуточного изображения, можно указать несколько раз. '
+        'По умолчанию сохраняются все',
+    )
+    parser.add_argument(
+        '--debug-level',
+        choices=[level.name.lower() for level in DebugLevel],
+        default=DebugLevel.DETAIL.name.lower(),
+        help='максимальный уровень подробности промежуточных изображений',
+    )
+    parser.add_argument(
+        '--no-final-images',
+        action='store_true',
+        help='не сохранять итоговые изображения в папку с окончательными результатами',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='обработать все изображения заново, не используя кэш результатов',
+    )
+    parser.add_argument(
+        '--archive',
+        type=Path,
+        default=None,
+        help='папка архива кадров, из которого берутся кадры вместо папки с изображениями',
+    )
+    parser.add_argument(
+        '--prefetch-threads',
+        type=int,
+        default=PIPELINE_PREFETCH_THREADS,
+        help='количество потоков чтения изображений',
+    )
+    parser.add_argument(
+        '--writer-threads',
+        type=int,
+        default=PIPELINE_WRITER_THREADS,
+        help='количество потоков записи результатов',
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=PIPELINE_QUEUE_SIZE,
+        help='максимальное количество частей изображений в очереди перед каждым этапом',
+    )
+    parser.add_argument(
+        '--shard',
+        type=Shard.parse,
+        default=None,
+        help='часть набора изображений в формате номер/количество, например 1/4. Результаты '
+        'частей объединяются командой python -m test_clock_detection.sharding merge',
+    )
+    parser.add_argument(
+        '--results-folder',
+        type=Path,
+        default=None,
+        help='папка для результатов тестирования, по умолчанию files/Результаты',
+    )
+    parser.add_argument(
+        '--no-history', action='store_true', help='не сохранять сводку запуска в историю запусков'
+    )
+    parser.add_argument(
+        '--timings-json',
+        type=Path,
+        default=None,
+        help='путь до JSON файла для сохранения времени выполнения этапов алгоритма',
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
+    args = _parse_args()
     repo_root = Path(os.path.abspath(__file__)).parent.parent
-    run_tests(repo_root)
+    debug_settings = DebugSettings(
+        image_extension=args.debug_format,
+        stages=frozenset(args.debug_stage) if args.debug_stage is not None else None,
+        max_level=DebugLevel[args.debug_level.upper()],
+    )
+    run_tests(
+        repo_root,
+        args.backend,
+        args.jobs,
+        args.chunksize,
+        args.batch_size,
+        debug_settings,
+        args.timings_json,
+        not args.no_final_images,
+        not args.no_cache,
+        args.archive,
+        args.prefetch_threads,
+        args.writer_threads,
+        args.queue_size,
+        args.shard,
+        not args.no_history,
+        args.results_folder,
+    )
 
 
 if __name__ == '__main__':
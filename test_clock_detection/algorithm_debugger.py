@@ -1,86 +1,235 @@
+import os
+import shutil
+import time
 from abc import ABC, abstractmethod
+from collections.abc import Callable, Collection, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import IntEnum
 from pathlib import Path
 
 import cv2
 from cv2.typing import MatLike
 
-from test_clock_detection.const import PHOTO_EXTENSION
-from test_clock_detection.data_types import Line
+from test_clock_detection.const import DEBUG_IMAGE_EXTENSION, PHOTO_EXTENSION
+from test_clock_detection.data_types import Line, StageTiming
+from test_clock_detection.debug_writer import get_debug_image_writer
 from test_clock_detection.draw_image import draw_line
 from test_clock_detection.utils import polar_to_cartesian
 
 
+class DebugLevel(IntEnum):
+    """
+    Уровни подробности промежуточных результатов
+    """
+
+    RESULT = 0
+    """Итоговый результат алгоритма"""
+    STAGE = 1
+    """Основные этапы обработки изображения"""
+    DETAIL = 2
+    """Подробные промежуточные данные"""
+
+
+ImageSource = MatLike | Callable[[], MatLike]
+"""Изображение или функция, создающая изображение только при его сохранении"""
+
+DEBUG_SAVE_STAGE_NAME = 'Сохранение отладки'
+"""Имя этапа, в который записывается время сохранения промежуточных результатов"""
+
+DEBUG_FLUSH_STAGE_NAME = 'Ожидание записи отладки'
+"""Имя этапа, в который записывается время ожидания фоновой записи промежуточных результатов"""
+
+
+@contextmanager
+def measure_time() -> Iterator[StageTiming]:
+    """
+    Измеряет астрономическое и процессорное время выполнения блока кода. Процессорное время
+    считается только для текущего потока, поэтому не зависит от параллельно работающих потоков
+
+    :return: время выполнения блока, заполняется при выходе из блока
+    """
+    timing = StageTiming(calls=1)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield timing
+    finally:
+        timing.wall_ms = (time.perf_counter() - wall_start) * 1000
+        timing.cpu_ms = (time.thread_time() - cpu_start) * 1000
+
+
 class Debugger(ABC):
     """
     Абстрактный класс для отладчиков
     """
 
     @abstractmethod
-    def save_image(self, image_name: str, image: MatLike) -> None:
+    def save_image(
+        self, image_name: str, image: ImageSource, level: DebugLevel = DebugLevel.STAGE
+    ) -> None:
         pass
 
     @abstractmethod
-    def save_image_with_lines(self, image_name: str, image: MatLike, lines: list[Line]) -> None:
+    def save_image_with_lines(
+        self,
+        image_name: str,
+        image: ImageSource,
+        lines: list[Line],
+        level: DebugLevel = DebugLevel.STAGE,
+    ) -> None:
         pass
 
     @abstractmethod
     def get_debug_folder(self) -> Path:
         pass
 
+    @abstractmethod
+    def add_stage_time(self, stage_name: str, timing: StageTiming) -> None:
+        pass
+
+    @contextmanager
+    def measure_stage(self, stage_name: str) -> Iterator[None]:
+        """
+        Измеряет время выполнения этапа алгоритма. Этапы не должны быть вложены друг в друга,
+        иначе время вложенного этапа будет учтено дважды
+
+        :param stage_name: имя этапа
+        :return:
+        """
+        with measure_time() as timing:
+            yield
+        self.add_stage_time(stage_name, timing)
+
 
 class AlgorithmDebugger(Debugger):
     """
     Класс для отладки алгоритма
     """
 
-    def __init__(self, debug_folder: Path) -> None:
+    def __init__(
+        self,
+        debug_folder: Path,
+        image_extension: str = PHOTO_EXTENSION,
+        stages: Collection[str] | None = None,
+        max_level: DebugLevel = DebugLevel.DETAIL,
+    ) -> None:
         self.debug_folder = debug_folder
         """Путь до отладочной директории"""
+        self.image_extension = image_extension
+        """Расширение (формат) сохраняемых изображений"""
+        self.stages = frozenset(stages) if stages is not None else None
+        """Имена сохраняемых изображений, None - сохраняются все"""
+        self.max_level = max_level
+        """Максимальный уровень подробности сохраняемых изображений"""
         self.count_files_in_folder = 0
         """Количество сохраненных изображений в директории отладки"""
         self.image_names: dict[str, str] = {}
         """Словарь с именем изображения и его номером"""
+        self.stage_timings: dict[str, StageTiming] = {}
+        """Время выполнения этапов алгоритма по их именам"""
+        self.result_lines: list[Line] = []
+        """Линии, переданные с итоговым изображением алгоритма"""
+
+    def is_enabled(self, image_name: str, level: DebugLevel) -> bool:
+        """
+        Проверяет, нужно ли сохранять изображение
+
+        :param image_name: имя изображения
+        :param level: уровень подробности изображения
+        :return: True, если изображение сохраняется
+        """
+        if level > self.max_level:
+            return False
+        return self.stages is None or image_name in self.stages
 
-    def save_image(self, image_name: str, image: MatLike) -> None:
+    def save_image(
+        self, image_name: str, image: ImageSource, level: DebugLevel = DebugLevel.STAGE
+    ) -> None:
         """
         Сохранение изображения с заданным именем в директорию для отладки
 
-        :param image: изображение
+        :param image: изображение или функция, создающая изображение. Функция вызывается, только
+          если изображение сохраняется
         :param image_name: имя изображения
+        :param level: уровень подробности изображения
         :return:
         """
+        if not self.is_enabled(image_name, level):
+            return
         assert image_name not in self.image_names, f'Файл {image_name} уже был сохранен'
-        image_path = self._make_image_path(image_name)
-        cv2.imwrite(image_path.as_posix(), image)
+        with self.measure_stage(DEBUG_SAVE_STAGE_NAME):
+            image_path = self._make_image_path(image_name)
+            self._write_image(image_name, image_path, _resolve_image(image))
         self.count_files_in_folder += 1
 
-    def save_image_with_lines(self, image_name: str, image: MatLike, lines: list[Line]) -> None:
+    def save_image_with_lines(
+        self,
+        image_name: str,
+        image: ImageSource,
+        lines: list[Line],
+        level: DebugLevel = DebugLevel.STAGE,
+    ) -> None:
         """
         Сохраняет изображение с выделенными контурами шаблонов и линий
 
-        :param image: изображение
+        :param image: изображение или функция, создающая изображение. Функция вызывается, только
+          если изображение сохраняется
         :param lines:
         :param image_name: имя изображения
+        :param level: уровень подробности изображения. Линии итогового изображения запоминаются
+          в ``result_lines``, даже если само изображение не сохраняется
         :return: изображение
         """
+        if level == DebugLevel.RESULT:
+            self.result_lines = lines
+        if not self.is_enabled(image_name, level):
+            return
         assert image_name not in self.image_names, f'Файл {image_name} уже был сохранен'
-        result_image = image.copy()
-        result_image = self._draw_lines(result_image, lines)
-        image_path = self._make_image_path(image_name)
-        cv2.imwrite(image_path.as_posix(), result_image)
+        with self.measure_stage(DEBUG_SAVE_STAGE_NAME):
+            result_image = self._draw_lines(_resolve_image(image), lines)
+            image_path = self._make_image_path(image_name)
+            self._write_image(image_name, image_path, result_image)
         self.count_files_in_folder += 1
 
     def get_debug_folder(self) -> Path:
         return self.debug_folder
 
+    def add_stage_time(self, stage_name: str, timing: StageTiming) -> None:
+        self.stage_timings.setdefault(stage_name, StageTiming()).add(timing)
+
     def _make_image_path(self, image_name: str) -> Path:
         file_name = f'{self.count_files_in_folder}. {image_name}'
         self.image_names[image_name] = file_name
-        return self.debug_folder / f'{file_name}.{PHOTO_EXTENSION}'
+        return self.debug_folder / f'{file_name}.{self.image_extension}'
 
     def get_image_path(self, image_name: str) -> Path:
         file_name = self.image_names[image_name]
-        return self.debug_folder / f'{file_name}.{PHOTO_EXTENSION}'
+        return self.debug_folder / f'{file_name}.{self.image_extension}'
+
+    def export_image(self, image_name: str, target_path: Path) -> None:
+        """
+        Копирует сохраненное изображение в другой файл. Файл создается жесткой ссылкой на
+        сохраненный, а если это невозможно (например, другая файловая система) - копируется
+
+        :param image_name: имя сохраненного изображения
+        :param target_path: путь до нового файла
+        :return:
+        """
+        source_path = self.get_image_path(image_name)
+        target_path.unlink(missing_ok=True)
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copy(source_path, target_path)
+
+    def flush(self) -> None:
+        """
+        Дожидается записи всех сохраненных изображений
+        """
+
+    def _write_image(self, image_name: str, image_path: Path, image: MatLike) -> None:
+        cv2.imwrite(image_path.as_posix(), image)
 
     @staticmethod
     def _draw_lines(image: MatLike, lines: list[Line]) -> MatLike:
@@ -95,16 +244,140 @@ class AlgorithmDebugger(Debugger):
         return image_copy
 
 
+class DeferredAlgorithmDebugger(AlgorithmDebugger):
+    """
+    Отладчик алгоритма, который только запоминает сохраняемые изображения, а записывает их при
+    вызове ``flush``. Позволяет выполнять алгоритм и запись изображений в разных потоках: отладчик
+    вместе с изображениями передается из потока вычислений в поток записи. Между процессами
+    отладчик передается после ``flush``, чтобы не копировать изображения. Сохраненные изображения
+    не должны изменяться алгоритмом до вызова ``flush``
+    """
+
+    def __init__(
+        self,
+        debug_folder: Path,
+        image_extension: str = PHOTO_EXTENSION,
+        stages: Collection[str] | None = None,
+        max_level: DebugLevel = DebugLevel.DETAIL,
+    ) -> None:
+        super().__init__(debug_folder, image_extension, stages, max_level)
+        self.pending_images: dict[str, tuple[Path, MatLike]] = {}
+        """Изображения, ожидающие записи, и пути до их файлов по именам изображений"""
+        self.pending_exports: list[tuple[str, Path]] = []
+        """Имена изображений, ожидающих копирования, и пути до копий"""
+
+    def export_image(self, image_name: str, target_path: Path) -> None:
+        """
+        Запоминает, что сохраненное изображение нужно скопировать в другой файл при записи.
+        Изображение может быть уже записано предыдущим вызовом ``flush``
+
+        :param image_name: имя сохраненного изображения
+        :param target_path: путь до нового файла
+        :return:
+        """
+        self.pending_exports.append((image_name, target_path))
+
+    def flush(self) -> None:
+        """
+        Записывает запомненные изображения общим для процесса объектом фоновой записи и ждет
+        окончания записи
+        """
+        with self.measure_stage(DEBUG_FLUSH_STAGE_NAME):
+            writer = get_debug_image_writer()
+            if len(self.pending_images) > 0:
+                self.debug_folder.mkdir(parents=True, exist_ok=True)
+            writes = {
+                image_name: writer.write(image_path, image)
+                for image_name, (image_path, image) in self.pending_images.items()
+            }
+            exports = {
+                writer.export(writes[image_name], self.get_image_path(image_name), target_path)
+                if image_name in writes
+                else writer.export_file(self.get_image_path(image_name), target_path)
+                for image_name, target_path in self.pending_exports
+            }
+            writer.flush(set(writes.values()) | exports)
+        self.pending_images.clear()
+        self.pending_exports.clear()
+
+    def _write_image(self, image_name: str, image_path: Path, image: MatLike) -> None:
+        self.pending_images[image_name] = (image_path, image)
+
+
+@dataclass(frozen=True)
+class DebugSettings:
+    """Настройки сохранения промежуточных результатов в программе тестирования"""
+
+    image_extension: str = DEBUG_IMAGE_EXTENSION
+    """ Расширение (формат) сохраняемых изображений """
+    stages: frozenset[str] | None = None
+    """ Имена сохраняемых изображений, None - сохраняются все """
+    max_level: DebugLevel = DebugLevel.DETAIL
+    """ Максимальный уровень подробности сохраняемых изображений """
+
+    def make_deferred_debugger(self, debug_folder: Path) -> DeferredAlgorithmDebugger:
+        """
+        Создает отладчик, который записывает изображения только при вызове ``flush``
+
+        :param debug_folder: путь до отладочной директории, создается при записи
+        :return: отладчик
+        """
+        return DeferredAlgorithmDebugger(
+            debug_folder, self.image_extension, self.stages, self.max_level
+        )
+
+
 class DummyDebugger(Debugger):
     """
     Класс-затычка, когда не требуется отладка
     """
 
-    def save_image(self, image_name: str, image: MatLike) -> None:
+    def save_image(
+        self, image_name: str, image: ImageSource, level: DebugLevel = DebugLevel.STAGE
+    ) -> None:
         pass
 
-    def save_image_with_lines(self, image_name: str, image: MatLike, lines: list[Line]) -> None:
+    def save_image_with_lines(
+        self,
+        image_name: str,
+        image: ImageSource,
+        lines: list[Line],
+        level: DebugLevel = DebugLevel.STAGE,
+    ) -> None:
         pass
 
     def get_debug_folder(self) -> Path:
         return Path('')
+
+    def add_stage_time(self, stage_name: str, timing: StageTiming) -> None:
+        pass
+
+
+class TimingDebugger(DummyDebugger):
+    """
+    Отладчик, который не сохраняет промежуточные результаты, а только измеряет время выполнения
+    этапов алгоритма и запоминает линии итогового изображения
+    """
+
+    def __init__(self) -> None:
+        self.stage_timings: dict[str, StageTiming] = {}
+        """Время выполнения этапов алгоритма по их именам"""
+        self.result_lines: list[Line] = []
+        """Линии, переданные с итоговым изображением алгоритма"""
+
+    def save_image_with_lines(
+        self,
+        image_name: str,
+        image: ImageSource,
+        lines: list[Line],
+        level: DebugLevel = DebugLevel.STAGE,
+    ) -> None:
+        if level == DebugLevel.RESULT:
+            self.result_lines = lines
+
+    def add_stage_time(self, stage_name: str, timing: StageTiming) -> None:
+        self.stage_timings.setdefault(stage_name, StageTiming()).add(timing)
+
+
+def _resolve_image(image: ImageSource) -> MatLike:
+    return image() if callable(image) else image
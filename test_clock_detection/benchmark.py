@@ -0,0 +1,463 @@
+import argparse
+import functools
+import multiprocessing
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Literal, cast, get_args
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike, Point
+from tabulate import tabulate
+from typing_extensions import Self
+
+from test_clock_detection.algorithm_debugger import measure_time
+from test_clock_detection.const import (
+    CALCULATED_ERRORS,
+    EXECUTOR_BACKENDS,
+    FAIL_DELTA_THRESHOLD_SECONDS,
+    STAGE_TIME_PERCENTILES,
+    ExecutorBackend,
+)
+from test_clock_detection.data_types import ClockTime
+from test_clock_detection.detect_time import IMAGE_CENTER, detect_time, detect_time_batch
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.pipeline import Pipeline, PipelineStage
+from test_clock_detection.result_analysis import summarize_errors
+from test_clock_detection.utils import check_result, expected_time_from_name, polar_to_cartesian
+
+BenchmarkEngine = Literal['single', 'batch', 'packed']
+"""
+Способ вызова алгоритма: *single* - ``detect_time`` для каждого изображения, *batch* -
+``detect_time_batch`` для пачки изображений, *packed* - ``detect_time_batch`` с упакованными
+масками
+"""
+
+BENCHMARK_ENGINES: tuple[str, ...] = get_args(BenchmarkEngine)
+"""Все доступные способы вызова алгоритма"""
+
+_MS_IN_12_HOURS = 12 * 60 * 60 * 1000
+
+_RENDER_PART_SIZE = 64
+"""Количество изображений, которые рисуются одним вызовом в рабочем процессе"""
+
+
+@dataclass(frozen=True)
+class SyntheticClockParams:
+    """Параметры отрисовки синтетического циферблата"""
+
+    image_size: tuple[int, int] = (640, 480)
+    """ Ширина и высота изображения """
+    dial_center_ratio: tuple[float, float] = (IMAGE_CENTER[0] / 640, IMAGE_CENTER[1] / 480)
+    """ Координаты центра циферблата в долях ширины и высоты изображения """
+    dial_radius_ratio: float = 220 / 480
+    """ Радиус циферблата, по которому расположены минутные метки, в долях меньшей стороны """
+    hand_length_ratios: tuple[float, float, float] = (100 / 220, 150 / 220, 190 / 220)
+    """ Длины часовой, минутной и секундной стрелок в долях радиуса циферблата """
+    hand_widths: tuple[int, int, int] = (7, 4, 2)
+    """ Толщины часовой, минутной и секундной стрелок """
+    noise_sigma: float = 0
+    """ Среднеквадратичное отклонение гауссова шума яркости """
+    background: int = 30
+    """ Яркость фона циферблата """
+    foreground: int = 250
+    """ Яркость стрелок и меток """
+
+    @property
+    def dial_center(self) -> Point:
+        """Координаты центра циферблата в пикселях"""
+        width, height = self.image_size
+        center_x_ratio, center_y_ratio = self.dial_center_ratio
+        return round(width * center_x_ratio), round(height * center_y_ratio)
+
+    @property
+    def dial_radius(self) -> int:
+        """Радиус циферблата в пикселях"""
+        return round(min(self.image_size) * self.dial_radius_ratio)
+
+    @property
+    def hand_lengths(self) -> tuple[int, int, int]:
+        """Длины часовой, минутной и секундной стрелок в пикселях"""
+        hour_ratio, minute_ratio, second_ratio = self.hand_length_ratios
+        radius = self.dial_radius
+        return (
+            round(radius * hour_ratio),
+            round(radius * minute_ratio),
+            round(radius * second_ratio),
+        )
+
+    def folder_name(self, seed: int) -> str:
+        """
+        Имя папки набора изображений с заданными параметрами
+
+        :param seed: начальное значение генератора случайного времени
+        :return: имя папки
+        """
+        width, height = self.image_size
+        hand_widths = '-'.join(str(hand_width) for hand_width in self.hand_widths)
+        return f'{width}x{height}_шум{self.noise_sigma:g}_толщина{hand_widths}_{seed}'
+
+
+@dataclass(frozen=True)
+class BenchmarkConfig:
+    """Конфигурация запуска алгоритма при замере производительности"""
+
+    engine: BenchmarkEngine = 'single'
+    """ Способ вызова алгоритма """
+    backend: ExecutorBackend = 'serial'
+    """ Способ параллельной обработки изображений """
+    jobs: int | None = None
+    """ Количество рабочих потоков или процессов, по умолчанию - количество ядер """
+
+    @classmethod
+    def from_str(cls, config: str) -> Self:
+        """
+        Разбирает конфигурацию формата *способ вызова[:способ запуска[:количество исполнителей]]*,
+        например *single:process:4*
+
+        :param config: строка с конфигурацией
+        :return: конфигурация
+        """
+        engine, backend, jobs, *other = [*config.split(':'), '', '']
+        assert engine in BENCHMARK_ENGINES, f'Неизвестный способ вызова алгоритма: {engine}'
+        assert backend in ('', *EXECUTOR_BACKENDS), f'Неизвестный способ запуска: {backend}'
+        assert not any(other), f'Конфигурация {config} не соответствует формату'
+        return cls(
+            engine=cast(BenchmarkEngine, engine),
+            backend=cast(ExecutorBackend, backend or 'serial'),
+            jobs=int(jobs) if jobs else None,
+        )
+
+    def __str__(self) -> str:
+        jobs = f':{self.jobs}' if self.jobs is not None else ''
+        return f'{self.engine}:{self.backend}{jobs}'
+
+
+@dataclass
+class BenchmarkResult:
+    """Результат замера производительности одной конфигурации"""
+
+    config: BenchmarkConfig
+    """ Конфигурация запуска """
+    wall_time_sec: float
+    """ Общее время обработки всех изображений """
+    latencies_ms: npt.NDArray[np.float64]
+    """ Время обработки каждого изображения, включая чтение с диска """
+    errors_sec: list[float]
+    """ Погрешности определения времени, упорядоченные по возрастанию """
+
+    @property
+    def images_per_second(self) -> float:
+        """Количество изображений, обрабатываемых за секунду"""
+        return len(self.latencies_ms) / self.wall_time_sec
+
+
+def hand_angles_deg(clock_time: ClockTime) -> tuple[float, float, float]:
+    """
+    Углы поворота часовой, минутной и секундной стрелок для заданного времени. Угол отсчитывается
+    от 12 часов по часовой стрелке, как в алгоритме определения времени
+
+    :param clock_time: время на часах
+    :return: углы поворота стрелок в градусах
+    """
+    seconds = clock_time.seconds + clock_time.ms / 1000
+    minutes = clock_time.minutes + seconds / 60
+    hours = clock_time.hours % 12 + minutes / 60
+    return hours * 30, minutes * 6, seconds * 6
+
+
+def render_clock(clock_time: ClockTime, params: SyntheticClockParams) -> MatLike:
+    """
+    Рисует синтетический циферблат со светлыми стрелками и минутными метками на темном фоне
+
+    :param clock_time: время на часах
+    :param params: параметры отрисовки
+    :return: цветное изображение часов в формате BGR
+    """
+    width, height = params.image_size
+    image = np.full((height, width), params.background, dtype=np.uint8)
+    center = params.dial_center
+    radius = params.dial_radius
+    scale = radius / 220
+    color = (params.foreground,)
+
+    cv2.circle(image, center, radius + round(10 * scale), color, 3, cv2.LINE_AA)
+    for minute in range(60):
+        tick_len = round((15 if minute % 5 == 0 else 7) * scale)
+        start = polar_to_cartesian(minute * 6, radius - tick_len, center, 90)
+        end = polar_to_cartesian(minute * 6, radius, center, 90)
+        cv2.line(image, start, end, color, 2, cv2.LINE_AA)
+
+    for angle_deg, hand_len, hand_width in zip(
+        hand_angles_deg(clock_time), params.hand_lengths, params.hand_widths, strict=True
+    ):
+        end = polar_to_cartesian(angle_deg, hand_len, center, 90)
+        cv2.line(image, center, end, color, hand_width, cv2.LINE_AA)
+
+    if params.noise_sigma > 0:
+        rng = np.random.default_rng(_time_to_ms(clock_time))
+        noise = rng.normal(0, params.noise_sigma, image.shape)
+        image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def _time_to_ms(clock_time: ClockTime) -> int:
+    return (
+        (clock_time.hours * 60 + clock_time.minutes) * 60 + clock_time.seconds
+    ) * 1000 + clock_time.ms
+
+
+def _ms_to_time(time_ms: int) -> ClockTime:
+    seconds, ms = divmod(time_ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return ClockTime(hours=hours, minutes=minutes, seconds=seconds, ms=ms)
+
+
+def _render_to_files(
+    params: SyntheticClockParams, part: list[tuple[Path, ClockTime]]
+) -> list[Path]:
+    for image_path, clock_time in part:
+        cv2.imwrite(image_path.as_posix(), render_clock(clock_time, params))
+    return [image_path for image_path, _ in part]
+
+
+def _run_stage(
+    name: str,
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    backend: ExecutorBackend,
+    jobs: int | None = None,
+) -> Iterator[Any]:
+    """
+    Выполняет функцию для каждого элемента конвейером из одного этапа, как этап вычислений
+    программы тестирования. Результаты выдаются в порядке готовности
+
+    :param name: имя этапа
+    :param fn: функция этапа, объявленная на уровне модуля
+    :param items: входные элементы
+    :param backend: способ запуска
+    :param jobs: количество рабочих потоков или процессов, по умолчанию - количество ядер
+    :return: результаты функции
+    """
+    workers = jobs if jobs is not None else multiprocessing.cpu_count()
+    stage = PipelineStage(name, fn, workers, 'process' if backend == 'process' else 'thread')
+    return Pipeline([stage], serial=backend == 'serial').run(items)
+
+
+def generate_dataset(
+    folder: Path,
+    count_images: int,
+    params: SyntheticClockParams,
+    seed: int = 0,
+    image_extension: str = 'png',
+    backend: ExecutorBackend = 'process',
+) -> list[Path]:
+    """
+    Создает набор синтетических изображений часов со случайным неповторяющимся временем. Имена
+    файлов имеют формат *ЧЧ:ММ:СС.мс*, как у тестовых изображений. Набор определяется параметрами
+    и начальным значением генератора, поэтому уже созданные изображения повторно не рисуются
+
+    :param folder: папка для изображений
+    :param count_images: количество изображений
+    :param params: параметры отрисовки
+    :param seed: начальное значение генератора случайного времени
+    :param image_extension: расширение (формат) изображений
+    :param backend: способ параллельной отрисовки изображений
+    :return: пути до изображений
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    times_ms = rng.choice(_MS_IN_12_HOURS, size=count_images, replace=False)
+
+    image_paths = []
+    missing = []
+    for time_ms in times_ms:
+        clock_time = _ms_to_time(int(time_ms))
+        image_path = folder / f'{clock_time}.{image_extension}'
+        image_paths.append(image_path)
+        if not image_path.exists():
+            missing.append((image_path, clock_time))
+
+    parts = [
+        missing[start : start + _RENDER_PART_SIZE]
+        for start in range(0, len(missing), _RENDER_PART_SIZE)
+    ]
+    for _ in _run_stage('Отрисовка', functools.partial(_render_to_files, params), parts, backend):
+        pass
+    return image_paths
+
+
+def _detect_single(root_folder: Path, image_path: Path) -> list[tuple[Path, ClockTime, float]]:
+    with measure_time() as timing:
+        clock_time = detect_time(root_folder, image_path)
+    return [(image_path, clock_time, timing.wall_ms)]
+
+
+def _detect_batch(packed: bool, image_paths: list[Path]) -> list[tuple[Path, ClockTime, float]]:
+    with measure_time() as timing:
+        images_gray = []
+        for image_path in image_paths:
+            image = read_image(image_path)
+            images_gray.append(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        clock_times, _ = detect_time_batch(np.stack(images_gray), packed=packed)
+    latency_ms = timing.wall_ms / len(image_paths)
+    return [
+        (image_path, clock_time, latency_ms)
+        for image_path, clock_time in zip(image_paths, clock_times, strict=True)
+    ]
+
+
+def run_benchmark(
+    config: BenchmarkConfig, root_folder: Path, image_paths: list[Path], batch_size: int = 64
+) -> BenchmarkResult:
+    """
+    Определяет время на всех изображениях в заданной конфигурации и замеряет производительность.
+    В замер входит чтение изображений с диска и запуск исполнителей
+
+    :param config: конфигурация запуска
+    :param root_folder: корневая папка проекта
+    :param image_paths: пути до изображений с именами формата *ЧЧ:ММ:СС.мс*
+    :param batch_size: количество изображений в пачке для способов вызова *batch* и *packed*
+    :return: результат замера
+    """
+    start_time = time.perf_counter()
+    if config.engine == 'single':
+        detect: Callable[[Any], list[tuple[Path, ClockTime, float]]] = functools.partial(
+            _detect_single, root_folder
+        )
+        parts: Iterable[Any] = image_paths
+    else:
+        detect = functools.partial(_detect_batch, config.engine == 'packed')
+        parts = [
+            image_paths[start : start + batch_size]
+            for start in range(0, len(image_paths), batch_size)
+        ]
+    detections_by_path = {
+        image_path: (clock_time, latency_ms)
+        for part in _run_stage('Алгоритм', detect, parts, config.backend, config.jobs)
+        for image_path, clock_time, latency_ms in part
+    }
+    detections = [detections_by_path[image_path] for image_path in image_paths]
+    wall_time_sec = time.perf_counter() - start_time
+
+    errors_sec = []
+    for image_path, (clock_time, _) in zip(image_paths, detections, strict=True):
+        detected_time = datetime.strptime(str(clock_time), '%H:%M:%S.%f')
+        excepted_time = expected_time_from_name(image_path.stem)
+        delta_sec, _ = check_result(excepted_time, detected_time, FAIL_DELTA_THRESHOLD_SECONDS)
+        errors_sec.append(delta_sec)
+    errors_sec.sort()
+
+    return BenchmarkResult(
+        config=config,
+        wall_time_sec=wall_time_sec,
+        latencies_ms=np.array([latency_ms for _, latency_ms in detections]),
+        errors_sec=errors_sec,
+    )
+
+
+def print_benchmark_results(results: list[BenchmarkResult]) -> None:
+    """
+    Выводит в консоль таблицу производительности и таблицу точности всех конфигураций
+
+    :param results: результаты замеров
+    :return:
+    """
+    table = []
+    for result in results:
+        percentiles_ms = np.percentile(result.latencies_ms, STAGE_TIME_PERCENTILES)
+        table.append([
+            str(result.config),
+            round(result.images_per_second, 1),
+            *(round(float(value), 2) for value in percentiles_ms),
+            round(result.wall_time_sec, 2),
+        ])
+    percentile_headers = [f'p{percentile} мс' for percentile in STAGE_TIME_PERCENTILES]
+    print(
+        tabulate(
+            table,
+            headers=['Конфигурация', 'Изображений/с', *percentile_headers, 'Всего с'],
+            tablefmt='github',
+        )
+    )
+    print()
+
+    stats = [
+        summarize_errors(result.errors_sec, CALCULATED_ERRORS).percent_within()
+        for result in results
+    ]
+    accuracy_table = [
+        [f'{error} c.', *(f'{result_stats[error]} %' for result_stats in stats)]
+        for error in CALCULATED_ERRORS
+    ]
+    print(
+        tabulate(
+            accuracy_table,
+            headers=['Погрешность', *(str(result.config) for result in results)],
+            tablefmt='github',
+        )
+    )
+
+
+def _parse_size(size: str) -> tuple[int, int]:
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Замер производительности и точности алгоритма на синтетических изображениях'
+    )
+    parser.add_argument('--count', type=int, default=1000, help='количество изображений')
+    parser.add_argument(
+        '--size', type=_parse_size, default=(640, 480), help='размер изображений, например 640x480'
+    )
+    parser.add_argument('--noise', type=float, default=0, help='уровень шума яркости')
+    parser.add_argument(
+        '--hand-widths',
+        type=int,
+        nargs=3,
+        default=(7, 4, 2),
+        help='толщины часовой, минутной и секундной стрелок',
+    )
+    parser.add_argument('--seed', type=int, default=0, help='начальное значение генератора')
+    parser.add_argument(
+        '--image-format', default='png', help='расширение (формат) синтетических изображений'
+    )
+    parser.add_argument(
+        '--config',
+        action='append',
+        default=None,
+        help='конфигурация запуска *способ вызова[:способ запуска[:количество исполнителей]]*, '
+        f'способы вызова: {", ".join(BENCHMARK_ENGINES)}. Можно указать несколько раз',
+    )
+    parser.add_argument('--batch-size', type=int, default=64, help='количество изображений в пачке')
+    args = parser.parse_args()
+
+    repo_root = Path(os.path.abspath(__file__)).parent.parent
+    hour_width, minute_width, second_width = args.hand_widths
+    params = SyntheticClockParams(
+        image_size=args.size,
+        noise_sigma=args.noise,
+        hand_widths=(hour_width, minute_width, second_width),
+    )
+    dataset_folder = repo_root / 'files' / 'Синтетические' / params.folder_name(args.seed)
+    image_paths = generate_dataset(dataset_folder, args.count, params, args.seed, args.image_format)
+
+    config_strings = args.config or ['single:serial', 'single:process', 'batch:process']
+    results = []
+    for config_string in config_strings:
+        config = BenchmarkConfig.from_str(config_string)
+        results.append(run_benchmark(config, repo_root, image_paths, args.batch_size))
+    print(f'Размер выборки: {len(image_paths)}, изображения: {dataset_folder}')
+    print_benchmark_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+from typing import Literal, get_args
+
 FAIL_DELTA_THRESHOLD_SECONDS: float = 1
 """
 Максимальное отклонение от реального значения, после которого определение времени считается
@@ -16,3 +18,156 @@ PHOTO_EXTENSION: str = 'bmp'
 """
 Расширение входных и выходных фото
 """
+
+RESULT_IMAGE_NAME: str = 'Линия из центра изображения'
+"""
+Имя промежуточного изображения с итоговым результатом алгоритма. Это изображение копируется в папку
+с окончательными результатами
+"""
+
+DEBUG_IMAGE_EXTENSION: str = PHOTO_EXTENSION
+"""
+Расширение (формат) промежуточных и окончательных изображений алгоритма. Сжатые форматы, например
+png, уменьшают объем записи на сетевые диски ценой времени кодирования
+"""
+
+DEBUG_WRITER_THREADS: int = 4
+"""
+Количество потоков фоновой записи отладочных изображений в каждом рабочем процессе
+"""
+
+DEBUG_WRITER_MAX_PENDING: int = 64
+"""
+Максимальное количество отладочных изображений в очереди на запись. При заполнении очереди
+алгоритм ждет, пока изображения будут записаны
+"""
+
+ExecutorBackend = Literal['thread', 'process', 'serial']
+"""Способ параллельного запуска обработки изображений"""
+
+EXECUTOR_BACKENDS: tuple[str, ...] = get_args(ExecutorBackend)
+"""Все доступные способы запуска"""
+
+EXECUTOR_BACKEND: ExecutorBackend = 'process'
+"""
+Способ параллельной обработки изображений: *thread* - пул потоков, *process* - пул процессов,
+*serial* - последовательно в одном потоке.
+Поиск стрелок выполняется на Python, поэтому пул потоков упирается в GIL и загружает одно ядро
+"""
+
+EXECUTOR_CHUNKSIZE: int = 1
+"""
+Количество изображений в части, которая передается между этапами конвейера тестирования, если
+изображения обрабатываются по одному. При обработке пачками размер части равен ``BATCH_SIZE``
+"""
+
+BATCH_SIZE: int = 0
+"""
+Количество изображений одного размера, которые обрабатываются одним вызовом
+``detect_time_batch`` на этапе вычислений конвейера тестирования. При значении 0 каждое
+изображение обрабатывается отдельно через ``detect_time_from_image``
+"""
+
+ANGLE_STEP_SCHEDULE_DEG: tuple[float, ...] = (1, 0.25, 0.05)
+"""
+Шаги поиска стрелок в градусах. Первый шаг - полный поиск по всем углам, каждый следующий шаг
+уточняет угол стрелки в окне вокруг угла, найденного на предыдущем шаге. На последнем шаге угол
+дополнительно уточняется интерполяцией максимума совпадений.
+Шаг 1 градус соответствует примерно 167 мс секундной стрелки. Значение (1,) отключает уточнение
+"""
+
+STAGE_TIME_PERCENTILES: tuple[int, ...] = (50, 95, 99)
+"""Перцентили времени выполнения этапов алгоритма, выводимые в отчете"""
+
+RESULTS_FILE_NAME = 'Результаты.jsonl'
+"""Имя файла хранилища результатов тестирования в папке с результатами"""
+
+RESULTS_FLUSH_EVERY: int = 100
+"""Количество результатов тестирования, после которого они записываются в хранилище на диск"""
+
+SAVE_FINAL_IMAGES: bool = True
+"""
+Сохранять итоговые изображения алгоритма в папку с окончательными результатами. Имена изображений
+содержат результат тестирования. Результаты для отчета читаются из хранилища результатов, поэтому
+для больших наборов изображений сохранение можно отключить
+"""
+
+ERROR_PERCENTILES: tuple[int, ...] = (50, 90, 99)
+"""Перцентили погрешности определения времени, выводимые в отчете"""
+
+ERROR_SKETCH_RESOLUTION_SEC: float = 0.1
+"""
+Разрешение потоковой гистограммы погрешностей. Совпадает с точностью округления погрешности при
+проверке результата, поэтому статистика по гистограмме не отличается от точной
+"""
+
+TIMING_SKETCH_RELATIVE_ACCURACY: float = 0.01
+"""
+Относительная точность перцентилей времени выполнения в потоковой гистограмме: ширина интервалов
+растет вместе со временем, поэтому перцентили отличаются от точных не больше чем на 1 %
+"""
+
+USE_RESULT_CACHE: bool = True
+"""
+Использовать кэш результатов: изображения, которые не менялись с прошлого запуска, не
+обрабатываются повторно, если не менялся и алгоритм
+"""
+
+RESULT_CACHE_MAX_SIZE_BYTES: int = 64 * 1024 * 1024
+"""Максимальный размер кэша результатов на диске в байтах"""
+
+RESULT_CACHE_VERSION: int = 1
+"""
+Версия формата кэша результатов. Увеличивается, если результат алгоритма изменился без изменения
+модулей алгоритма, например при изменении модулей, от которых он зависит
+"""
+
+MEMORY_MAP_IMAGES: bool = True
+"""
+Открывать несжатые BMP отображением файла в память вместо декодирования. Пиксели не копируются,
+а страницы файла разделяются процессами через кэш операционной системы
+"""
+
+SERVER_MAX_BATCH_SIZE: int = 32
+"""Максимальное количество кадров, объединяемых сервером определения времени в одну пачку"""
+
+SERVER_MAX_WAIT_MS: float = 5
+"""
+Максимальное время ожидания сервером следующих кадров для пачки. Первый кадр пачки ждет ответа
+не дольше этого времени сверх времени обработки
+"""
+
+SERVER_PORT: int = 8765
+"""Порт сервера определения времени на localhost по умолчанию"""
+
+PIPELINE_PREFETCH_THREADS: int = 4
+"""Количество потоков чтения изображений с диска, работающих параллельно с алгоритмом"""
+
+PIPELINE_WRITER_THREADS: int = 2
+"""
+Количество потоков записи результатов и отладочных изображений, работающих параллельно с
+алгоритмом. Кодирование изображений выполняется общим пулом ``DEBUG_WRITER_THREADS``
+"""
+
+PIPELINE_QUEUE_SIZE: int = 8
+"""
+Максимальное количество частей изображений в очереди перед каждым этапом конвейера. При
+заполнении очереди предыдущий этап ждет, поэтому быстрый этап не накапливает изображения в памяти
+"""
+
+SAVE_RUN_HISTORY: bool = True
+"""
+Дописывать сводку каждого запуска тестирования в историю запусков *files/История запусков*:
+ревизию, параметры, скорость, время на изображение, точность и погрешности изображений
+"""
+
+REGRESSION_THROUGHPUT_TOLERANCE: float = 0.1
+"""
+Допустимое относительное снижение скорости тестирования при сравнении запусков, 0.1 - на 10 %
+"""
+
+REGRESSION_ACCURACY_TOLERANCE_PERCENT: float = 1
+"""
+Допустимое снижение процента изображений, уложившихся в каждую погрешность ``CALCULATED_ERRORS``,
+при сравнении запусков. Задается в процентных пунктах
+"""
@@ -1,7 +1,10 @@
 import re
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
+from typing import Any
 
+import numpy as np
+import numpy.typing as npt
 from cv2.typing import Point
 from typing_extensions import Self
 
@@ -18,6 +21,36 @@ class MatchResultLine:
     """ Угол поворота стрелки в градусах """
 
 
+@dataclass
+class BatchMatchResult:
+    """
+    Совпадения линий для всех углов по пачке изображений в компактном виде. Объекты
+    ``MatchResultLine`` создаются только при обращении к конкретному изображению
+    """
+
+    angles_deg: npt.NDArray[np.float64]
+    """ Углы поиска в градусах, форма (количество углов,) """
+    match_values: npt.NDArray[np.int64]
+    """ Результаты совпадений, форма (количество изображений, количество углов) """
+    arrow_start: Point
+    """ Координаты начала стрелок """
+
+    def __len__(self) -> int:
+        return len(self.match_values)
+
+    def __getitem__(self, index: int) -> list[MatchResultLine]:
+        """
+        Совпадения линий для всех углов одного изображения пачки
+
+        :param index: номер изображения в пачке
+        :return: совпадения линий
+        """
+        return [
+            MatchResultLine(match_value=int(value), arrow_start=self.arrow_start, angle_deg=angle)
+            for angle, value in zip(self.angles_deg, self.match_values[index], strict=True)
+        ]
+
+
 @dataclass
 class Line:
     """Данные о линии"""
@@ -30,6 +63,8 @@ class Line:
     """ Угол поворота линии в градусах """
     len_line: int
     """ Длина линии """
+    match_value: int = 0
+    """ Количество пикселей заданного цвета вдоль линии """
 
 
 @dataclass(kw_only=True)
@@ -65,6 +100,74 @@ class ClockTime:
         return cls(hours=hours, minutes=minutes, seconds=seconds, ms=milliseconds)
 
 
+@dataclass
+class Detection:
+    """Результат алгоритма определения времени на одном изображении"""
+
+    clock_time: ClockTime
+    """ Время на часах """
+    hand_angles_deg: list[float] = field(default_factory=list)
+    """ Углы поворота найденных линий в градусах, если алгоритм их сообщает """
+    match_values: list[int] = field(default_factory=list)
+    """ Результаты совпадения найденных линий """
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Формирует словарь для сохранения результата в кэше результатов
+
+        :return: словарь с простыми типами, который можно сохранить в JSON
+        """
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        """
+        Восстанавливает результат из словаря, созданного ``to_dict``
+
+        :param data: словарь с результатом
+        :return: результат алгоритма
+        """
+        return cls(
+            clock_time=ClockTime(**data['clock_time']),
+            hand_angles_deg=data['hand_angles_deg'],
+            match_values=data['match_values'],
+        )
+
+
+@dataclass(frozen=True)
+class DialGeometry:
+    """Положение циферблата на изображении"""
+
+    center: Point
+    """ Координаты центра циферблата """
+    radius: float
+    """ Радиус циферблата в пикселях """
+
+
+@dataclass(frozen=True)
+class DialCalibration:
+    """Калибровка циферблата одной камеры"""
+
+    dial: DialGeometry
+    """ Положение циферблата, от центра которого ищутся стрелки """
+    tick_offset: tuple[float, float] = (0.0, 0.0)
+    """ Смещение центра минутных меток относительно центра стрелок в пикселях """
+
+
+@dataclass
+class FrameTime:
+    """Время на часах, определенное по кадру видео"""
+
+    frame_index: int
+    """ Номер кадра в последовательности """
+    timestamp_ms: float
+    """ Время кадра от начала записи в миллисекундах """
+    clock_time: ClockTime
+    """ Время на часах """
+
+
+_TIME_FORMAT = '%H:%M:%S.%f'
+
 RESULT_IMAGE_REGULAR = re.compile(
     r'^(?P<error_status>[01]+)-(?P<error>\d+\.\d+)-(?P<detected_time>\d{2}:\d{2}:\d{2}\.\d{3})-'
     r'(?P<excepted_time>\d{2}:\d{2}:\d{2}\.\d{3})$'
@@ -112,3 +215,113 @@ class DetectTimeResult:
             detected_time=datetime.strptime(result_attr.group('detected_time'), '%H:%M:%S.%f'),
             excepted_time=datetime.strptime(result_attr.group('excepted_time'), '%H:%M:%S.%f'),
         )
+
+
+@dataclass
+class ErrorSummary:
+    """Сводная статистика погрешностей определения времени"""
+
+    count: int
+    """ Количество результатов """
+    mean_sec: float
+    """ Средняя погрешность в секундах """
+    max_sec: float
+    """ Максимальная погрешность в секундах """
+    percentiles_sec: dict[int, float]
+    """ Перцентили погрешности в секундах по их номерам """
+    counts_within: dict[float, int]
+    """ Количество результатов, погрешность которых не превышает предел, по пределам """
+
+    def percent_within(self) -> dict[float, float]:
+        """
+        Процент результатов, погрешность которых не превышает предел
+
+        :return: словарь с пределами погрешностей и процентами результатов
+        """
+        return {
+            error: round(count / self.count * 100, 2) for error, count in self.counts_within.items()
+        }
+
+
+@dataclass
+class StageTiming:
+    """Суммарное время выполнения этапа алгоритма на одном изображении"""
+
+    wall_ms: float = 0
+    """ Астрономическое время в миллисекундах """
+    cpu_ms: float = 0
+    """ Процессорное время потока в миллисекундах """
+    calls: int = 0
+    """ Количество выполнений этапа """
+
+    def add(self, other: 'StageTiming') -> None:
+        """
+        Добавляет к этапу время другого выполнения этапа
+
+        :param other: время выполнения этапа
+        :return:
+        """
+        self.wall_ms += other.wall_ms
+        self.cpu_ms += other.cpu_ms
+        self.calls += other.calls
+
+
+@dataclass
+class ImageTestResult:
+    """Результат тестирования алгоритма на одном изображении"""
+
+    image_name: str
+    """ Имя входного изображения без расширения """
+    detect_result: DetectTimeResult
+    """ Результат определения времени """
+    stage_timings: dict[str, StageTiming] = field(default_factory=dict)
+    """ Время выполнения этапов алгоритма по их именам """
+    hand_angles_deg: list[float] = field(default_factory=list)
+    """ Углы поворота найденных линий в градусах """
+    match_values: list[int] = field(default_factory=list)
+    """ Результаты совпадения найденных линий """
+    from_cache: bool = False
+    """ Результат взят из кэша результатов без запуска алгоритма """
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Формирует словарь для сохранения результата в хранилище результатов
+
+        :return: словарь с простыми типами, который можно сохранить в JSON
+        """
+        return {
+            'image_name': self.image_name,
+            'success_detection': self.detect_result.success_detection,
+            'error_sec': self.detect_result.error_sec,
+            'detected_time': self.detect_result.detected_time.strftime(_TIME_FORMAT)[:-3],
+            'excepted_time': self.detect_result.excepted_time.strftime(_TIME_FORMAT)[:-3],
+            'stage_timings': {name: asdict(timing) for name, timing in self.stage_timings.items()},
+            'hand_angles_deg': self.hand_angles_deg,
+            'match_values': self.match_values,
+            'from_cache': self.from_cache,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Self:
+        """
+        Восстанавливает результат из словаря, созданного ``to_dict``
+
+        :param data: словарь с результатом
+        :return: результат тестирования изображения
+        """
+        detect_result = DetectTimeResult(
+            success_detection=data['success_detection'],
+            error_sec=data['error_sec'],
+            detected_time=datetime.strptime(data['detected_time'], _TIME_FORMAT),
+            excepted_time=datetime.strptime(data['excepted_time'], _TIME_FORMAT),
+        )
+        return cls(
+            image_name=data['image_name'],
+            detect_result=detect_result,
+            stage_timings={
+                name: StageTiming(**timing) for name, timing in data['stage_timings'].items()
+            },
+            hand_angles_deg=data.get('hand_angles_deg', []),
+            match_values=data.get('match_values', []),
+            from_cache=data.get('from_cache', False),
+        )
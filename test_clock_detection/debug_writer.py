@@ -0,0 +1,138 @@
+import os
+import shutil
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+from cv2.typing import MatLike
+
+from test_clock_detection.const import DEBUG_WRITER_MAX_PENDING, DEBUG_WRITER_THREADS
+
+
+class DebugImageWriter:
+    """
+    Фоновое кодирование и запись отладочных изображений пулом потоков. Количество ожидающих записи
+    изображений ограничено: при заполнении очереди вызывающий поток ждет, пока освободится место,
+    поэтому медленный диск не приводит к неограниченному росту памяти
+    """
+
+    def __init__(
+        self, threads: int = DEBUG_WRITER_THREADS, max_pending: int = DEBUG_WRITER_MAX_PENDING
+    ) -> None:
+        """
+        :param threads: количество потоков записи
+        :param max_pending: максимальное количество изображений в очереди на запись
+        """
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='debug_writer')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending: set[Future[bytes]] = set()
+        self._lock = threading.Lock()
+
+    def write(self, image_path: Path, image: MatLike) -> Future[bytes]:
+        """
+        Ставит изображение в очередь на запись. Формат определяется расширением файла. Изображение
+        не должно изменяться до завершения записи
+
+        :param image_path: путь до файла изображения
+        :param image: изображение
+        :return: future с закодированным изображением
+        """
+        return self._submit(_encode_and_write, image_path, image)
+
+    def export(self, source: Future[bytes], source_path: Path, target_path: Path) -> Future[bytes]:
+        """
+        Ставит в очередь копирование уже записываемого изображения в другой файл. Файл создается
+        жесткой ссылкой на исходный, а если это невозможно - записывается из памяти без повторного
+        кодирования и чтения с диска
+
+        :param source: future записи исходного изображения
+        :param source_path: путь до исходного файла
+        :param target_path: путь до нового файла
+        :return: future с закодированным изображением
+        """
+        return self._submit(_link_or_write, source, source_path, target_path)
+
+    def export_file(self, source_path: Path, target_path: Path) -> Future[bytes]:
+        """
+        Ставит в очередь копирование уже записанного файла изображения. Файл создается жесткой
+        ссылкой на исходный, а если это невозможно - копируется
+
+        :param source_path: путь до исходного файла
+        :param target_path: путь до нового файла
+        :return: future без данных изображения
+        """
+        return self._submit(_link_or_copy, source_path, target_path)
+
+    def flush(self, futures: set[Future[bytes]] | None = None) -> None:
+        """
+        Ждет завершения записи. Ошибки записи пробрасываются в вызывающий код
+
+        :param futures: записи, завершения которых нужно дождаться, по умолчанию - все
+        """
+        if futures is None:
+            with self._lock:
+                futures = set(self._pending)
+        for future in futures:
+            future.result()
+
+    def _submit(self, fn: Callable[..., bytes], *args: object) -> Future[bytes]:
+        self._slots.acquire()
+        future = self._executor.submit(fn, *args)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future[bytes]) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+
+def _encode_and_write(image_path: Path, image: MatLike) -> bytes:
+    success, encoded = cv2.imencode(image_path.suffix, image)
+    assert success, f'Не удалось закодировать изображение {image_path}'
+    data = encoded.tobytes()
+    image_path.write_bytes(data)
+    return data
+
+
+def _link_or_write(source: Future[bytes], source_path: Path, target_path: Path) -> bytes:
+    data = source.result()
+    target_path.unlink(missing_ok=True)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        target_path.write_bytes(data)
+    return data
+
+
+def _link_or_copy(source_path: Path, target_path: Path) -> bytes:
+    target_path.unlink(missing_ok=True)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+    return b''
+
+
+_writer: DebugImageWriter | None = None
+_writer_pid = 0
+_writer_lock = threading.Lock()
+
+
+def get_debug_image_writer() -> DebugImageWriter:
+    """
+    Общий для процесса экземпляр ``DebugImageWriter``. В каждом рабочем процессе создается свой
+    экземпляр, потоки одного процесса используют общий
+
+    :return: объект фоновой записи изображений
+    """
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = DebugImageWriter()
+            _writer_pid = os.getpid()
+        return _writer
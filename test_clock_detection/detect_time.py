@@ -1,88 +1,90 @@
+import functools
+import itertools
+from collections.abc import Hashable, Iterable, Iterator, Sequence
+from dataclasses import dataclass, replace
 from pathlib import Path
 
 import cv2
-from cv2.typing import MatLike, Point
 import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike, Point
 
-from test_clock_detection.algorithm_debugger import Debugger, DummyDebugger
-from test_clock_detection.data_types import ClockTime, Line, MatchResultLine
-from test_clock_detection.utils import polar_to_cartesian
-
-
-def _find_line(
-    src_image: MatLike,
-    image_center: Point,
-    angle_step_deg: float,
-    min_len_line_pix: int,
-    max_len_line_pix: int,
-    color: tuple[int, int, int, int],
-) -> list[MatchResultLine]:
-    """
-    Проверяет пиксели на белый цвет вокруг заданного центра. В месте с наибольшим количеством
-    заданного цвета находится секундная стрелка
-
-    :param src_image: черно-белое изображение циферблата
-    :param image_center: координаты центра циферблата
-    :param angle_step_deg: шаг поиска стрелки
-    :param max_len_line_pix: максимальная длина искомой линии
-    :param min_len_line_pix: минимальная длина искомой линии
-    :param color: цвет в формате RGBA
-    :return: параметры найденной секундной стрелки
-    """
-    match_result = []
-
-    max_steps_angle = int(360 // angle_step_deg)
-    for theta in np.linspace(start=0, stop=360, num=max_steps_angle):
-        color_pixels = 0
-        for radius in range(min_len_line_pix, max_len_line_pix):
-            x, y = polar_to_cartesian(theta, radius, image_center, 90)
-
-            try:
-                if all(src_image[y][x] == color):
-                    color_pixels += 1
-            except IndexError:
-                continue
+from test_clock_detection.algorithm_debugger import (
+    Debugger,
+    DebugLevel,
+    DummyDebugger,
+    measure_time,
+)
+from test_clock_detection.const import ANGLE_STEP_SCHEDULE_DEG, RESULT_IMAGE_NAME
+from test_clock_detection.data_types import (
+    BatchMatchResult,
+    ClockTime,
+    DialCalibration,
+    DialGeometry,
+    Line,
+    MatchResultLine,
+    StageTiming,
+)
+from test_clock_detection.dial_locator import get_dial_locator
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.ray_grid import (
+    PROFILE_LAST_HIT,
+    PROFILE_THICKNESS,
+    PackedMask,
+    RadialProfile,
+    angle_spacing_deg,
+    get_ray_grid,
+)
+
+MIN_ANGLE_DIFF_DEG: float = 30
+"""Минимальная разница углов между найденными стрелками в градусах"""
+
+
+def _sorted_match_result(
+    match_values: npt.NDArray[np.int32], angles_deg: npt.NDArray[np.float64], image_center: Point
+) -> Iterator[MatchResultLine]:
+    """
+    Совпадения линий по убыванию совпадения. При одинаковом совпадении линии идут по
+    возрастанию угла
 
-        match_result.append(
-            MatchResultLine(match_value=color_pixels, angle_deg=theta, arrow_start=image_center)
+    :param match_values: количество совпадений для каждого угла
+    :param angles_deg: углы в градусах
+    :param image_center: центр линий
+    :return: генератор совпадений, создаются только просмотренные совпадения
+    """
+    order = np.argsort(-match_values, kind='stable')
+    return (
+        MatchResultLine(
+            match_value=int(match_values[index]),
+            angle_deg=angles_deg[index],
+            arrow_start=image_center,
         )
-
-    return match_result
+        for index in order
+    )
 
 
-def _find_best_lines(
-    src_image: MatLike,
-    image_center: Point,
-    angle_step_deg: float,
-    min_len_line_pix: int,
+def _select_best_lines(
+    sorted_match_result: Iterable[MatchResultLine],
     max_len_line_pix: int,
-    color: tuple[int, int, int, int],
+    min_angle_diff_deg: float = MIN_ANGLE_DIFF_DEG,
 ) -> list[Line]:
     """
-    Поиск 3-х лучших цветных линий исходящий из заданного центра изображения, разница углов между
-    которыми превышает 30 градусов
+    Выбор 3-х лучших линий, разница углов между которыми превышает ``min_angle_diff_deg``
 
-    :param src_image: изображение в формате BGRA
-    :param image_center: центр изображения
-    :param angle_step_deg: шаг поиска линии
-    :param min_len_line_pix: минимальная длина линии
+    :param sorted_match_result: совпадения линий, упорядоченные по убыванию совпадения. Может
+      быть генератором, тогда создаются только просмотренные совпадения
     :param max_len_line_pix: максимальная длина линии
-    :param color: цвет линии
+    :param min_angle_diff_deg: минимальная разница углов между линиями
     :return: список с 3 лучшими совпадениями линий
     """
-    match_result = _find_line(
-        src_image, image_center, angle_step_deg, min_len_line_pix, max_len_line_pix, color
-    )
-    match_result.sort(reverse=True, key=lambda x: x.match_value)
-
     lines: list[Line] = []
     count_lines = 0
     lines_angles: list[float] = []
-    for index, match in enumerate(match_result):
+    for index, match in enumerate(sorted_match_result):
         if index != 0:
             correct_angle_diff = True
             for line in lines:
-                if abs(line.angle_deg - match.angle_deg) < 30:
+                if abs(line.angle_deg - match.angle_deg) < min_angle_diff_deg:
                     correct_angle_diff = False
             if not correct_angle_diff:
                 continue
@@ -92,6 +94,7 @@ def _find_best_lines(
                 line_start=match.arrow_start,
                 angle_deg=match.angle_deg,
                 len_line=max_len_line_pix,
+                match_value=match.match_value,
             )
         )
         lines_angles.append(match.angle_deg)
@@ -101,6 +104,83 @@ def _find_best_lines(
     return lines
 
 
+def _interpolate_peak(match_values: npt.NDArray[np.int64], peak_index: int) -> float:
+    """
+    Уточняет положение максимума гистограммы совпадений между ее отсчетами. Для плато из
+    одинаковых значений берется его середина, которая сдвигается параболой, проведенной через
+    плато и соседние отсчеты
+
+    :param match_values: значения совпадений для соседних углов
+    :param peak_index: номер отсчета с максимальным совпадением
+    :return: положение максимума в отсчетах, может быть дробным
+    """
+    peak_value = match_values[peak_index]
+    first = peak_index
+    while first > 0 and match_values[first - 1] == peak_value:
+        first -= 1
+    last = peak_index
+    while last < len(match_values) - 1 and match_values[last + 1] == peak_value:
+        last += 1
+
+    center = (first + last) / 2
+    if first == 0 or last == len(match_values) - 1:
+        return center
+
+    left_value = int(match_values[first - 1])
+    right_value = int(match_values[last + 1])
+    curvature = 2 * int(peak_value) - left_value - right_value
+    if curvature <= 0:
+        return center
+    offset = 0.5 * (right_value - left_value) / curvature
+    return center + max(-0.5, min(0.5, offset))
+
+
+def _refine_lines(
+    src_image: MatLike | PackedMask,
+    lines: list[Line],
+    angle_steps_deg: Sequence[float],
+    min_len_line_pix: int,
+    max_len_line_pix: int,
+    color: int,
+) -> list[Line]:
+    """
+    Уточняет углы найденных линий поиском с последовательно уменьшающимся шагом. На каждом шаге
+    поиск выполняется только в окне вокруг угла, найденного на предыдущем шаге, а на последнем
+    шаге угол уточняется интерполяцией максимума гистограммы совпадений
+
+    :param src_image: одноканальное бинарное изображение или упакованная маска
+    :param lines: линии, найденные грубым поиском с шагом ``angle_steps_deg[0]``
+    :param angle_steps_deg: шаги поиска, начиная с шага грубого поиска
+    :param min_len_line_pix: минимальная длина линии
+    :param max_len_line_pix: максимальная длина линии
+    :param color: цвет линии
+    :return: линии с уточненными углами
+    """
+    refined_lines = []
+    for line in lines:
+        angle_deg = float(line.angle_deg)
+        match_value = line.match_value
+        for previous_step_deg, angle_step_deg in itertools.pairwise(angle_steps_deg):
+            grid = get_ray_grid(
+                src_image.shape[:2],
+                line.line_start,
+                angle_step_deg,
+                min_len_line_pix,
+                max_len_line_pix,
+            )
+            rows, first_angle_deg = grid.angle_window(
+                angle_deg, angle_spacing_deg(previous_step_deg)
+            )
+            match_values = grid.count_matches(src_image, color, rows)
+
+            peak_index = int(np.argmax(match_values))
+            match_value = int(match_values[peak_index])
+            peak_position = _interpolate_peak(match_values, peak_index)
+            angle_deg = (first_angle_deg + peak_position * grid.angle_spacing_deg) % 360
+        refined_lines.append(replace(line, angle_deg=angle_deg, match_value=match_value))
+    return refined_lines
+
+
 def _angle_to_hours(arrow_angle: float) -> int:
     """
     Перевод угла поворота стрелки в часы
@@ -134,6 +214,35 @@ def _angles_to_ms(arrow_angle: float) -> int:
     return milliseconds
 
 
+def _classify_hands(
+    lines: list[Line], profile: RadialProfile, scale: int
+) -> tuple[Line, Line, Line]:
+    """
+    Определяет по радиальному профилю грубого поиска, какая из линий какая стрелка. Секундная
+    стрелка самая тонкая, часовая - самая толстая. Толщина измеряется в углах, поэтому короткая
+    часовая стрелка выглядит толще минутной той же ширины. При одинаковой толщине линии
+    различаются по количеству совпадений, как раньше: длинная стрелка совпадает с большим
+    количеством пикселей. Длина линий заменяется длиной стрелок по профилю
+
+    :param lines: 3 уточненные линии, упорядоченные по убыванию совпадения
+    :param profile: радиальный профиль изображения грубого поиска
+    :param scale: коэффициент уменьшения изображения грубого поиска
+    :return: часовая, минутная и секундная стрелки
+    """
+    assert len(lines) == 3, f'Ожидается 3 линии, найдено: {len(lines)}'
+    features = [profile.values[profile.nearest_row(line.angle_deg)] for line in lines]
+    hands = [
+        replace(line, len_line=max(int(feature[PROFILE_LAST_HIT]) * scale, 0))
+        for line, feature in zip(lines, features, strict=True)
+    ]
+    order = sorted(
+        range(len(hands)),
+        key=lambda index: (int(features[index][PROFILE_THICKNESS]), -hands[index].match_value),
+    )
+    seconds_arrow, minutes_arrow, hours_arrow = (hands[index] for index in order)
+    return hours_arrow, minutes_arrow, seconds_arrow
+
+
 def _convert_angle_to_time(
     hours_arrow: Line, minutes_arrow: Line, seconds_arrow: Line
 ) -> ClockTime:
@@ -153,13 +262,503 @@ def _convert_angle_to_time(
     return ClockTime(hours=hours, minutes=minutes, seconds=seconds, ms=milliseconds)
 
 
+IMAGE_CENTER: Point = (315, 250)
+"""Координаты центра циферблата на изображении"""
+
+BINARY_THRESHOLD: int = 220
+"""Порог яркости, выше которого пиксели считаются принадлежащими стрелкам"""
+
+MIN_LEN_LINE_PIX: int = 0
+"""Минимальная длина стрелки в пикселях, пиксели ближе к центру не проверяются"""
+
+MAX_LEN_LINE_PIX: int = 200
+"""Максимальная длина стрелки в пикселях"""
+
+DIAL_RADIUS_PIX: float = 222
+"""Радиус циферблата в пикселях, для которого подобрана максимальная длина стрелки"""
+
+CALIBRATED_DIAL = DialGeometry(center=IMAGE_CENTER, radius=DIAL_RADIUS_PIX)
+"""Откалиброванное положение циферблата на изображениях *files/Изображения*"""
+
+DIAL_TICK_OFFSET_PIX: tuple[float, float] = (0.3, -0.9)
+"""
+Смещение центра минутных меток относительно центра стрелок на изображениях *files/Изображения*:
+метки циферблата этих часов сняты на 0.3 пикселя правее и на 0.9 пикселя выше оси стрелок
+"""
+
+DIAL_CALIBRATIONS: dict[tuple[Hashable, tuple[int, int]], DialCalibration] = {
+    (None, (480, 640)): DialCalibration(dial=CALIBRATED_DIAL, tick_offset=DIAL_TICK_OFFSET_PIX)
+}
+"""
+Калибровки циферблата по идентификатору камеры и размеру кадра (высота, ширина). Для камер, которых
+нет в словаре, циферблат определяется только по изображениям, а центром стрелок считается центр
+минутных меток. Камера *files/Изображения* задана для кадров 640x480 без идентификатора камеры
+"""
+
+
+def dial_calibration(
+    image_shape: tuple[int, ...], camera_id: Hashable = None
+) -> DialCalibration | None:
+    """
+    :param image_shape: размер кадров камеры
+    :param camera_id: идентификатор камеры
+    :return: калибровка циферблата камеры или None, если камера не откалибрована
+    """
+    height, width = image_shape[:2]
+    return DIAL_CALIBRATIONS.get((camera_id, (height, width)))
+
+
+COARSE_SEARCH_MIN_LEN_PIX: int = 100
+"""
+Минимальная длина линии на уменьшенном изображении, на котором выполняется грубый поиск линий.
+Изображение уменьшается в 2, 4, 8... раз, пока длина линии не станет меньше этого значения
+"""
+
+_BATCH_GATHER_SIZE = 64
+"""Количество изображений пачки, для которых совпадения считаются одной выборкой"""
+
+
+@dataclass(frozen=True)
+class DetectParams:
+    """Настраиваемые параметры алгоритма определения времени"""
+
+    binary_threshold: int = BINARY_THRESHOLD
+    """ Порог яркости бинаризации """
+    min_len_line_pix: int = MIN_LEN_LINE_PIX
+    """ Минимальная длина стрелки для циферблата радиусом ``DIAL_RADIUS_PIX`` """
+    max_len_line_pix: int = MAX_LEN_LINE_PIX
+    """ Максимальная длина стрелки для циферблата радиусом ``DIAL_RADIUS_PIX`` """
+    min_angle_diff_deg: float = MIN_ANGLE_DIFF_DEG
+    """ Минимальная разница углов между стрелками """
+    angle_steps_deg: tuple[float, ...] = ANGLE_STEP_SCHEDULE_DEG
+    """ Шаги поиска стрелок, см. ``ANGLE_STEP_SCHEDULE_DEG`` """
+
+
+DEFAULT_DETECT_PARAMS = DetectParams()
+"""Параметры алгоритма по умолчанию"""
+
+
+def _binarize_image(
+    image: MatLike, debugger: Debugger, threshold: int = BINARY_THRESHOLD
+) -> MatLike:
+    """
+    Переводит цветное изображение в бинарное, в котором белыми остаются только светлые стрелки и
+    метки циферблата
+
+    :param image: цветное изображение часов в формате BGR или уже серое изображение
+    :param debugger: отладчик
+    :param threshold: порог яркости бинаризации
+    :return: одноканальное бинарное изображение
+    """
+    image_gray = image
+    if image.ndim == 3:
+        with debugger.measure_stage('Перевод в серое'):
+            image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    debugger.save_image('Серое изображение', image_gray)
+
+    with debugger.measure_stage('Бинаризация'):
+        image_binary = cv2.threshold(image_gray, threshold, 255, cv2.THRESH_BINARY)[1]
+    debugger.save_image('Бинарное изображение', image_binary)
+    return image_binary
+
+
+def _locate_dial(
+    image: MatLike, debugger: Debugger, dial: DialGeometry | None = None, camera_id: Hashable = None
+) -> DialGeometry:
+    """
+    Находит положение циферблата. Циферблат ищется один раз для камеры, камера определяется
+    идентификатором и размером изображения
+
+    :param image: серое или цветное в формате BGR изображение часов
+    :param debugger: отладчик
+    :param dial: известное положение циферблата. Если задано, циферблат не ищется
+    :param camera_id: идентификатор камеры
+    :return: положение циферблата
+    """
+    if dial is None:
+        with debugger.measure_stage('Поиск циферблата'):
+            dial = get_dial_locator(
+                image.shape, dial_calibration(image.shape, camera_id), camera_id
+            ).locate(image)
+    debugger.save_image('Циферблат', functools.partial(_draw_dial, image, dial), DebugLevel.DETAIL)
+    return dial
+
+
+def _line_lengths(dial: DialGeometry, params: DetectParams) -> tuple[int, int]:
+    """
+    Минимальная и максимальная длина стрелки, пересчитанные по радиусу циферблата
+
+    :param dial: положение циферблата
+    :param params: параметры алгоритма
+    :return: минимальная и максимальная длина стрелки в пикселях
+    """
+    ratio = dial.radius / DIAL_RADIUS_PIX
+    return round(params.min_len_line_pix * ratio), round(params.max_len_line_pix * ratio)
+
+
+def _draw_dial(image: MatLike, dial: DialGeometry) -> MatLike:
+    image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image.copy()
+    cv2.circle(image, dial.center, round(dial.radius), (0, 255, 0), 2)
+    cv2.drawMarker(image, dial.center, (0, 0, 255), cv2.MARKER_CROSS, 20, 2)
+    return image
+
+
+def _dial_roi(
+    image_shape: tuple[int, ...], image_center: Point, max_len_line_pix: int
+) -> tuple[slice, slice, Point]:
+    """
+    Область изображения, в которую попадают все пиксели, проверяемые при поиске линий: квадрат
+    вокруг центра циферблата со стороной в две максимальные длины линии, обрезанный по границам
+    изображения. Перевод в серое и бинаризация выполняются только для этой области
+
+    :param image_shape: размер изображения
+    :param image_center: координаты центра циферблата на изображении
+    :param max_len_line_pix: максимальная длина линии
+    :return: строки и столбцы области и координаты центра циферблата в области
+    """
+    height, width = image_shape[:2]
+    left = max(image_center[0] - max_len_line_pix, 0)
+    top = max(image_center[1] - max_len_line_pix, 0)
+    right = min(image_center[0] + max_len_line_pix + 1, width)
+    bottom = min(image_center[1] + max_len_line_pix + 1, height)
+    roi_center = (image_center[0] - left, image_center[1] - top)
+    return slice(top, bottom), slice(left, right), roi_center
+
+
+def _coarse_search_scale(max_len_line_pix: int) -> int:
+    """
+    Во сколько раз уменьшается бинарное изображение для грубого поиска линий
+
+    :param max_len_line_pix: максимальная длина линии на исходном изображении
+    :return: коэффициент уменьшения, степень двойки
+    """
+    scale = 1
+    while max_len_line_pix // (scale * 2) >= COARSE_SEARCH_MIN_LEN_PIX:
+        scale *= 2
+    return scale
+
+
+def _downscale_binary(image_binary: MatLike, scale: int) -> MatLike:
+    """
+    Уменьшает бинарное изображение или пачку бинарных изображений в целое число раз. Пиксель
+    уменьшенного изображения белый, если в его блоке есть хотя бы один белый пиксель, поэтому
+    тонкие стрелки при уменьшении не пропадают
+
+    :param image_binary: бинарное изображение или пачка изображений формы (количество
+      изображений, высота, ширина)
+    :param scale: коэффициент уменьшения
+    :return: уменьшенное бинарное изображение или пачка изображений
+    """
+    if scale == 1:
+        return image_binary
+    height, width = image_binary.shape[-2] // scale, image_binary.shape[-1] // scale
+    # Высота каждого изображения кратна коэффициенту, поэтому изображения пачки можно уменьшать
+    # одним вызовом, сложив их по вертикали: усредняемые блоки не переходят между изображениями
+    cropped = np.ascontiguousarray(image_binary[..., : height * scale, : width * scale])
+    stacked = cropped.reshape(-1, width * scale)
+    averaged = cv2.resize(stacked, (width, len(stacked) // scale), interpolation=cv2.INTER_AREA)
+    downscaled = cv2.threshold(averaged, 0, 255, cv2.THRESH_BINARY)[1]
+    return downscaled.reshape(*image_binary.shape[:-2], height, width)
+
+
+def _find_coarse_lines(
+    image_binary: MatLike,
+    image_center: Point,
+    line_lengths: tuple[int, int],
+    scale: int,
+    params: DetectParams,
+) -> tuple[list[Line], MatLike, RadialProfile]:
+    """
+    Грубый поиск линий на бинарном изображении, уменьшенном в заданное число раз. Найденные линии
+    переводятся в координаты исходного изображения
+
+    :param image_binary: бинарное изображение
+    :param image_center: центр циферблата на бинарном изображении
+    :param line_lengths: минимальная и максимальная длина линии на бинарном изображении
+    :param scale: коэффициент уменьшения, см. ``_coarse_search_scale``
+    :param params: параметры алгоритма
+    :return: 3 лучшие линии, уменьшенное изображение, на котором они найдены, и его радиальный
+      профиль
+    """
+    min_len_line_pix, max_len_line_pix = line_lengths
+    coarse_binary = _downscale_binary(image_binary, scale)
+    coarse_center = (image_center[0] // scale, image_center[1] // scale)
+    grid = get_ray_grid(
+        coarse_binary.shape[:2],
+        coarse_center,
+        params.angle_steps_deg[0],
+        min_len_line_pix // scale,
+        max_len_line_pix // scale,
+    )
+    profile = grid.radial_profile(coarse_binary)
+    best_lines = _select_best_lines(
+        _sorted_match_result(profile.match_values, grid.angles_deg, coarse_center),
+        max_len_line_pix // scale,
+        params.min_angle_diff_deg,
+    )
+    return _scale_lines(best_lines, image_center, max_len_line_pix), coarse_binary, profile
+
+
+def _scale_lines(lines: list[Line], image_center: Point, max_len_line_pix: int) -> list[Line]:
+    return [replace(line, line_start=image_center, len_line=max_len_line_pix) for line in lines]
+
+
+def _refine_coarse_lines(
+    src_image: MatLike | PackedMask,
+    lines: list[Line],
+    line_lengths: tuple[int, int],
+    scale: int,
+    angle_steps_deg: tuple[float, ...],
+) -> list[Line]:
+    """
+    Уточняет углы линий, найденных грубым поиском на уменьшенном изображении. Если изображение
+    уменьшалось, то первое уточнение выполняется по исходному изображению с шагом грубого поиска
+    в окне, покрывающем погрешность уменьшенного изображения, а уточненные линии упорядочиваются
+    по совпадениям на исходном изображении: по порядку линий определяется, какая из них какая
+    стрелка, а на уменьшенном изображении порядок близких по совпадению линий может отличаться
+
+    :param src_image: одноканальное бинарное изображение или упакованная маска
+    :param lines: линии грубого поиска в координатах исходного изображения
+    :param line_lengths: минимальная и максимальная длина линии
+    :param scale: коэффициент уменьшения изображения грубого поиска
+    :param angle_steps_deg: шаги поиска, начиная с шага грубого поиска
+    :return: линии с уточненными углами
+    """
+    if scale == 1:
+        return _refine_lines(src_image, lines, angle_steps_deg, *line_lengths, 255)
+    angle_steps_deg = (angle_steps_deg[0] * scale, *angle_steps_deg)
+    refined_lines = _refine_lines(src_image, lines, angle_steps_deg, *line_lengths, 255)
+    refined_lines.sort(key=lambda line: line.match_value, reverse=True)
+    return refined_lines
+
+
+def _prepare_dial_image(
+    image: MatLike,
+    debugger: Debugger,
+    dial: DialGeometry | None,
+    params: DetectParams,
+    camera_id: Hashable = None,
+) -> tuple[MatLike, Point, tuple[int, int]]:
+    """
+    Находит циферблат и бинаризует область изображения вокруг него
+
+    :param image: цветное изображение часов в формате BGR или серое изображение
+    :param debugger: отладчик
+    :param dial: положение циферблата на изображении. Если не задано, циферблат ищется
+    :param params: параметры алгоритма
+    :param camera_id: идентификатор камеры, для которой запоминается положение циферблата
+    :return: бинарное изображение области циферблата, центр циферблата в области и минимальная и
+      максимальная длина стрелки
+    """
+    dial = _locate_dial(image, debugger, dial, camera_id)
+    line_lengths = _line_lengths(dial, params)
+    rows, columns, image_center = _dial_roi(image.shape, dial.center, line_lengths[1])
+    image_binary = _binarize_image(image[rows, columns], debugger, params.binary_threshold)
+    return image_binary, image_center, line_lengths
+
+
+def _search_hands(
+    image_binary: MatLike,
+    image_center: Point,
+    line_lengths: tuple[int, int],
+    params: DetectParams,
+    debugger: Debugger,
+) -> tuple[Line, Line, Line]:
+    """
+    Полный поиск стрелок по всем углам: грубый поиск на уменьшенном изображении, уточнение углов
+    и различение стрелок по радиальному профилю
+
+    :param image_binary: бинарное изображение области циферблата
+    :param image_center: центр циферблата в области
+    :param line_lengths: минимальная и максимальная длина стрелки
+    :param params: параметры алгоритма
+    :param debugger: отладчик
+    :return: часовая, минутная и секундная стрелки
+    """
+    scale = _coarse_search_scale(line_lengths[1])
+    with debugger.measure_stage('Поиск линий'):
+        best_lines, coarse_binary, profile = _find_coarse_lines(
+            image_binary, image_center, line_lengths, scale, params
+        )
+    if scale > 1:
+        debugger.save_image('Уменьшенное бинарное изображение', coarse_binary, DebugLevel.DETAIL)
+    with debugger.measure_stage('Уточнение углов'):
+        best_lines = _refine_coarse_lines(
+            image_binary, best_lines, line_lengths, scale, params.angle_steps_deg
+        )
+        return _classify_hands(best_lines, profile, scale)
+
+
+def detect_time_from_image(
+    image: MatLike,
+    debug_mode: None | Debugger = None,
+    dial: DialGeometry | None = None,
+    params: DetectParams = DEFAULT_DETECT_PARAMS,
+    camera_id: Hashable = None,
+) -> ClockTime:
+    """
+    Определение времени на часах по уже загруженному изображению, например по кадру видео.
+    Изображение обрабатывается только в области циферблата, поэтому промежуточные изображения и
+    координаты линий приводятся относительно этой области
+
+    :param image: цветное изображение часов в формате BGR или серое изображение
+    :param debug_mode: режим отладки
+    :param dial: положение циферблата на изображении, например для изображений, обрезанных по
+      циферблату. Если не задано, циферблат ищется по изображению
+    :param params: параметры алгоритма
+    :param camera_id: идентификатор камеры, для которой запоминается положение циферблата.
+      Изображениям разных камер одного размера нужно задавать разные идентификаторы
+    :return: время на часах в формате чч:мм:сс.мс
+    """
+    debugger = debug_mode if debug_mode is not None else DummyDebugger()
+
+    # Поиск линий на изображении
+    image_binary, image_center, line_lengths = _prepare_dial_image(
+        image, debugger, dial, params, camera_id
+    )
+    hands = _search_hands(image_binary, image_center, line_lengths, params, debugger)
+    # Отрисовка линий на бинарном изображении, цветное изображение создается только в отладчике
+    debugger.save_image_with_lines(RESULT_IMAGE_NAME, image_binary, list(hands), DebugLevel.RESULT)
+
+    # Сохранение результата алгоритма определения времени
+    result_time = _convert_angle_to_time(*hands)
+    return result_time
+
+
+def _mask_to_image(mask: MatLike | PackedMask) -> MatLike:
+    return mask.to_image() if isinstance(mask, PackedMask) else mask
+
+
+def _share_timing(timing: StageTiming, count_images: int) -> StageTiming:
+    return StageTiming(
+        wall_ms=timing.wall_ms / count_images, cpu_ms=timing.cpu_ms / count_images, calls=1
+    )
+
+
+def detect_time_batch(
+    images_gray: npt.NDArray[np.uint8],
+    packed: bool = False,
+    debug_modes: None | Sequence[Debugger] = None,
+    dial: DialGeometry | None = None,
+    params: DetectParams = DEFAULT_DETECT_PARAMS,
+    camera_id: Hashable = None,
+) -> tuple[list[ClockTime], BatchMatchResult]:
+    """
+    Определение времени на пачке изображений одного размера, снятых одной камерой. Изображения
+    бинаризуются частями по несколько десятков одним вызовом, а совпадения по всем углам для всех
+    изображений части считаются общей выборкой, поэтому накладные расходы Python приходятся на
+    пачку, а не на изображение. Как и в ``detect_time_from_image``, обрабатывается только
+    область циферблата, а грубый поиск выполняется по уменьшенным бинарным изображениям
+
+    :param images_gray: серые изображения часов, форма (количество изображений, высота, ширина)
+    :param packed: упаковывать бинарные изображения по 8 пикселей в байт. Уменьшает объем
+      памяти при обработке больших пачек
+    :param debug_modes: режимы отладки для каждого изображения пачки
+    :param dial: положение циферблата на изображениях. Если не задано, циферблат ищется по
+      первому изображению пачки
+    :param params: параметры алгоритма
+    :param camera_id: идентификатор камеры, см. ``detect_time_from_image``
+    :return: время на часах для каждого изображения и совпадения линий грубого поиска для всех
+      углов, центр линий - в координатах области циферблата
+    """
+    assert images_gray.ndim == 3, f'Ожидается пачка серых изображений, форма: {images_gray.shape}'
+    count_images, height, width = images_gray.shape
+    debuggers = debug_modes if debug_modes is not None else [DummyDebugger()] * count_images
+    assert len(debuggers) == count_images, 'Количество отладчиков не совпадает с размером пачки'
+
+    # Изображения пачки сняты одной камерой, поэтому циферблат ищется по первому изображению
+    if dial is None:
+        with measure_time() as locate_timing:
+            locator = get_dial_locator(
+                (height, width), dial_calibration((height, width), camera_id), camera_id
+            )
+            dial = locator.locate(images_gray[0])
+        for debugger in debuggers:
+            debugger.add_stage_time('Поиск циферблата', _share_timing(locate_timing, count_images))
+    line_lengths = _line_lengths(dial, params)
+    min_len_line_pix, max_len_line_pix = line_lengths
+    rows, columns, image_center = _dial_roi(images_gray.shape[1:], dial.center, max_len_line_pix)
+    images_gray = images_gray[:, rows, columns]
+    height, width = images_gray.shape[1:]
+
+    scale = _coarse_search_scale(max_len_line_pix)
+    grid = get_ray_grid(
+        (height // scale, width // scale),
+        (image_center[0] // scale, image_center[1] // scale),
+        params.angle_steps_deg[0],
+        min_len_line_pix // scale,
+        max_len_line_pix // scale,
+    )
+    # Профили всех изображений пачки записываются в один заранее выделенный массив
+    profile_values = np.empty((count_images, len(grid.angles_deg), 5), dtype=np.int32)
+    masks: list[MatLike | PackedMask] = []
+    for start in range(0, count_images, _BATCH_GATHER_SIZE):
+        chunk_gray = images_gray[start : start + _BATCH_GATHER_SIZE]
+        chunk_size = len(chunk_gray)
+        with measure_time() as binarize_timing:
+            chunk_binary = cv2.threshold(
+                chunk_gray.reshape(chunk_size * height, width),
+                params.binary_threshold,
+                255,
+                cv2.THRESH_BINARY,
+            )[1].reshape(chunk_size, height, width)
+
+        with measure_time() as match_timing:
+            coarse_binary = _downscale_binary(chunk_binary, scale)
+            grid.radial_profile(coarse_binary, out=profile_values[start : start + chunk_size])
+            if packed:
+                chunk_packed = PackedMask.from_image(chunk_binary)
+                masks.extend(chunk_packed[index] for index in range(chunk_size))
+            else:
+                masks.extend(chunk_binary)
+
+        # Время общих для части этапов делится поровну между ее изображениями
+        for debugger in debuggers[start : start + chunk_size]:
+            debugger.add_stage_time('Бинаризация', _share_timing(binarize_timing, chunk_size))
+            debugger.add_stage_time('Поиск линий', _share_timing(match_timing, chunk_size))
+
+    profiles = RadialProfile(values=profile_values, angles_deg=grid.angles_deg)
+    batch_match_result = BatchMatchResult(
+        angles_deg=grid.angles_deg,
+        match_values=profiles.match_values.astype(np.int64),
+        arrow_start=image_center,
+    )
+    result_times = []
+    for index, (image_gray, mask, debugger) in enumerate(
+        zip(images_gray, masks, debuggers, strict=True)
+    ):
+        profile = profiles[index]
+        with debugger.measure_stage('Поиск линий'):
+            sorted_match_result = _sorted_match_result(
+                profile.match_values, grid.angles_deg, image_center
+            )
+            best_lines = _select_best_lines(
+                sorted_match_result, max_len_line_pix, params.min_angle_diff_deg
+            )
+        with debugger.measure_stage('Уточнение углов'):
+            best_lines = _refine_coarse_lines(
+                mask, best_lines, line_lengths, scale, params.angle_steps_deg
+            )
+            hands = _classify_hands(best_lines, profile, scale)
+
+        # Упакованная маска распаковывается, только если отладчик сохраняет изображение
+        image_binary = functools.partial(_mask_to_image, mask)
+        debugger.save_image('Серое изображение', image_gray)
+        debugger.save_image('Бинарное изображение', image_binary)
+        debugger.save_image_with_lines(
+            RESULT_IMAGE_NAME, image_binary, list(hands), DebugLevel.RESULT
+        )
+        result_times.append(_convert_angle_to_time(*hands))
+    return result_times, batch_match_result
+
+
 def detect_time(
     root_folder: Path, image_path: Path, debug_mode: None | Debugger = None
 ) -> ClockTime:
     """
     Скрипт определения времени на часах.
-    Ниже приведены примеры как пользоваться дебагером, чтобы сохранять промежуточные результаты
-    работы алгоритма.
+    В ``detect_time_from_image`` приведены примеры как пользоваться дебагером, чтобы сохранять
+    промежуточные результаты работы алгоритма.
 
     :param image_path: корневая папка проекта. Может быть полезна для загрузки дополнительных
       артефактов работы алгоритма, например шаблонов стрелок и т. д.
@@ -168,22 +767,6 @@ def detect_time(
     :return: время на часах в формате чч:мм:сс.мс
     """
     debugger = debug_mode if debug_mode is not None else DummyDebugger()
-
-    image = cv2.imread(image_path.as_posix(), cv2.IMREAD_COLOR)
-
-    image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    debugger.save_image('Серое изображение', image_gray)
-
-    # Поиск линий на изображении
-    image_binary = cv2.threshold(image_gray, 220, 255, cv2.THRESH_BINARY)[1]
-    debugger.save_image('Бинарное изображение', image_binary)
-    image_binary_rgba = cv2.cvtColor(image_binary, cv2.COLOR_GRAY2BGRA)
-
-    image_center = (315, 250)
-    best_lines = _find_best_lines(image_binary_rgba, image_center, 1, 0, 200, (255, 255, 255, 255))
-    # Отрисовка линий на оригинальном изображении
-    debugger.save_image_with_lines('Линия из центра изображения', image_binary_rgba, best_lines)
-
-    # Сохранение результата алгоритма определения времени
-    result_time = _convert_angle_to_time(best_lines[2], best_lines[1], best_lines[0])
-    return result_time
+    with debugger.measure_stage('Чтение изображения'):
+        image = read_image(image_path)
+    return detect_time_from_image(image, debugger)
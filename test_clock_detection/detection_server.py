@@ -0,0 +1,467 @@
+import argparse
+import asyncio
+import json
+import math
+import socket
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from test_clock_detection.algorithm_debugger import TimingDebugger
+from test_clock_detection.const import (
+    SERVER_MAX_BATCH_SIZE,
+    SERVER_MAX_WAIT_MS,
+    SERVER_PORT,
+    STAGE_TIME_PERCENTILES,
+)
+from test_clock_detection.data_types import Detection
+from test_clock_detection.detect_time import CALIBRATED_DIAL, detect_time_batch
+from test_clock_detection.image_reader import read_image
+
+SERVER_STATS_WINDOW: int = 1000
+"""Количество последних запросов и пачек, по которым считаются перцентили задержки"""
+
+_MAX_HEADER_BYTES = 64 * 1024
+"""Максимальная длина строки заголовка запроса"""
+
+
+@dataclass
+class _Request:
+    """Запрос определения времени, ожидающий обработки в очереди"""
+
+    source: MatLike | Path
+    """ Кадр в формате BGR или серый либо путь до изображения """
+    camera: str | None
+    """ Идентификатор камеры, снявшей кадр """
+    received: float
+    """ Время получения запроса по ``time.perf_counter`` """
+    future: 'asyncio.Future[Detection]'
+    """ Результат, который ожидает обработчик соединения """
+
+
+@dataclass
+class ServerStats:
+    """Счетчики сервера определения времени"""
+
+    requests: int = 0
+    """ Количество обработанных запросов определения времени """
+    errors: int = 0
+    """ Количество запросов, завершившихся ошибкой """
+    batches: int = 0
+    """ Количество пачек, переданных алгоритму """
+    max_queue_depth: int = 0
+    """ Максимальное количество запросов в очереди за время работы """
+    latencies_ms: deque[float] = field(default_factory=lambda: deque(maxlen=SERVER_STATS_WINDOW))
+    """ Время от получения запроса до готовности результата для последних запросов """
+    batch_sizes: deque[int] = field(default_factory=lambda: deque(maxlen=SERVER_STATS_WINDOW))
+    """ Размеры последних пачек """
+
+    def to_dict(self, queue_depth: int) -> dict[str, Any]:
+        """
+        Формирует словарь со счетчиками для ответа на запрос статистики
+
+        :param queue_depth: текущее количество запросов в очереди
+        :return: словарь с простыми типами, который можно сохранить в JSON
+        """
+        latencies = np.array(self.latencies_ms, dtype=np.float64)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'queue_depth': queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'mean_batch_size': (
+                round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else 0
+            ),
+            'latency_ms': {
+                f'p{percentile}': (
+                    round(float(np.percentile(latencies, percentile)), 3) if len(latencies) else 0
+                )
+                for percentile in STAGE_TIME_PERCENTILES
+            },
+        }
+
+
+def _detect_frames(
+    sources: list[MatLike | Path], cameras: list[str | None]
+) -> list[Detection | str]:
+    """
+    Определяет время на кадрах пачки. Кадры одной камеры и одного размера обрабатываются одним
+    вызовом ``detect_time_batch``. Если вызов завершился ошибкой, кадры обрабатываются по одному,
+    чтобы ошибку получили только запросы с неподходящими кадрами
+
+    :param sources: кадры в формате BGR или серые либо пути до изображений
+    :param cameras: идентификаторы камер, снявших кадры
+    :return: результат для каждого кадра или текст ошибки
+    """
+    results: list[Detection | str] = ['' for _ in sources]
+    frames_by_camera: dict[tuple[str | None, tuple[int, ...]], list[tuple[int, MatLike]]] = {}
+    for index, (source, camera) in enumerate(zip(sources, cameras, strict=True)):
+        try:
+            image = read_image(source) if isinstance(source, Path) else source
+            assert image is not None, f'Не удалось прочитать изображение {source}'
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        except Exception as exc:  # noqa: BLE001 - ошибка возвращается запросу кадра
+            results[index] = _error_text(exc)
+            continue
+        frames_by_camera.setdefault((camera, gray.shape), []).append((index, gray))
+
+    for (camera, _), frames in frames_by_camera.items():
+        try:
+            detections: list[Detection | str] = list(
+                _detect_same_camera([gray for _, gray in frames], camera)
+            )
+        except Exception:  # noqa: BLE001 - кадры проверяются по одному
+            detections = [_detect_or_error(gray, camera) for _, gray in frames]
+        for (index, _), detection in zip(frames, detections, strict=True):
+            results[index] = detection
+    return results
+
+
+def _detect_same_camera(images_gray: list[MatLike], camera: str | None) -> list[Detection]:
+    """
+    Определяет время одним вызовом ``detect_time_batch`` на серых кадрах одной камеры и одного
+    размера
+
+    :param images_gray: серые кадры
+    :param camera: идентификатор камеры, снявшей кадры
+    :return: результат для каждого кадра
+    """
+    debuggers = [TimingDebugger() for _ in images_gray]
+    times, _ = detect_time_batch(np.stack(images_gray), debug_modes=debuggers, camera_id=camera)
+    return [
+        Detection(
+            clock_time=clock_time,
+            hand_angles_deg=[float(line.angle_deg) for line in debugger.result_lines],
+            match_values=[line.match_value for line in debugger.result_lines],
+        )
+        for clock_time, debugger in zip(times, debuggers, strict=True)
+    ]
+
+
+def _detect_or_error(image_gray: MatLike, camera: str | None) -> Detection | str:
+    try:
+        return _detect_same_camera([image_gray], camera)[0]
+    except Exception as exc:  # noqa: BLE001 - ошибка возвращается запросу кадра
+        return _error_text(exc)
+
+
+def _error_text(exc: Exception) -> str:
+    return f'{type(exc).__name__}: {exc}'
+
+
+def _parse_request(header: dict[str, Any], payload: bytes | None) -> MatLike | Path | str:
+    """
+    Разбирает запрос определения времени
+
+    :param header: заголовок запроса
+    :param payload: пиксели кадра, если кадр передан в запросе
+    :return: кадр, путь до изображения или текст ошибки
+    """
+    if 'path' in header:
+        path = Path(header['path'])
+        return path if path.is_file() else f'Файл {path} не найден'
+    assert payload is not None
+    return np.frombuffer(payload, dtype=np.uint8).reshape(header['shape'])
+
+
+def _payload_size(header: dict[str, Any]) -> int | str:
+    """
+    Проверяет форму кадра, переданного в запросе
+
+    :param header: заголовок запроса
+    :return: размер пикселей кадра в байтах или текст ошибки
+    """
+    shape = header.get('shape')
+    if (
+        not isinstance(shape, list)
+        or len(shape) not in (2, 3)
+        or not all(isinstance(size, int) and size > 0 for size in shape)
+        or (len(shape) == 3 and shape[2] != 3)
+    ):
+        return f'Ожидается форма кадра [высота, ширина] или [высота, ширина, 3], получено: {shape}'
+    return math.prod(shape)
+
+
+class DetectionServer:
+    """
+    Сервер определения времени, который держит алгоритм загруженным между запросами. Запросы,
+    пришедшие одновременно по разным соединениям, объединяются в пачку и обрабатываются одним
+    вызовом ``detect_time_batch``. Пачка отправляется, когда в ней набралось ``max_batch_size``
+    кадров или с получения первого кадра прошло ``max_wait_ms``, поэтому одиночный запрос ждет
+    не дольше ``max_wait_ms`` сверх времени обработки.
+
+    Протокол: запрос - строка JSON, ответ - строка JSON, по одному соединению можно передать
+    несколько запросов подряд. Запрос ``{"path": путь}`` - определить время на изображении с
+    диска, ``{"shape": [высота, ширина(, 3)]}`` и следом пиксели кадра в формате uint8 - на
+    переданном кадре, ``{"command": "stats"}`` - счетчики сервера. Положение циферблата
+    запоминается для каждой камеры, камера задается необязательным полем ``"camera"`` запроса
+    """
+
+    def __init__(
+        self, max_batch_size: int = SERVER_MAX_BATCH_SIZE, max_wait_ms: float = SERVER_MAX_WAIT_MS
+    ) -> None:
+        """
+        :param max_batch_size: максимальное количество кадров в пачке
+        :param max_wait_ms: максимальное время ожидания следующих кадров для пачки
+        """
+        assert max_batch_size > 0, f'Размер пачки должен быть положительным: {max_batch_size}'
+        self.max_batch_size = max_batch_size
+        """Максимальное количество кадров в пачке"""
+        self.max_wait_ms = max_wait_ms
+        """Максимальное время ожидания следующих кадров для пачки"""
+        self.stats = ServerStats()
+        """Счетчики сервера"""
+        self._queue: asyncio.Queue[_Request] = asyncio.Queue()
+        """Запросы, ожидающие обработки"""
+        # Алгоритм выполняется в отдельном потоке, чтобы цикл событий принимал запросы во время
+        # обработки пачки. Один поток - пачки обрабатываются по очереди и не делят ядро
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def warm_up(self) -> None:
+        """
+        Выполняет алгоритм на пустом кадре, чтобы первый запрос не ждал построения таблиц лучей
+        и инициализации OpenCV. Циферблат задается явно, чтобы пустой кадр не попал в
+        запомненное положение циферблата камеры
+        """
+        detect_time_batch(np.zeros((1, 480, 640), dtype=np.uint8), dial=CALIBRATED_DIAL)
+
+    async def serve(self, unix_path: Path | None, host: str, port: int) -> None:
+        """
+        Принимает соединения, пока процесс не будет остановлен
+
+        :param unix_path: путь до сокета Unix. None - сервер слушает TCP-порт
+        :param host: адрес TCP-сервера
+        :param port: порт TCP-сервера
+        """
+        batcher = asyncio.create_task(self._run_batches())
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(
+                self._handle_connection, unix_path, limit=_MAX_HEADER_BYTES
+            )
+        else:
+            server = await asyncio.start_server(
+                self._handle_connection, host, port, limit=_MAX_HEADER_BYTES
+            )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown()
+
+    async def detect(self, source: MatLike | Path, camera: str | None = None) -> Detection:
+        """
+        Ставит кадр в очередь и ждет результата его пачки
+
+        :param source: кадр в формате BGR или серый либо путь до изображения
+        :param camera: идентификатор камеры, снявшей кадр
+        :return: результат алгоритма
+        """
+        future: asyncio.Future[Detection] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Request(source, camera, time.perf_counter(), future))
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self) -> list[_Request]:
+        """
+        Ждет первый запрос и добирает к нему запросы, пришедшие в пределах ``max_wait_ms``
+
+        :return: запросы пачки
+        """
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            sources = [request.source for request in batch]
+            cameras = [request.camera for request in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, _detect_frames, sources, cameras
+                )
+            except Exception as exc:  # noqa: BLE001 - ошибка пачки возвращается всем ее запросам
+                results = [_error_text(exc) for _ in batch]
+            self.stats.batches += 1
+            self.stats.batch_sizes.append(len(batch))
+            finished = time.perf_counter()
+            for request, result in zip(batch, results, strict=True):
+                self.stats.requests += 1
+                self.stats.latencies_ms.append((finished - request.received) * 1000)
+                if request.future.cancelled():
+                    continue
+                if isinstance(result, Detection):
+                    request.future.set_result(result)
+                else:
+                    self.stats.errors += 1
+                    request.future.set_exception(ValueError(result))
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            keep_open = True
+            while keep_open and (header_line := await reader.readline()):
+                response, keep_open = await self._handle_request(header_line, reader)
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b'\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(
+        self, header_line: bytes, reader: asyncio.StreamReader
+    ) -> tuple[dict[str, Any], bool]:
+        """
+        Выполняет один запрос соединения
+
+        :param header_line: строка заголовка запроса
+        :param reader: поток соединения, из которого читаются пиксели кадра
+        :return: ответ на запрос и признак того, что соединение можно читать дальше. После
+          ошибки в заголовке кадра неизвестно, сколько байт пикселей пропустить
+        """
+        received = time.perf_counter()
+        try:
+            header = json.loads(header_line)
+        except json.JSONDecodeError as exc:
+            return {'error': f'Заголовок запроса не JSON: {exc}'}, False
+        if not isinstance(header, dict):
+            return {'error': 'Заголовок запроса должен быть объектом JSON'}, False
+        if header.get('command') == 'stats':
+            return self.stats.to_dict(self._queue.qsize()), True
+        camera = header.get('camera')
+        if camera is not None and not isinstance(camera, str):
+            return {'error': f'Идентификатор камеры должен быть строкой: {camera}'}, False
+
+        payload = None
+        if 'path' not in header:
+            payload_size = _payload_size(header)
+            if isinstance(payload_size, str):
+                return {'error': payload_size}, False
+            payload = await reader.readexactly(payload_size)
+        source = _parse_request(header, payload)
+        if isinstance(source, str):
+            self.stats.requests += 1
+            self.stats.errors += 1
+            return {'error': source}, True
+        try:
+            detection = await self.detect(source, camera)
+        except ValueError as exc:
+            return {'error': str(exc)}, True
+        return {
+            'time': str(detection.clock_time),
+            'hand_angles_deg': detection.hand_angles_deg,
+            'match_values': detection.match_values,
+            'latency_ms': round((time.perf_counter() - received) * 1000, 3),
+        }, True
+
+
+def _connect(unix_path: Path | None, host: str, port: int) -> socket.socket:
+    if unix_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(unix_path.as_posix())
+        return connection
+    return socket.create_connection((host, port))
+
+
+def query_server(
+    requests: list[dict[str, Any]],
+    unix_path: Path | None = None,
+    host: str = 'localhost',
+    port: int = SERVER_PORT,
+) -> list[dict[str, Any]]:
+    """
+    Отправляет запросы серверу определения времени по одному соединению и ждет ответы
+
+    :param requests: заголовки запросов, например ``{"path": путь}`` или ``{"command": "stats"}``
+    :param unix_path: путь до сокета Unix сервера. None - сервер слушает TCP-порт
+    :param host: адрес TCP-сервера
+    :param port: порт TCP-сервера
+    :return: ответы сервера в порядке запросов
+    """
+    with _connect(unix_path, host, port) as connection, connection.makefile('rwb') as stream:
+        responses = []
+        for request in requests:
+            stream.write(json.dumps(request, ensure_ascii=False).encode() + b'\n')
+            stream.flush()
+            responses.append(json.loads(stream.readline()))
+        return responses
+
+
+def _add_address_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--unix', type=Path, default=None, help='путь до сокета Unix')
+    parser.add_argument('--host', default='localhost', help='адрес TCP-сервера')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='порт TCP-сервера')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Сервер определения времени по изображению часов')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='запустить сервер')
+    _add_address_arguments(serve_parser)
+    serve_parser.add_argument(
+        '--max-batch', type=int, default=SERVER_MAX_BATCH_SIZE, help='максимальный размер пачки'
+    )
+    serve_parser.add_argument(
+        '--max-wait-ms',
+        type=float,
+        default=SERVER_MAX_WAIT_MS,
+        help='максимальное время ожидания кадров для пачки',
+    )
+
+    query_parser = commands.add_parser('query', help='определить время на изображениях')
+    _add_address_arguments(query_parser)
+    query_parser.add_argument('images', type=Path, nargs='+', help='пути до изображений')
+    query_parser.add_argument('--camera', default=None, help='идентификатор камеры')
+
+    stats_parser = commands.add_parser('stats', help='вывести счетчики сервера')
+    _add_address_arguments(stats_parser)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = DetectionServer(args.max_batch, args.max_wait_ms)
+        server.warm_up()
+        address = args.unix if args.unix is not None else f'{args.host}:{args.port}'
+        print(f'Сервер определения времени слушает {address}')
+        asyncio.run(server.serve(args.unix, args.host, args.port))
+    elif args.command == 'query':
+        requests: list[dict[str, Any]] = [
+            {'path': image_path.resolve().as_posix()} for image_path in args.images
+        ]
+        if args.camera is not None:
+            for request in requests:
+                request['camera'] = args.camera
+        for image_path, response in zip(
+            args.images, query_server(requests, args.unix, args.host, args.port), strict=True
+        ):
+            print(f'{image_path.name}: {response.get("time", response.get("error"))}')
+    else:
+        stats = query_server([{'command': 'stats'}], args.unix, args.host, args.port)[0]
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+import itertools
+import math
+import threading
+from collections.abc import Hashable
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike, Point
+
+from test_clock_detection.data_types import DialCalibration, DialGeometry
+from test_clock_detection.ray_grid import make_ray_grid
+
+DIAL_SEARCH_SCALE: float = 0.25
+"""Масштаб уменьшенного изображения, на котором ищется окружность циферблата"""
+
+DIAL_RADIUS_RANGE: tuple[float, float] = (0.3, 0.6)
+"""Допустимый радиус циферблата в долях меньшей стороны изображения"""
+
+DIAL_HOUGH_THRESHOLD: int = 20
+"""Порог накопителя преобразования Хафа для окружности циферблата"""
+
+DIAL_TICK_COUNT: int = 60
+"""Количество минутных меток циферблата, по которым уточняется центр"""
+
+DIAL_TICK_RING: tuple[float, float] = (0.8, 0.97)
+"""Кольцо минутных меток в долях радиуса циферблата"""
+
+DIAL_COARSE_TICK_RING: tuple[float, float] = (0.7, 1.0)
+"""
+Кольцо, по которому центр ищется грубо. Шире ``DIAL_TICK_RING``, потому что радиус окружности,
+найденной преобразованием Хафа, может отличаться от радиуса циферблата на 10 %
+"""
+
+DIAL_REFINE_ANGLE_STEP_DEG: float = 0.25
+"""Шаг лучей, по которым считается профиль яркости кольца меток"""
+
+DIAL_COARSE_SEARCH_PIX: tuple[int, int] = (12, 4)
+"""
+Полуширина и шаг сетки центров при грубом поиске: центр окружности на уменьшенном изображении
+находится с погрешностью до 3 пикселей уменьшенного изображения
+"""
+
+DIAL_CALIBRATED_DISTANCE_PIX: float = 1.2
+"""
+Расстояние от откалиброванного центра, в пределах которого уточненный циферблат считается
+совпадающим с откалиброванным. Немного больше разброса центра минутных меток отдельных
+изображений одной камеры, поэтому сдвиг камеры на 2 пикселя не скрывается откалиброванным
+положением
+"""
+
+DIAL_CALIBRATED_RADIUS_RATIO: float = 0.1
+"""
+Допустимое относительное отличие радиуса уточненного циферблата от откалиброванного. Радиус
+заменяется откалиброванным только вместе с центром
+"""
+
+DIAL_RADIUS_SHARPNESS_RATIO: float = 0.95
+"""Доля наибольшей четкости меток, начиная с которой радиус считается накрывающим метки"""
+
+DIAL_REVALIDATE_EVERY: int = 100
+"""Количество вызовов поиска, после которого положение циферблата проверяется заново"""
+
+DIAL_MIN_RING_CORRELATION: float = 0.7
+"""Минимальная корреляция яркости на кольце циферблата, при которой положение не изменилось"""
+
+_RING_RADIUS_RATIOS = np.array([0.97, 1.0, 1.03])
+"""Радиусы окружностей кольца проверки в долях радиуса циферблата"""
+
+_RING_ANGLES_RAD = np.deg2rad(np.arange(0, 360, 3))
+"""Углы точек кольца проверки"""
+
+_COARSE_RADIUS_RATIOS = np.arange(0.85, 1.16, 0.02)
+"""Радиусы, перебираемые после грубого поиска центра, в долях радиуса окружности Хафа"""
+
+_FINE_RADIUS_RATIOS = np.arange(0.97, 1.035, 0.01)
+"""Радиусы, перебираемые перед последним уточнением центра, в долях найденного радиуса"""
+
+
+def _to_gray(image: MatLike) -> MatLike:
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def locate_dial(image: MatLike) -> DialGeometry | None:
+    """
+    Находит окружность циферблата преобразованием Хафа на уменьшенном изображении. Цветное
+    изображение переводится в серое после уменьшения
+
+    :param image: серое или цветное в формате BGR изображение часов
+    :return: положение циферблата или None, если окружность не найдена
+    """
+    small = cv2.resize(
+        image, None, fx=DIAL_SEARCH_SCALE, fy=DIAL_SEARCH_SCALE, interpolation=cv2.INTER_AREA
+    )
+    small = cv2.medianBlur(_to_gray(small), 5)
+    min_side = min(small.shape[:2])
+    circles = cv2.HoughCircles(
+        small,
+        cv2.HOUGH_GRADIENT,
+        dp=1,
+        minDist=min_side,
+        param1=100,
+        param2=DIAL_HOUGH_THRESHOLD,
+        minRadius=int(min_side * DIAL_RADIUS_RANGE[0]),
+        maxRadius=int(min_side * DIAL_RADIUS_RANGE[1]),
+    )
+    if circles is None:
+        return None
+    center_x, center_y, radius = circles[0][0] / DIAL_SEARCH_SCALE
+    return DialGeometry(center=(round(center_x), round(center_y)), radius=float(radius))
+
+
+def _tick_ring_profile(
+    image_gray: MatLike, center: Point, radius: float, ring: tuple[float, float]
+) -> npt.NDArray[np.float32]:
+    """
+    Средняя яркость кольца циферблата вдоль каждого луча из заданного центра
+
+    :param image_gray: серое изображение часов
+    :param center: центр лучей
+    :param radius: радиус циферблата
+    :param ring: внутренний и внешний радиусы кольца в долях радиуса циферблата
+    :return: яркость для каждого луча, кроме последнего, совпадающего с первым
+    """
+    height, width = image_gray.shape[:2]
+    grid = make_ray_grid(
+        (height, width),
+        center,
+        DIAL_REFINE_ANGLE_STEP_DEG,
+        round(radius * ring[0]),
+        round(radius * ring[1]),
+    )
+    flat_indices, in_bounds = grid.sample_indices()
+    values = np.asarray(image_gray).ravel()[flat_indices[:-1]].astype(np.float32)
+    if in_bounds is not None:
+        # Отсчеты за пределами изображения не учитываются в средней яркости
+        in_bounds = in_bounds[:-1]
+        values *= in_bounds
+        profile: npt.NDArray[np.float32] = values.sum(axis=1) / np.maximum(in_bounds.sum(axis=1), 1)
+    else:
+        profile = values.mean(axis=1)
+    return profile
+
+
+def _tick_sharpness(
+    image_gray: MatLike, center: Point, radius: float, ring: tuple[float, float] = DIAL_TICK_RING
+) -> float:
+    """
+    Четкость минутных меток в профиле яркости кольца: энергия гармоники с периодом между
+    метками. Метки направлены к центру циферблата, поэтому каждая попадает на свой луч и
+    гармоника максимальна, только когда центр лучей совпадает с центром циферблата
+
+    :param image_gray: серое изображение часов
+    :param center: проверяемый центр
+    :param radius: проверяемый радиус
+    :param ring: кольцо меток в долях радиуса
+    :return: энергия гармоники
+    """
+    profile = _tick_ring_profile(image_gray, center, radius, ring)
+    return float(abs(np.fft.rfft(profile)[DIAL_TICK_COUNT]) ** 2)
+
+
+def _climb_center(
+    image_gray: MatLike, center: Point, radius: float, steps: tuple[int, ...]
+) -> Point:
+    """
+    Смещает центр к соседнему положению с большей четкостью меток, пока она растет, сначала с
+    большим шагом, затем с меньшими
+
+    :param image_gray: серое изображение часов
+    :param center: начальный центр
+    :param radius: радиус циферблата
+    :param steps: шаги смещения в пикселях по убыванию
+    :return: уточненный центр
+    """
+    best_sharpness = _tick_sharpness(image_gray, center, radius)
+    for step in steps:
+        improved = True
+        while improved:
+            improved = False
+            for offset_x, offset_y in itertools.product((-step, 0, step), repeat=2):
+                if offset_x == offset_y == 0:
+                    continue
+                candidate = (center[0] + offset_x, center[1] + offset_y)
+                sharpness = _tick_sharpness(image_gray, candidate, radius)
+                if sharpness > best_sharpness:
+                    center, best_sharpness, improved = candidate, sharpness, True
+    return center
+
+
+def _subpixel_center(image_gray: MatLike, center: Point, radius: float) -> tuple[float, float]:
+    """
+    Центр с точностью до долей пикселя: вершина параболы через четкость меток в найденном центре
+    и в соседних положениях по каждой оси. Вершина четкости плоская, поэтому целочисленный центр
+    в зависимости от шума изображения попадает в разные пиксели вершины
+
+    :param image_gray: серое изображение часов
+    :param center: центр с наибольшей четкостью среди соседних
+    :param radius: радиус циферблата
+    :return: уточненный центр
+    """
+    sharpness = _tick_sharpness(image_gray, center, radius)
+    offsets = []
+    for axis_x, axis_y in ((1, 0), (0, 1)):
+        before = _tick_sharpness(image_gray, (center[0] - axis_x, center[1] - axis_y), radius)
+        after = _tick_sharpness(image_gray, (center[0] + axis_x, center[1] + axis_y), radius)
+        curvature = before - 2 * sharpness + after
+        offsets.append(0.5 * (before - after) / curvature if curvature < 0 else 0.0)
+    return center[0] + offsets[0], center[1] + offsets[1]
+
+
+def _best_radius(
+    image_gray: MatLike, center: Point, radius: float, ratios: npt.NDArray[np.float64]
+) -> float:
+    """
+    Радиус циферблата по четкости меток. Четкость растет, пока кольцо не накроет метки, а при
+    большем радиусе почти не меняется, поэтому выбирается наименьший радиус с четкостью не меньше
+    ``DIAL_RADIUS_SHARPNESS_RATIO`` от наибольшей
+
+    :param image_gray: серое изображение часов
+    :param center: центр циферблата
+    :param radius: начальный радиус
+    :param ratios: перебираемые радиусы в долях начального по возрастанию
+    :return: радиус циферблата
+    """
+    radii = radius * ratios
+    sharpness = np.array([_tick_sharpness(image_gray, center, float(r)) for r in radii])
+    return float(radii[np.argmax(sharpness >= DIAL_RADIUS_SHARPNESS_RATIO * sharpness.max())])
+
+
+def refine_dial(
+    image: MatLike, dial: DialGeometry, calibration: DialCalibration | None = None
+) -> DialGeometry:
+    """
+    Уточняет положение циферблата, найденное на уменьшенном изображении, по четкости минутных
+    меток (см. ``_tick_sharpness``): грубо перебирает центры вокруг найденного, подбирает радиус,
+    смещает центр по одному пикселю и уточняет его до долей пикселя. Поиск стрелок чувствителен к
+    сдвигу центра уже на 1 пиксель, а окружность Хафа дает центр с погрешностью в несколько
+    пикселей. Центр меток переносится на смещение ``tick_offset`` калибровки камеры. Если и центр,
+    и радиус совпадают с откалиброванными в пределах ``DIAL_CALIBRATED_DISTANCE_PIX`` и
+    ``DIAL_CALIBRATED_RADIUS_RATIO``, возвращается откалиброванное положение
+
+    :param image: серое или цветное в формате BGR изображение часов
+    :param dial: положение циферблата с погрешностью в несколько пикселей
+    :param calibration: калибровка циферблата этой камеры, None - камера не откалибрована и
+      центром циферблата считается центр минутных меток
+    :return: уточненное положение циферблата
+    """
+    image_gray = _to_gray(image)
+    reach, step = DIAL_COARSE_SEARCH_PIX
+    candidates: list[Point] = [
+        (dial.center[0] + offset_x, dial.center[1] + offset_y)
+        for offset_x, offset_y in itertools.product(range(-reach, reach + 1, step), repeat=2)
+    ]
+    center = max(
+        candidates,
+        key=lambda candidate: _tick_sharpness(
+            image_gray, candidate, dial.radius, DIAL_COARSE_TICK_RING
+        ),
+    )
+    radius = _best_radius(image_gray, center, dial.radius, _COARSE_RADIUS_RATIOS)
+    center = _climb_center(image_gray, center, radius, (step // 2, 1))
+    radius = _best_radius(image_gray, center, radius, _FINE_RADIUS_RATIOS)
+    center = _climb_center(image_gray, center, radius, (1,))
+    tick_x, tick_y = _subpixel_center(image_gray, center, radius)
+    if calibration is None:
+        return DialGeometry(center=(round(tick_x), round(tick_y)), radius=radius)
+
+    center_x = tick_x - calibration.tick_offset[0]
+    center_y = tick_y - calibration.tick_offset[1]
+    calibrated = calibration.dial
+    if (
+        math.dist((center_x, center_y), calibrated.center) <= DIAL_CALIBRATED_DISTANCE_PIX
+        and abs(radius - calibrated.radius) <= DIAL_CALIBRATED_RADIUS_RATIO * calibrated.radius
+    ):
+        return calibrated
+    return DialGeometry(center=(round(center_x), round(center_y)), radius=radius)
+
+
+def _sample_ring(image: MatLike, dial: DialGeometry) -> npt.NDArray[np.float32] | None:
+    """
+    Берет яркости пикселей на нескольких окружностях вокруг края циферблата
+
+    :param image: серое или цветное в формате BGR изображение часов
+    :param dial: положение циферблата
+    :return: яркости точек кольца или None, если кольцо выходит за границы изображения
+    """
+    radii = _RING_RADIUS_RATIOS * dial.radius
+    xs = np.rint(dial.center[0] + np.outer(radii, np.cos(_RING_ANGLES_RAD))).astype(np.intp)
+    ys = np.rint(dial.center[1] + np.outer(radii, np.sin(_RING_ANGLES_RAD))).astype(np.intp)
+    height, width = image.shape[:2]
+    if xs.min() < 0 or ys.min() < 0 or xs.max() >= width or ys.max() >= height:
+        return None
+    return np.asarray(_to_gray(image[ys, xs]), dtype=np.float32).ravel()
+
+
+def _correlation(first: npt.NDArray[np.float32], second: npt.NDArray[np.float32]) -> float:
+    first = first - first.mean()
+    second = second - second.mean()
+    norm = math.sqrt(float(np.dot(first, first)) * float(np.dot(second, second)))
+    return float(np.dot(first, second)) / norm if norm > 0 else 0.0
+
+
+class DialLocator:
+    """
+    Положение циферблата для одной камеры. Циферблат ищется преобразованием Хафа только при первом
+    вызове, а затем раз в ``revalidate_every`` вызовов проверяется сравнением яркостей на кольце
+    вокруг его края с запомненными. Поиск повторяется, только если кольцо изменилось, например
+    сдвинулась камера. Найденный циферблат уточняется по минутным меткам, и если камера
+    откалибрована, а уточненный циферблат совпадает с откалиброванным, используется
+    откалиброванное положение
+    """
+
+    def __init__(
+        self, calibration: DialCalibration | None, revalidate_every: int = DIAL_REVALIDATE_EVERY
+    ) -> None:
+        """
+        :param calibration: калибровка циферблата этой камеры, откалиброванное положение
+          используется и когда циферблат не найден. None - камера не откалибрована
+        :param revalidate_every: количество вызовов, после которого положение проверяется
+        """
+        self.calibration = calibration
+        """Калибровка циферблата камеры"""
+        self.revalidate_every = revalidate_every
+        """Количество вызовов, после которого положение проверяется"""
+        self.dial: DialGeometry | None = None
+        """Текущее положение циферблата, None - еще не найдено"""
+        self.count_searches = 0
+        """Количество поисков циферблата преобразованием Хафа"""
+        self._ring: npt.NDArray[np.float32] | None = None
+        """Яркости на кольце циферблата в момент поиска"""
+        self._calls_since_check = 0
+        """Количество вызовов после последней проверки"""
+        self._lock = threading.Lock()
+
+    def locate(self, image: MatLike) -> DialGeometry:
+        """
+        Возвращает положение циферблата, при необходимости проверяя или находя его заново
+
+        :param image: серое или цветное в формате BGR изображение часов
+        :return: положение циферблата
+        """
+        with self._lock:
+            self._calls_since_check += 1
+            if self.dial is not None and self._calls_since_check < self.revalidate_every:
+                return self.dial
+            self._calls_since_check = 0
+            if self.dial is not None and self._is_unchanged(image):
+                return self.dial
+
+            self.count_searches += 1
+            found = locate_dial(image)
+            dial = refine_dial(image, found, self.calibration) if found is not None else None
+            if dial is None:
+                dial = self.dial or (self.calibration.dial if self.calibration else None)
+            assert dial is not None, 'Циферблат не найден, а откалиброванного положения нет'
+            self.dial = dial
+            self._ring = _sample_ring(image, dial)
+            return dial
+
+    def _is_unchanged(self, image: MatLike) -> bool:
+        assert self.dial is not None
+        ring = _sample_ring(image, self.dial)
+        if ring is None or self._ring is None:
+            return False
+        return _correlation(ring, self._ring) >= DIAL_MIN_RING_CORRELATION
+
+
+_dial_locators: dict[Hashable, DialLocator] = {}
+"""Положения циферблата по идентификаторам камер и размерам кадров в текущем процессе"""
+
+_dial_locators_lock = threading.Lock()
+
+
+def get_dial_locator(
+    image_shape: tuple[int, ...], calibration: DialCalibration | None, camera_id: Hashable = None
+) -> DialLocator:
+    """
+    Возвращает положение циферблата для камеры, общее для текущего процесса. Камера определяется
+    идентификатором и размером кадров, поэтому камерам с кадрами одного размера нужно задавать
+    разные идентификаторы
+
+    :param image_shape: размер кадров камеры
+    :param calibration: калибровка циферблата для новой камеры, None - камера не откалибрована,
+      положение определяется только по изображениям
+    :param camera_id: идентификатор камеры
+    :return: положение циферблата для камеры
+    """
+    key = (camera_id, tuple(image_shape[:2]))
+    with _dial_locators_lock:
+        locator = _dial_locators.get(key)
+        if locator is None:
+            locator = DialLocator(calibration)
+            _dial_locators[key] = locator
+        return locator
@@ -0,0 +1,224 @@
+import argparse
+import json
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from test_clock_detection.const import PHOTO_EXTENSION
+from test_clock_detection.data_types import DialGeometry
+from test_clock_detection.detect_time import _dial_roi, dial_calibration
+from test_clock_detection.dial_locator import get_dial_locator
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.utils import expected_time_from_name
+
+FRAMES_FILE_NAME = 'frames.bin'
+"""Имя файла с кадрами в папке архива, пиксели кадров записаны подряд без заголовка"""
+
+INDEX_FILE_NAME = 'index.json'
+"""Имя файла с описанием кадров в папке архива"""
+
+ARCHIVE_VERSION = 1
+"""Версия формата архива"""
+
+_EPOCH = datetime(1900, 1, 1)
+"""Дата, которую ``datetime.strptime`` подставляет во время без даты"""
+
+
+@dataclass
+class FrameArchive:
+    """
+    Архив кадров: все изображения набора в одном непрерывном массиве *frames.bin* и описание
+    кадров с их размером и фактическим временем в *index.json*. Массив открывается отображением
+    файла в память, поэтому кадры берутся срезами без копирования, а чтение набора -
+    последовательное чтение одного файла вместо открытия тысяч изображений и разбора их имен
+    """
+
+    frames: npt.NDArray[np.uint8]
+    """
+    Кадры формы (количество кадров, высота, ширина, 3) в формате BGR или
+    (количество кадров, высота, ширина) для серых кадров
+    """
+    names: list[str]
+    """ Имена кадров - имена исходных изображений без расширения """
+    expected_times_us: list[int]
+    """ Фактическое время на кадрах в микросекундах от начала 12-часового циферблата """
+    dial: DialGeometry | None = None
+    """ Положение циферблата на кадрах обрезанного архива, None - ищется по кадрам """
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def expected_time(self, index: int) -> datetime:
+        """
+        Фактическое время на кадре в том же виде, что и ``expected_time_from_name``
+
+        :param index: номер кадра
+        :return: фактическое время на кадре
+        """
+        return _EPOCH + timedelta(microseconds=self.expected_times_us[index])
+
+    def to_index(self) -> dict[str, object]:
+        """
+        Описание кадров для записи в *index.json*
+
+        :return: словарь с описанием кадров
+        """
+        return {
+            'version': ARCHIVE_VERSION,
+            'shape': list(self.frames.shape),
+            'names': self.names,
+            'expected_times_us': self.expected_times_us,
+            'dial': (
+                {'center': list(self.dial.center), 'radius': self.dial.radius}
+                if self.dial is not None
+                else None
+            ),
+        }
+
+
+@lru_cache(maxsize=4)
+def open_frame_archive(archive_folder: Path) -> FrameArchive:
+    """
+    Открывает архив кадров. Архив открывается один раз в процессе, кадры не читаются с диска до
+    обращения к ним
+
+    :param archive_folder: папка архива
+    :return: архив кадров
+    """
+    index = json.loads((archive_folder / INDEX_FILE_NAME).read_text(encoding='utf-8'))
+    assert index['version'] == ARCHIVE_VERSION, f'Неизвестная версия архива: {index["version"]}'
+    frames = np.memmap(
+        archive_folder / FRAMES_FILE_NAME, dtype=np.uint8, mode='r', shape=tuple(index['shape'])
+    )
+    dial = index['dial']
+    return FrameArchive(
+        frames=frames,
+        names=index['names'],
+        expected_times_us=index['expected_times_us'],
+        dial=(
+            DialGeometry(center=tuple(dial['center']), radius=dial['radius'])
+            if dial is not None
+            else None
+        ),
+    )
+
+
+def pack_images(
+    image_folder: Path,
+    archive_folder: Path,
+    gray: bool = False,
+    crop_dial: bool = False,
+    image_extension: str = PHOTO_EXTENSION,
+) -> FrameArchive:
+    """
+    Упаковывает изображения папки в архив кадров. Кадры записываются в файл по одному, поэтому
+    набор не загружается в память целиком. Все изображения должны быть одного размера
+
+    :param image_folder: папка с изображениями, имена которых - время на часах *ЧЧ:ММ:СС.мс*
+    :param archive_folder: папка архива
+    :param gray: хранить только серые кадры, в 3 раза меньше по объему
+    :param crop_dial: хранить только квадрат вокруг циферблата, найденного по первому
+      изображению. Положение циферблата на обрезанных кадрах сохраняется в архиве
+    :param image_extension: расширение изображений
+    :return: упакованный архив
+    """
+    image_paths = sorted(image_folder.glob(f'*.{image_extension}'))
+    assert len(image_paths) > 0, f'В папке {image_folder} нет изображений .{image_extension}'
+
+    first_image = read_image(image_paths[0])
+    image_shape = first_image.shape
+    rows, columns = slice(None), slice(None)
+    dial = None
+    if crop_dial:
+        found = get_dial_locator(image_shape, dial_calibration(image_shape)).locate(first_image)
+        rows, columns, center = _dial_roi(image_shape, found.center, math.ceil(found.radius))
+        dial = DialGeometry(center=center, radius=found.radius)
+    frame_shape = first_image[rows, columns].shape[:2] + (() if gray else (3,))
+
+    archive_folder.mkdir(parents=True, exist_ok=True)
+    frames = np.memmap(
+        archive_folder / FRAMES_FILE_NAME,
+        dtype=np.uint8,
+        mode='w+',
+        shape=(len(image_paths), *frame_shape),
+    )
+    names = []
+    expected_times_us = []
+    for index, image_path in enumerate(image_paths):
+        image = read_image(image_path)
+        assert image.shape == image_shape, f'Размер {image_path} отличается от {image_paths[0]}'
+        frame = image[rows, columns]
+        frames[index] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if gray else frame
+        names.append(image_path.stem)
+        expected_time = expected_time_from_name(image_path.stem) - _EPOCH
+        expected_times_us.append(expected_time // timedelta(microseconds=1))
+    frames.flush()
+
+    archive = FrameArchive(
+        frames=frames, names=names, expected_times_us=expected_times_us, dial=dial
+    )
+    (archive_folder / INDEX_FILE_NAME).write_text(
+        json.dumps(archive.to_index(), ensure_ascii=False), encoding='utf-8'
+    )
+    return archive
+
+
+def unpack_archive(
+    archive_folder: Path, image_folder: Path, image_extension: str = PHOTO_EXTENSION
+) -> int:
+    """
+    Распаковывает архив кадров в папку с изображениями с исходными именами
+
+    :param archive_folder: папка архива
+    :param image_folder: папка для изображений
+    :param image_extension: расширение (формат) изображений
+    :return: количество распакованных изображений
+    """
+    archive = open_frame_archive(archive_folder)
+    image_folder.mkdir(parents=True, exist_ok=True)
+    for name, frame in zip(archive.names, archive.frames, strict=True):
+        cv2.imwrite((image_folder / f'{name}.{image_extension}').as_posix(), frame)
+    return len(archive)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Упаковка изображений в архив кадров')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pack_parser = commands.add_parser('pack', help='упаковать папку с изображениями в архив')
+    pack_parser.add_argument('images', type=Path, help='папка с изображениями')
+    pack_parser.add_argument('archive', type=Path, help='папка архива')
+    pack_parser.add_argument('--gray', action='store_true', help='хранить только серые кадры')
+    pack_parser.add_argument(
+        '--crop-dial', action='store_true', help='хранить только область циферблата'
+    )
+    pack_parser.add_argument(
+        '--image-format', default=PHOTO_EXTENSION, help='расширение исходных изображений'
+    )
+
+    unpack_parser = commands.add_parser('unpack', help='распаковать архив в папку с изображениями')
+    unpack_parser.add_argument('archive', type=Path, help='папка архива')
+    unpack_parser.add_argument('images', type=Path, help='папка для изображений')
+    unpack_parser.add_argument(
+        '--image-format', default=PHOTO_EXTENSION, help='расширение (формат) изображений'
+    )
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        archive = pack_images(
+            args.images, args.archive, args.gray, args.crop_dial, args.image_format
+        )
+        print(f'Упаковано кадров: {len(archive)}, размер кадра: {archive.frames.shape[1:]}')
+    else:
+        count_images = unpack_archive(args.archive, args.images, args.image_format)
+        print(f'Распаковано изображений: {count_images}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+from cv2.typing import MatLike
+
+from test_clock_detection.algorithm_debugger import Debugger
+from test_clock_detection.data_types import FrameTime
+from test_clock_detection.detect_time import detect_time_from_image
+from test_clock_detection.tracking import ClockTracker
+
+DEFAULT_FRAME_INTERVAL_MS: float = 200
+"""Интервал между кадрами по умолчанию, если источник не сообщает время кадров"""
+
+
+@dataclass
+class Frame:
+    """Кадр видео или последовательности изображений"""
+
+    index: int
+    """ Номер кадра в последовательности """
+    timestamp_ms: float
+    """ Время кадра от начала записи в миллисекундах """
+    image: MatLike
+    """ Изображение кадра в формате BGR """
+
+
+def read_video_frames(video_path: Path) -> Iterator[Frame]:
+    """
+    Читает кадры из видеофайла или последовательности изображений по шаблону имени
+    (например, *кадры/%05d.bmp*) через ``cv2.VideoCapture``. Кадры читаются по одному, поэтому
+    потребление памяти не зависит от длины записи.
+
+    :param video_path: путь до видеофайла или шаблон имен изображений
+    :return: генератор кадров
+    """
+    capture = cv2.VideoCapture(video_path.as_posix())
+    assert capture.isOpened(), f'Не удалось открыть видео: {video_path}'
+
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    frame_interval_ms = 1000 / fps if fps > 0 else DEFAULT_FRAME_INTERVAL_MS
+    try:
+        index = 0
+        while True:
+            success, image = capture.read()
+            if not success:
+                break
+            timestamp_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+            if index > 0 and timestamp_ms <= 0:
+                # Не все источники сообщают время кадра, тогда оно рассчитывается по частоте кадров
+                timestamp_ms = index * frame_interval_ms
+            yield Frame(index=index, timestamp_ms=timestamp_ms, image=image)
+            index += 1
+    finally:
+        capture.release()
+
+
+def frames_from_images(
+    images: Iterable[MatLike],
+    frame_interval_ms: float = DEFAULT_FRAME_INTERVAL_MS,
+    start_timestamp_ms: float = 0,
+) -> Iterator[Frame]:
+    """
+    Превращает последовательность изображений в памяти в кадры с равномерными метками времени
+
+    :param images: изображения в формате BGR, может быть генератором
+    :param frame_interval_ms: интервал между кадрами в миллисекундах
+    :param start_timestamp_ms: время первого кадра в миллисекундах
+    :return: генератор кадров
+    """
+    for index, image in enumerate(images):
+        yield Frame(
+            index=index, timestamp_ms=start_timestamp_ms + index * frame_interval_ms, image=image
+        )
+
+
+def detect_time_stream(
+    frames: Iterable[Frame],
+    make_debugger: None | Callable[[Frame], Debugger] = None,
+    tracker: None | ClockTracker = None,
+) -> Iterator[FrameTime]:
+    """
+    Определяет время на часах для каждого кадра последовательности. Результаты выдаются по мере
+    обработки кадров, сами кадры не сохраняются
+
+    :param frames: кадры, например из ``read_video_frames`` или ``frames_from_images``
+    :param make_debugger: функция, создающая отладчик для кадра, например с отдельной папкой
+      на каждый кадр. Если не задана, отладка не выполняется
+    :param tracker: отслеживание стрелок между кадрами. Если не задано, каждый кадр обрабатывается
+      независимо
+    :return: генератор времени на часах для каждого кадра
+    """
+    for frame in frames:
+        debugger = make_debugger(frame) if make_debugger is not None else None
+        if tracker is not None:
+            clock_time = tracker.detect(frame.image, frame.timestamp_ms, debugger)
+        else:
+            clock_time = detect_time_from_image(frame.image, debugger)
+        yield FrameTime(
+            frame_index=frame.index, timestamp_ms=frame.timestamp_ms, clock_time=clock_time
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Определение времени на часах по кадрам видео')
+    parser.add_argument('video', type=Path, help='видеофайл или шаблон имен изображений')
+    parser.add_argument(
+        '--track', action='store_true', help='искать стрелки рядом с их положением на прошлом кадре'
+    )
+    args = parser.parse_args()
+
+    tracker = ClockTracker() if args.track else None
+    for frame_time in detect_time_stream(read_video_frames(args.video), tracker=tracker):
+        print(
+            f'{frame_time.frame_index} ({frame_time.timestamp_ms:.0f} мс) : {frame_time.clock_time}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import struct
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike
+
+from test_clock_detection.const import MEMORY_MAP_IMAGES
+
+_BMP_FILE_HEADER = struct.Struct('<2sI4xI')
+"""Заголовок файла BMP: сигнатура, размер файла, смещение пикселей"""
+
+_BMP_INFO_HEADER = struct.Struct('<IiiHHI')
+"""
+Начало заголовка изображения BMP: размер заголовка, ширина, высота, количество плоскостей,
+бит на пиксель, сжатие
+"""
+
+_BMP_SUPPORTED_BITS = (24, 32)
+"""Поддерживаемое количество бит на пиксель, пиксели хранятся в порядке BGR или BGRX"""
+
+_BI_RGB = 0
+"""Тип сжатия BMP без сжатия"""
+
+
+def read_bmp(image_path: Path) -> npt.NDArray[np.uint8] | None:
+    """
+    Открывает несжатое 24- или 32-битное изображение BMP без декодирования и копирования: пиксели
+    отображаются из файла в память (см. ``decode_bmp``). Массив доступен только для чтения
+
+    :param image_path: путь до изображения
+    :return: изображение в формате BGR или None, если формат файла не поддерживается
+    """
+    if image_path.stat().st_size < _BMP_FILE_HEADER.size + _BMP_INFO_HEADER.size:
+        return None
+    return decode_bmp(np.memmap(image_path, dtype=np.uint8, mode='r'))
+
+
+def decode_bmp(data: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8] | None:
+    """
+    Представляет содержимое несжатого 24- или 32-битного файла BMP изображением без копирования:
+    массив изображения - представление байтов файла. Строки BMP хранятся снизу вверх и
+    дополняются до 4 байт, поэтому порядок строк меняется отрицательным шагом, а выравнивание
+    пропускается шагом строки
+
+    :param data: байты файла, например отображенные в память
+    :return: изображение в формате BGR или None, если формат файла не поддерживается
+    """
+    headers = data[: _BMP_FILE_HEADER.size + _BMP_INFO_HEADER.size].tobytes()
+    if len(headers) < _BMP_FILE_HEADER.size + _BMP_INFO_HEADER.size:
+        return None
+    signature, _, pixels_offset = _BMP_FILE_HEADER.unpack_from(headers)
+    header_size, width, height, _, bits_per_pixel, compression = _BMP_INFO_HEADER.unpack_from(
+        headers, _BMP_FILE_HEADER.size
+    )
+    if (
+        signature != b'BM'
+        or header_size < 40
+        or bits_per_pixel not in _BMP_SUPPORTED_BITS
+        or compression != _BI_RGB
+        or width <= 0
+        or height == 0
+    ):
+        return None
+
+    bytes_per_pixel = bits_per_pixel // 8
+    row_stride = (width * bytes_per_pixel + 3) // 4 * 4
+    count_rows = abs(height)
+    if pixels_offset + row_stride * count_rows > len(data):
+        return None
+
+    image: npt.NDArray[np.uint8] = np.ndarray(
+        (count_rows, width, 3),
+        dtype=np.uint8,
+        buffer=data,
+        offset=pixels_offset,
+        strides=(row_stride, bytes_per_pixel, 1),
+    )
+    # Положительная высота - строки хранятся снизу вверх
+    return image[::-1] if height > 0 else image
+
+
+def read_image_data(
+    image_path: Path, memory_map: bool = MEMORY_MAP_IMAGES
+) -> npt.NDArray[np.uint8]:
+    """
+    Открывает файл изображения без декодирования, например чтобы посчитать хэш содержимого и
+    затем декодировать изображение ``decode_image`` без повторного чтения файла
+
+    :param image_path: путь до изображения
+    :param memory_map: отображать файл в память, а не читать целиком
+    :return: байты файла, при отображении в память - только для чтения
+    """
+    if memory_map and image_path.stat().st_size > 0:
+        return np.memmap(image_path, dtype=np.uint8, mode='r')
+    return np.fromfile(image_path, dtype=np.uint8)
+
+
+def decode_image(data: npt.NDArray[np.uint8], memory_map: bool = MEMORY_MAP_IMAGES) -> MatLike:
+    """
+    Декодирует цветное изображение из байтов файла. Несжатые BMP не декодируются и не копируются
+
+    :param data: байты файла изображения (см. ``read_image_data``)
+    :param memory_map: представлять несжатые BMP байтами файла без декодирования
+    :return: изображение в формате BGR, для BMP - только для чтения
+    """
+    if memory_map:
+        image = decode_bmp(data)
+        if image is not None:
+            return image
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def read_image(image_path: Path, memory_map: bool = MEMORY_MAP_IMAGES) -> MatLike:
+    """
+    Читает цветное изображение. Несжатые BMP отображаются из файла в память без копирования, а
+    остальные форматы декодируются ``cv2.imread``
+
+    :param image_path: путь до изображения
+    :param memory_map: отображать несжатые BMP в память
+    :return: изображение в формате BGR, для BMP - только для чтения
+    """
+    if memory_map and image_path.suffix.lower() == '.bmp':
+        image = read_bmp(image_path)
+        if image is not None:
+            return image
+    return cv2.imread(image_path.as_posix(), cv2.IMREAD_COLOR)
@@ -0,0 +1,387 @@
+import argparse
+import itertools
+import os
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike
+from tabulate import tabulate
+
+from test_clock_detection.algorithm_debugger import measure_time
+from test_clock_detection.const import (
+    CALCULATED_ERRORS,
+    FAIL_DELTA_THRESHOLD_SECONDS,
+    PHOTO_EXTENSION,
+)
+from test_clock_detection.data_types import DialGeometry, ErrorSummary
+from test_clock_detection.detect_time import (
+    DEFAULT_DETECT_PARAMS,
+    DetectParams,
+    detect_time_batch,
+    dial_calibration,
+)
+from test_clock_detection.dial_locator import get_dial_locator
+from test_clock_detection.frame_archive import open_frame_archive
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.result_analysis import summarize_errors
+from test_clock_detection.utils import check_result, expected_time_from_name
+
+SWEEP_CHUNK_SIZE: int = 64
+"""Количество кадров в одной задаче рабочего процесса"""
+
+
+def _parse_angle_steps(value: str) -> tuple[float, ...]:
+    return tuple(float(step) for step in value.split('/'))
+
+
+_PARAM_PARSERS: dict[str, Callable[[str], Any]] = {
+    'binary_threshold': int,
+    'min_len_line_pix': int,
+    'max_len_line_pix': int,
+    'min_angle_diff_deg': float,
+    'angle_steps_deg': _parse_angle_steps,
+}
+"""Разбор значений параметров ``DetectParams`` из командной строки"""
+
+
+@dataclass(frozen=True)
+class SharedFrames:
+    """Серые кадры набора в разделяемой памяти, доступные рабочим процессам без копирования"""
+
+    memory_name: str
+    """ Имя блока разделяемой памяти """
+    shape: tuple[int, int, int]
+    """ Форма массива кадров: (количество кадров, высота, ширина) """
+
+
+@dataclass
+class SweepResult:
+    """Результат прогона алгоритма на наборе кадров с одним набором параметров"""
+
+    params: DetectParams
+    """ Параметры алгоритма """
+    errors_sec: list[float]
+    """ Погрешности определения времени для всех кадров """
+    cpu_ms: float
+    """ Суммарное процессорное время алгоритма по всем кадрам """
+
+    @property
+    def cpu_ms_per_image(self) -> float:
+        return self.cpu_ms / len(self.errors_sec)
+
+    def summary(self) -> ErrorSummary:
+        """
+        Сводная статистика погрешностей по пределам ``CALCULATED_ERRORS``
+
+        :return: сводная статистика
+        """
+        return summarize_errors(self.errors_sec, CALCULATED_ERRORS)
+
+
+def make_param_grid(
+    param_values: dict[str, list[Any]],
+    base: DetectParams = DEFAULT_DETECT_PARAMS,
+    count_random: int | None = None,
+    seed: int = 0,
+) -> list[DetectParams]:
+    """
+    Создает наборы параметров алгоритма - все сочетания заданных значений или случайную выборку
+    из них
+
+    :param param_values: значения по именам полей ``DetectParams``, остальные поля берутся из
+      ``base``
+    :param base: параметры, от которых отсчитываются изменения
+    :param count_random: количество случайных сочетаний без повторений. None - все сочетания
+    :param seed: начальное значение генератора случайных сочетаний
+    :return: наборы параметров
+    """
+    names = list(param_values)
+    grid = [
+        replace(base, **dict(zip(names, values, strict=True)))
+        for values in itertools.product(*param_values.values())
+    ]
+    if count_random is None or count_random >= len(grid):
+        return grid
+    rng = np.random.default_rng(seed)
+    return [grid[index] for index in sorted(rng.choice(len(grid), count_random, replace=False))]
+
+
+def _to_gray(image: MatLike) -> MatLike:
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+@contextmanager
+def share_frames(frames: Iterable[MatLike], shape: tuple[int, int, int]) -> Iterator[SharedFrames]:
+    """
+    Декодирует кадры один раз прямо в разделяемую память. Блок памяти удаляется при выходе из
+    блока ``with``
+
+    :param frames: кадры в формате BGR или серые, например читаемые с диска по одному
+    :param shape: форма массива серых кадров: (количество кадров, высота, ширина)
+    :return: описание кадров в разделяемой памяти
+    """
+    memory = SharedMemory(create=True, size=max(int(np.prod(shape)), 1))
+    try:
+        array: npt.NDArray[np.uint8] = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf)
+        for index, frame in enumerate(frames):
+            assert frame.shape[:2] == shape[1:], f'Размер кадра {index} отличается от первого'
+            array[index] = _to_gray(frame)
+        del array
+        yield SharedFrames(memory_name=memory.name, shape=shape)
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+_worker_memory: SharedMemory | None = None
+"""Блок разделяемой памяти с кадрами в рабочем процессе"""
+
+_worker_frames: npt.NDArray[np.uint8] | None = None
+"""Кадры набора в рабочем процессе"""
+
+
+def _attach_frames(shared: SharedFrames) -> None:
+    global _worker_memory, _worker_frames
+    _worker_memory = SharedMemory(name=shared.memory_name)
+    _worker_frames = np.ndarray(shared.shape, dtype=np.uint8, buffer=_worker_memory.buf)
+
+
+def _evaluate_chunk(
+    params: DetectParams, start: int, stop: int, dial: DialGeometry
+) -> tuple[list[str], float]:
+    """
+    Определяет время на части кадров набора в рабочем процессе. Первый кадр части обрабатывается
+    до замера, чтобы в стоимость параметров не попало построение таблиц лучей, которые строятся
+    один раз в процессе
+
+    :param params: параметры алгоритма
+    :param start: номер первого кадра части
+    :param stop: номер кадра после последнего кадра части
+    :param dial: положение циферблата на кадрах
+    :return: время на кадрах в формате чч:мм:сс.мс и процессорное время алгоритма
+    """
+    assert _worker_frames is not None, 'Кадры не подключены к рабочему процессу'
+    detect_time_batch(_worker_frames[start : start + 1], dial=dial, params=params)
+    with measure_time() as timing:
+        clock_times, _ = detect_time_batch(_worker_frames[start:stop], dial=dial, params=params)
+    return [str(clock_time) for clock_time in clock_times], timing.cpu_ms
+
+
+def run_sweep(
+    shared: SharedFrames,
+    expected_times: list[datetime],
+    param_grid: list[DetectParams],
+    dial: DialGeometry,
+    jobs: int | None = None,
+    chunk_size: int = SWEEP_CHUNK_SIZE,
+) -> list[SweepResult]:
+    """
+    Прогоняет алгоритм на всех кадрах с каждым набором параметров. Набор кадров делится на части,
+    и части всех наборов параметров распределяются между рабочими процессами, которые читают
+    кадры из разделяемой памяти
+
+    :param shared: кадры в разделяемой памяти
+    :param expected_times: фактическое время на кадрах
+    :param param_grid: наборы параметров
+    :param dial: положение циферблата на кадрах
+    :param jobs: количество рабочих процессов, по умолчанию - количество ядер
+    :param chunk_size: количество кадров в одной задаче
+    :return: результаты в порядке наборов параметров
+    """
+    count_frames = shared.shape[0]
+    assert len(expected_times) == count_frames, 'Количество кадров и их времени не совпадает'
+    chunks = [
+        (start, min(start + chunk_size, count_frames))
+        for start in range(0, count_frames, chunk_size)
+    ]
+    with ProcessPoolExecutor(jobs, initializer=_attach_frames, initargs=(shared,)) as executor:
+        futures = [
+            [executor.submit(_evaluate_chunk, params, start, stop, dial) for start, stop in chunks]
+            for params in param_grid
+        ]
+        results = []
+        for params, param_futures in zip(param_grid, futures, strict=True):
+            detected_times: list[str] = []
+            cpu_ms = 0.0
+            for future in param_futures:
+                chunk_times, chunk_cpu_ms = future.result()
+                detected_times.extend(chunk_times)
+                cpu_ms += chunk_cpu_ms
+            errors_sec = [
+                check_result(
+                    expected_time,
+                    datetime.strptime(detected_time, '%H:%M:%S.%f'),
+                    FAIL_DELTA_THRESHOLD_SECONDS,
+                )[0]
+                for expected_time, detected_time in zip(expected_times, detected_times, strict=True)
+            ]
+            results.append(SweepResult(params=params, errors_sec=errors_sec, cpu_ms=cpu_ms))
+    return results
+
+
+def fastest_meeting_bar(
+    results: list[SweepResult], error_sec: float, min_percent: float
+) -> SweepResult | None:
+    """
+    Находит самый быстрый набор параметров, точность которого не хуже заданной
+
+    :param results: результаты прогонов
+    :param error_sec: предел погрешности из ``CALCULATED_ERRORS``
+    :param min_percent: минимальный процент результатов, уложившихся в предел
+    :return: самый быстрый подходящий результат или None, если подходящих нет
+    """
+    assert error_sec in CALCULATED_ERRORS, f'Предел {error_sec} не входит в CALCULATED_ERRORS'
+    suitable = [
+        result for result in results if result.summary().percent_within()[error_sec] >= min_percent
+    ]
+    if len(suitable) == 0:
+        return None
+    return min(suitable, key=lambda result: result.cpu_ms_per_image)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, tuple):
+        return '/'.join(f'{item:g}' for item in value)
+    return f'{value:g}' if isinstance(value, float) else str(value)
+
+
+def print_sweep_results(
+    results: list[SweepResult], param_names: list[str], best: SweepResult | None = None
+) -> None:
+    """
+    Выводит в консоль таблицу результатов, упорядоченную по процессорному времени на кадр
+
+    :param results: результаты прогонов
+    :param param_names: имена параметров, которые менялись
+    :param best: результат, который отмечается в таблице
+    :return:
+    """
+    table = []
+    for result in sorted(results, key=lambda result: result.cpu_ms_per_image):
+        summary = result.summary()
+        percent_within = summary.percent_within()
+        table.append([
+            '*' if result is best else '',
+            *(_format_value(getattr(result.params, name)) for name in param_names),
+            round(result.cpu_ms_per_image, 2),
+            round(summary.mean_sec, 3),
+            summary.max_sec,
+            *(f'{percent_within[error]} %' for error in CALCULATED_ERRORS),
+        ])
+    print(
+        tabulate(
+            table,
+            headers=[
+                '',
+                *param_names,
+                'мс ЦП/кадр',
+                'Средняя c.',
+                'Макс. c.',
+                *(f'{error} c.' for error in CALCULATED_ERRORS),
+            ],
+            tablefmt='github',
+        )
+    )
+
+
+def _parse_param(value: str) -> tuple[str, list[Any]]:
+    name, _, values = value.partition('=')
+    assert (
+        name in _PARAM_PARSERS
+    ), f'Неизвестный параметр {name}, доступны: {", ".join(_PARAM_PARSERS)}'
+    return name, [_PARAM_PARSERS[name](item) for item in values.split(',')]
+
+
+def _parse_bar(value: str) -> tuple[float, float]:
+    error_sec, min_percent = value.split(':')
+    return float(error_sec), float(min_percent)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Подбор параметров алгоритма по набору кадров')
+    parser.add_argument(
+        'images',
+        type=Path,
+        nargs='?',
+        default=None,
+        help='папка с изображениями, по умолчанию files/Изображения',
+    )
+    parser.add_argument(
+        '--archive', type=Path, default=None, help='архив кадров вместо папки с изображениями'
+    )
+    parser.add_argument(
+        '--param',
+        type=_parse_param,
+        action='append',
+        default=[],
+        help='значения параметра *имя=значение1,значение2*, шаги поиска задаются через /, '
+        f'например angle_steps_deg=1/0.25,2/0.5/0.1. Параметры: {", ".join(_PARAM_PARSERS)}',
+    )
+    parser.add_argument(
+        '--random', type=int, default=None, help='количество случайных сочетаний вместо всех'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='начальное значение генератора')
+    parser.add_argument('--jobs', type=int, default=None, help='количество рабочих процессов')
+    parser.add_argument(
+        '--chunk-size', type=int, default=SWEEP_CHUNK_SIZE, help='количество кадров в задаче'
+    )
+    parser.add_argument(
+        '--accuracy-bar',
+        type=_parse_bar,
+        default=None,
+        help='требуемая точность *погрешность:процент*, например 0.5:99. Отмечается самый '
+        'быстрый набор параметров с такой точностью',
+    )
+    parser.add_argument('--image-format', default=PHOTO_EXTENSION, help='расширение изображений')
+    args = parser.parse_args()
+
+    param_values = dict(args.param)
+    param_grid = make_param_grid(param_values, count_random=args.random, seed=args.seed)
+
+    frames: Iterable[MatLike]
+    dial = None
+    if args.archive is not None:
+        archive = open_frame_archive(args.archive)
+        frames = archive.frames
+        first_frame: MatLike = archive.frames[0]
+        expected_times = [archive.expected_time(index) for index in range(len(archive))]
+        dial = archive.dial
+    else:
+        repo_root = Path(os.path.abspath(__file__)).parent.parent
+        image_folder = args.images or repo_root / 'files' / 'Изображения'
+        image_paths = sorted(image_folder.glob(f'*.{args.image_format}'))
+        assert len(image_paths) > 0, f'В папке {image_folder} нет изображений .{args.image_format}'
+        frames = (read_image(image_path) for image_path in image_paths)
+        first_frame = read_image(image_paths[0])
+        expected_times = [expected_time_from_name(image_path.stem) for image_path in image_paths]
+    if dial is None:
+        dial = get_dial_locator(first_frame.shape, dial_calibration(first_frame.shape)).locate(
+            first_frame
+        )
+
+    height, width = first_frame.shape[:2]
+    with share_frames(frames, (len(expected_times), height, width)) as shared:
+        results = run_sweep(shared, expected_times, param_grid, dial, args.jobs, args.chunk_size)
+    best = fastest_meeting_bar(results, *args.accuracy_bar) if args.accuracy_bar else None
+
+    print(f'Кадров: {len(expected_times)}, наборов параметров: {len(param_grid)}')
+    print_sweep_results(results, list(param_values), best)
+    if args.accuracy_bar is not None:
+        error_sec, min_percent = args.accuracy_bar
+        if best is None:
+            print(f'Нет параметров, при которых {min_percent} % кадров уложились в {error_sec} c.')
+        else:
+            print(f'Самые быстрые параметры с требуемой точностью: {best.params}')
+
+
+if __name__ == '__main__':
+    main()
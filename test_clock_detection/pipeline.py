@@ -0,0 +1,346 @@
+import contextlib
+import multiprocessing
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from tabulate import tabulate
+
+from test_clock_detection.const import PIPELINE_QUEUE_SIZE
+
+StageBackend = Literal['thread', 'process']
+"""Где выполняется функция этапа: в потоках этапа или в пуле процессов"""
+
+_POLL_INTERVAL_SEC = 0.1
+"""Интервал проверки остановки конвейера при ожидании очереди"""
+
+
+class _Stop:
+    """Признак окончания элементов в очереди"""
+
+
+_STOP = _Stop()
+
+
+@dataclass
+class _Failure:
+    """Исключение этапа, которое передается по конвейеру до вызывающего кода"""
+
+    exception: BaseException
+
+
+class _Cancelled(Exception):
+    """Конвейер остановлен вызывающим кодом"""
+
+
+@dataclass(frozen=True)
+class PipelineStage:
+    """Этап конвейера"""
+
+    name: str
+    """ Имя этапа """
+    fn: Callable[[Any], Any]
+    """
+    Функция этапа, для пула процессов должна быть объявлена на уровне импортируемого модуля, а не
+    в ``__main__``
+    """
+    workers: int = 1
+    """ Количество потоков или процессов этапа """
+    backend: StageBackend = 'thread'
+    """ Где выполняется функция этапа """
+
+
+@dataclass
+class StageMetrics:
+    """Счетчики этапа конвейера"""
+
+    name: str
+    """ Имя этапа """
+    workers: int
+    """ Количество потоков или процессов этапа """
+    items: int = 0
+    """ Количество обработанных элементов """
+    busy_ms: float = 0
+    """ Суммарное время выполнения функции этапа всеми исполнителями """
+    input_wait_ms: float = 0
+    """ Суммарное время ожидания исполнителями элементов от предыдущего этапа """
+    output_wait_ms: float = 0
+    """ Суммарное время ожидания исполнителями места в очереди следующего этапа """
+    queue_depth_sum: int = 0
+    """ Сумма длин входной очереди в моменты взятия элементов """
+    max_queue_depth: int = 0
+    """ Максимальная длина входной очереди """
+
+    @property
+    def mean_queue_depth(self) -> float:
+        return self.queue_depth_sum / self.items if self.items > 0 else 0
+
+    def utilization(self, wall_ms: float) -> float:
+        """
+        Доля времени, в которую исполнители этапа были заняты
+
+        :param wall_ms: время работы конвейера
+        :return: доля от 0 до 1
+        """
+        return self.busy_ms / (wall_ms * self.workers) if wall_ms > 0 else 0
+
+
+class Pipeline:
+    """
+    Конвейер из последовательных этапов с ограниченными очередями между ними. У каждого этапа
+    свои исполнители, поэтому этапы работают одновременно: пока алгоритм обрабатывает одни
+    изображения, следующие читаются с диска, а результаты предыдущих записываются. При
+    заполнении очереди этап ждет следующий, поэтому память ограничена размером очередей.
+    Элементы выходят из конвейера в порядке готовности
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[PipelineStage],
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        serial: bool = False,
+    ) -> None:
+        """
+        :param stages: этапы конвейера
+        :param queue_size: максимальное количество элементов в очереди перед каждым этапом
+        :param serial: выполнять все этапы последовательно в вызывающем потоке, например для
+          отладки и профилирования
+        """
+        assert len(stages) > 0, 'Конвейер должен содержать хотя бы один этап'
+        assert all(stage.workers > 0 for stage in stages), 'У каждого этапа должен быть исполнитель'
+        assert queue_size > 0, f'Размер очереди должен быть положительным: {queue_size}'
+        self.stages = list(stages)
+        """Этапы конвейера"""
+        self.queue_size = queue_size
+        """Максимальное количество элементов в очереди перед каждым этапом"""
+        self.serial = serial
+        """Выполнять этапы последовательно в вызывающем потоке"""
+        self.metrics = [
+            StageMetrics(stage.name, 1 if serial else stage.workers) for stage in stages
+        ]
+        """Счетчики этапов"""
+        self.wall_ms = 0.0
+        """Время работы конвейера"""
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Пропускает элементы через все этапы. Элементы берутся из ``items`` по мере освобождения
+        места в первой очереди, поэтому ``items`` может быть генератором. Исключение этапа
+        пробрасывается в вызывающий код
+
+        :param items: входные элементы
+        :return: результаты последнего этапа
+        """
+        start_time = time.perf_counter()
+        try:
+            if self.serial:
+                yield from self._run_serial(items)
+            else:
+                yield from self._run_threads(items)
+        finally:
+            self.wall_ms = (time.perf_counter() - start_time) * 1000
+
+    def _run_serial(self, items: Iterable[Any]) -> Iterator[Any]:
+        for item in items:
+            for stage, metrics in zip(self.stages, self.metrics, strict=True):
+                stage_start = time.perf_counter()
+                item = stage.fn(item)
+                metrics.busy_ms += (time.perf_counter() - stage_start) * 1000
+                metrics.items += 1
+            yield item
+
+    def _run_threads(self, items: Iterable[Any]) -> Iterator[Any]:
+        self._stopped.clear()
+        queues: list[queue.Queue[Any]] = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+        executors: list[Executor | None] = [
+            ProcessPoolExecutor(stage.workers, mp_context=_process_context())
+            if stage.backend == 'process'
+            else None
+            for stage in self.stages
+        ]
+        remaining_workers = [stage.workers for stage in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(
+                    target=self._work,
+                    args=(
+                        index,
+                        queues[index],
+                        queues[index + 1],
+                        executors[index],
+                        remaining_workers,
+                    ),
+                    name=f'{stage.name} {worker}',
+                    daemon=True,
+                )
+                for worker in range(stage.workers)
+            )
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not isinstance(item := self._get(queues[-1]), _Stop):
+                if isinstance(item, _Failure):
+                    raise item.exception
+                yield item
+        finally:
+            self._stopped.set()
+            for thread in threads:
+                thread.join()
+            for executor in executors:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+
+    def _feed(self, items: Iterable[Any], output: 'queue.Queue[Any]') -> None:
+        try:
+            for item in items:
+                self._put(output, item)
+        except _Cancelled:
+            return
+        except BaseException as exc:  # noqa: BLE001 - ошибка передается в вызывающий код
+            self._put_quietly(output, _Failure(exc))
+        self._put_quietly(output, _STOP)
+
+    def _work(
+        self,
+        index: int,
+        input_queue: 'queue.Queue[Any]',
+        output: 'queue.Queue[Any]',
+        executor: Executor | None,
+        remaining_workers: list[int],
+    ) -> None:
+        """
+        Исполнитель этапа: берет элементы из входной очереди, пока не встретит признак окончания
+
+        :param index: номер этапа
+        :param input_queue: очередь перед этапом
+        :param output: очередь после этапа
+        :param executor: пул процессов этапа, None - функция выполняется в потоке исполнителя
+        :param remaining_workers: количество еще работающих исполнителей каждого этапа
+        """
+        stage = self.stages[index]
+        metrics = self.metrics[index]
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = self._get(input_queue)
+                busy_start = time.perf_counter()
+                if isinstance(item, _Stop):
+                    with self._lock:
+                        remaining_workers[index] -= 1
+                        last_worker = remaining_workers[index] == 0
+                    # Признак окончания получает каждый исполнитель этапа, а последний передает
+                    # его следующему этапу
+                    self._put(output if last_worker else input_queue, _STOP)
+                    return
+                queue_depth = input_queue.qsize()
+
+                if isinstance(item, _Failure):
+                    result = item
+                else:
+                    try:
+                        if executor is not None:
+                            result = executor.submit(stage.fn, item).result()
+                        else:
+                            result = stage.fn(item)
+                    except BaseException as exc:  # noqa: BLE001 - ошибка передается по конвейеру
+                        result = _Failure(exc)
+                put_start = time.perf_counter()
+                self._put(output, result)
+                put_end = time.perf_counter()
+
+                with self._lock:
+                    metrics.items += 1
+                    metrics.input_wait_ms += (busy_start - wait_start) * 1000
+                    metrics.busy_ms += (put_start - busy_start) * 1000
+                    metrics.output_wait_ms += (put_end - put_start) * 1000
+                    metrics.queue_depth_sum += queue_depth
+                    metrics.max_queue_depth = max(metrics.max_queue_depth, queue_depth + 1)
+        except _Cancelled:
+            return
+
+    def _get(self, source: 'queue.Queue[Any]') -> Any:
+        while True:
+            try:
+                return source.get(timeout=_POLL_INTERVAL_SEC)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    raise _Cancelled from None
+
+    def _put(self, target: 'queue.Queue[Any]', item: Any) -> None:
+        while True:
+            try:
+                target.put(item, timeout=_POLL_INTERVAL_SEC)
+                return
+            except queue.Full:
+                if self._stopped.is_set():
+                    raise _Cancelled from None
+
+    def _put_quietly(self, target: 'queue.Queue[Any]', item: Any) -> None:
+        with contextlib.suppress(_Cancelled):
+            self._put(target, item)
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+    """
+    Способ запуска процессов пула. Рабочие процессы запускаются, когда потоки этапов и потоки
+    вызывающего кода уже работают, а копия процесса через fork может унаследовать блокировку,
+    захваченную другим потоком, и зависнуть. Поэтому процессы запускаются через forkserver, а где
+    он недоступен - через spawn. Функции этапов пула процессов должны импортироваться из модуля,
+    а не из ``__main__``
+
+    :return: контекст запуска процессов
+    """
+    start_method = (
+        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    )
+    return multiprocessing.get_context(start_method)
+
+
+def print_pipeline_metrics(pipeline: Pipeline) -> None:
+    """
+    Выводит в консоль таблицу счетчиков этапов конвейера. Этап с наибольшей занятостью
+    ограничивает скорость конвейера, а длинная очередь перед этапом означает, что предыдущие
+    этапы успевают больше, чем он
+
+    :param pipeline: отработавший конвейер
+    :return:
+    """
+    table = [
+        [
+            metrics.name,
+            metrics.workers,
+            metrics.items,
+            f'{metrics.utilization(pipeline.wall_ms) * 100:.1f} %',
+            round(metrics.mean_queue_depth, 2),
+            metrics.max_queue_depth,
+            round(metrics.input_wait_ms / 1000, 2),
+            round(metrics.output_wait_ms / 1000, 2),
+        ]
+        for metrics in pipeline.metrics
+    ]
+    print(
+        tabulate(
+            table,
+            headers=[
+                'Этап',
+                'Исполнителей',
+                'Частей',
+                'Занятость',
+                'Ср. очередь',
+                'Макс. очередь',
+                'Ожидание входа с',
+                'Ожидание выхода с',
+            ],
+            tablefmt='github',
+        )
+    )
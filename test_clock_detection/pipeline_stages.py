@@ -0,0 +1,288 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike
+
+from test_clock_detection.algorithm_debugger import (
+    AlgorithmDebugger,
+    DebugSettings,
+    DeferredAlgorithmDebugger,
+    measure_time,
+)
+from test_clock_detection.const import RESULT_IMAGE_NAME
+from test_clock_detection.data_types import (
+    ClockTime,
+    Detection,
+    DetectTimeResult,
+    DialGeometry,
+    ImageTestResult,
+    StageTiming,
+)
+from test_clock_detection.detect_time import detect_time_batch, detect_time_from_image
+from test_clock_detection.frame_archive import open_frame_archive
+from test_clock_detection.image_reader import decode_image, read_image_data
+from test_clock_detection.result_cache import ResultCache
+from test_clock_detection.utils import check_result, expected_time_from_name
+
+
+@dataclass
+class TestFrame:
+    """Изображение, которое передается между этапами конвейера тестирования"""
+
+    name: str
+    """ Имя изображения без расширения """
+    expected_time: datetime
+    """ Фактическое время на изображении """
+    cache_key: str = ''
+    """ Ключ результата в кэше результатов, пустой - кэш не используется """
+    image: MatLike | None = None
+    """ Серое изображение, None - результат взят из кэша или уже определен """
+    frame_index: int | None = None
+    """ Номер кадра в архиве кадров, кадр читается этапом вычислений """
+    read_timing: StageTiming | None = None
+    """ Время чтения изображения с диска вместе с проверкой кэша """
+    detection: Detection | None = None
+    """ Результат алгоритма """
+    debugger: DeferredAlgorithmDebugger | None = None
+    """ Отладчик с ожидающими записи промежуточными изображениями, None - результат из кэша """
+
+
+def prefetch_images(image_paths: list[Path], cache_folder: Path | None) -> list[TestFrame]:
+    """
+    Этап чтения: читает с диска изображения части и переводит их в серые. Файл изображения
+    отображается в память один раз: по его байтам считается ключ кэша, и из них же декодируется
+    изображение, если результата нет в кэше
+
+    :param image_paths: пути до изображений части
+    :param cache_folder: папка кэша результатов. Если не задана, кэш не используется
+    :return: изображения части
+    """
+    cache = ResultCache(cache_folder) if cache_folder is not None else None
+    frames = []
+    for image_path in image_paths:
+        frame = TestFrame(image_path.stem, expected_time_from_name(image_path.stem))
+        with measure_time() as read_timing:
+            image_data = read_image_data(image_path)
+            if cache is not None:
+                frame.cache_key = cache.make_key(image_data)
+                frame.detection = cache.get(frame.cache_key)
+            if frame.detection is None:
+                frame.image = _to_gray(decode_image(image_data))
+        if frame.detection is None:
+            frame.read_timing = read_timing
+        frames.append(frame)
+    return frames
+
+
+def prefetch_archive(
+    archive_folder: Path, cache_folder: Path | None, frame_indices: list[int]
+) -> list[TestFrame]:
+    """
+    Этап чтения для архива кадров: проверяет кэш результатов. Кадры не копируются, а берутся
+    срезом отображенного в память файла на этапе вычислений, поэтому в рабочий процесс
+    передаются только номера кадров
+
+    :param archive_folder: папка архива кадров
+    :param cache_folder: папка кэша результатов. Если не задана, кэш не используется
+    :param frame_indices: номера кадров части
+    :return: кадры части
+    """
+    archive = open_frame_archive(archive_folder)
+    cache = ResultCache(cache_folder) if cache_folder is not None else None
+    frames = []
+    for index in frame_indices:
+        frame = TestFrame(archive.names[index], archive.expected_time(index))
+        if cache is not None:
+            frame.cache_key = cache.make_frame_key(archive.frames[index], str(archive.dial))
+            frame.detection = cache.get(frame.cache_key)
+        if frame.detection is None:
+            frame.frame_index = index
+        frames.append(frame)
+    return frames
+
+
+def _to_gray(image: MatLike) -> MatLike:
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def _read_archive_frame(archive_folder: Path, index: int) -> MatLike:
+    """
+    Читает серый кадр из архива кадров. Цветной кадр переводится в серый прямо из отображенного в
+    память файла, серый копируется, так как файл открыт только для чтения
+
+    :param archive_folder: папка архива кадров
+    :param index: номер кадра
+    :return: серый кадр
+    """
+    frame = open_frame_archive(archive_folder).frames[index]
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else np.array(frame)
+
+
+def detect_frames(
+    frames: list[TestFrame],
+    debug_folder: Path,
+    debug_settings: DebugSettings,
+    batch: bool,
+    dial: DialGeometry | None,
+    archive_folder: Path | None = None,
+    write_debug: bool = False,
+) -> list[TestFrame]:
+    """
+    Этап вычислений: определяет время на изображениях части. Промежуточные изображения
+    остаются в отладчике до этапа записи, если не задано ``write_debug``. Изображения одного
+    размера обрабатываются одним вызовом ``detect_time_batch``, если задано ``batch``
+
+    :param frames: изображения части
+    :param debug_folder: путь для сохранения промежуточных этапов алгоритма
+    :param debug_settings: настройки сохранения промежуточных результатов
+    :param batch: обрабатывать изображения пачками
+    :param dial: положение циферблата на изображениях. Если не задано, циферблат ищется
+    :param archive_folder: папка архива кадров, из которого читаются кадры с номером
+      ``frame_index``
+    :param write_debug: записывать промежуточные изображения на этапе вычислений. Задается, когда
+      этап выполняется в другом процессе, чтобы изображения не передавались этапу записи
+    :return: изображения части с результатами алгоритма, но без самих изображений
+    """
+    frames_by_shape: dict[tuple[int, ...], list[TestFrame]] = defaultdict(list)
+    for frame in frames:
+        if frame.frame_index is not None:
+            assert archive_folder is not None, f'Не задан архив кадра {frame.name}'
+            with measure_time() as frame.read_timing:
+                frame.image = _read_archive_frame(archive_folder, frame.frame_index)
+        if frame.image is None:
+            continue
+        frame.debugger = debug_settings.make_deferred_debugger(debug_folder / frame.name)
+        if frame.read_timing is not None:
+            frame.debugger.add_stage_time('Чтение изображения', frame.read_timing)
+        frames_by_shape[frame.image.shape].append(frame)
+
+    for shape_frames in frames_by_shape.values():
+        debuggers = [frame.debugger for frame in shape_frames if frame.debugger is not None]
+        if batch:
+            images_gray: npt.NDArray[np.uint8] = np.stack([
+                frame.image for frame in shape_frames if frame.image is not None
+            ])
+            result_times, _ = detect_time_batch(images_gray, debug_modes=debuggers, dial=dial)
+        else:
+            result_times = [
+                detect_time_from_image(frame.image, debugger, dial)
+                for frame, debugger in zip(shape_frames, debuggers, strict=True)
+                if frame.image is not None
+            ]
+        for frame, result_time, debugger in zip(shape_frames, result_times, debuggers, strict=True):
+            frame.detection = _make_detection(result_time, debugger)
+            frame.image = None
+            if write_debug:
+                debugger.flush()
+    return frames
+
+
+def write_results(
+    frames: list[TestFrame],
+    folder_for_results: Path | None,
+    fail_threshold_seconds: float,
+    cache_folder: Path | None,
+) -> list[ImageTestResult]:
+    """
+    Этап записи: записывает промежуточные и итоговые изображения алгоритма и сохраняет
+    результаты в кэш результатов
+
+    :param frames: изображения части с результатами алгоритма
+    :param folder_for_results: путь до общей папки для сохранения итогового результата. Если не
+      задан, итоговые изображения не сохраняются
+    :param fail_threshold_seconds: максимальное отклонение от реального значения, после которого
+      определение времени считается неудачным. Задается в секундах
+    :param cache_folder: папка кэша результатов. Если не задана, кэш не используется
+    :return: результаты тестирования изображений части
+    """
+    cache = ResultCache(cache_folder) if cache_folder is not None else None
+    test_results = []
+    for frame in frames:
+        assert frame.detection is not None, f'Время на изображении {frame.name} не определено'
+        if cache is not None and frame.debugger is not None:
+            cache.put(frame.cache_key, frame.detection)
+        test_results.append(
+            _save_test_result(
+                frame.name,
+                frame.expected_time,
+                frame.detection,
+                frame.debugger,
+                folder_for_results,
+                fail_threshold_seconds,
+            )
+        )
+    return test_results
+
+
+def _make_detection(result_time: ClockTime, debugger: AlgorithmDebugger) -> Detection:
+    """
+    Собирает результат алгоритма: время и линии итогового изображения, переданные отладчику
+
+    :param result_time: время, определенное алгоритмом
+    :param debugger: отладчик, которым сохранены промежуточные этапы алгоритма
+    :return: результат алгоритма
+    """
+    return Detection(
+        clock_time=result_time,
+        hand_angles_deg=[float(line.angle_deg) for line in debugger.result_lines],
+        match_values=[line.match_value for line in debugger.result_lines],
+    )
+
+
+def _save_test_result(
+    image_name: str,
+    excepted_time_dt: datetime,
+    detection: Detection,
+    debugger: AlgorithmDebugger | None,
+    folder_for_results: Path | None,
+    fail_threshold_seconds: float,
+) -> ImageTestResult:
+    """
+    Сравнивает определенное время с реальным временем на изображении и сохраняет итоговое
+    изображение алгоритма в папку с окончательными результатами
+
+    :param image_name: имя изображения без расширения
+    :param excepted_time_dt: фактическое время на изображении
+    :param detection: результат алгоритма
+    :param debugger: отладчик, которым сохранены промежуточные этапы алгоритма. Если не задан,
+      результат взят из кэша и итоговое изображение не сохраняется
+    :param folder_for_results: путь до общей папки для сохранения итогового результата. Если не
+      задан, итоговое изображение не сохраняется
+    :param fail_threshold_seconds: максимальное отклонение от реального значения, после которого
+      определение времени считается неудачным. Задается в секундах
+    :return: результат тестирования изображения
+    """
+    result_time_dt = datetime.strptime(str(detection.clock_time), '%H:%M:%S.%f')
+
+    delta_sec, success_detection = check_result(
+        excepted_time_dt, result_time_dt, fail_threshold_seconds
+    )
+
+    detect_result = DetectTimeResult(success_detection, delta_sec, result_time_dt, excepted_time_dt)
+
+    if debugger is None:
+        return ImageTestResult(
+            image_name=image_name,
+            detect_result=detect_result,
+            hand_angles_deg=detection.hand_angles_deg,
+            match_values=detection.match_values,
+            from_cache=True,
+        )
+
+    if folder_for_results is not None:
+        result = detect_result.to_str()
+        result_test_image_path = Path(f'{folder_for_results}/{result}.{debugger.image_extension}')
+        debugger.export_image(RESULT_IMAGE_NAME, result_test_image_path)
+    debugger.flush()
+    return ImageTestResult(
+        image_name=image_name,
+        detect_result=detect_result,
+        stage_timings=debugger.stage_timings,
+        hand_angles_deg=detection.hand_angles_deg,
+        match_values=detection.match_values,
+    )
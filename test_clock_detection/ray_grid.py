@@ -0,0 +1,502 @@
+import threading
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike, Point
+from typing_extensions import Self
+
+
+@dataclass(frozen=True)
+class PackedMask:
+    """
+    Бинарная маска изображения или пачки изображений, упакованная по 8 пикселей в байт. Занимает
+    в 8 раз меньше памяти, чем одноканальное изображение, и используется при обработке больших
+    пачек изображений
+    """
+
+    bits: npt.NDArray[np.uint8]
+    """
+    Упакованные биты маски в плоском представлении, старший бит - первый пиксель. Для пачки
+    изображений форма (количество изображений, байты)
+    """
+    shape: tuple[int, int]
+    """ Высота и ширина исходного изображения """
+
+    @classmethod
+    def from_image(cls, image: MatLike, color: int = 255) -> Self:
+        """
+        Упаковывает пиксели заданного цвета одноканального изображения или пачки изображений формы
+        (количество изображений, высота, ширина) в битовую маску
+
+        :param image: одноканальное изображение или пачка изображений
+        :param color: цвет пикселей, которые попадают в маску
+        :return: упакованная маска
+        """
+        height, width = image.shape[-2:]
+        pixels = np.reshape(image, (*image.shape[:-2], height * width))
+        return cls(bits=np.packbits(pixels == color, axis=-1), shape=(height, width))
+
+    def __len__(self) -> int:
+        return len(self.bits) if self.bits.ndim == 2 else 1
+
+    def to_image(self, color: int = 255) -> npt.NDArray[np.uint8]:
+        """
+        Распаковывает маску в одноканальное изображение, например для сохранения при отладке
+
+        :param color: цвет пикселей маски на изображении
+        :return: изображение, в котором пиксели маски имеют заданный цвет, остальные - черные
+        """
+        height, width = self.shape
+        pixels = np.unpackbits(self.bits, axis=-1, count=height * width)
+        image: npt.NDArray[np.uint8] = pixels * np.uint8(color)
+        return image.reshape(*self.bits.shape[:-1], height, width)
+
+    def __getitem__(self, index: int) -> 'PackedMask':
+        """
+        Маска одного изображения из пачки
+
+        :param index: номер изображения в пачке
+        :return: упакованная маска изображения
+        """
+        assert self.bits.ndim == 2, 'Маска не является пачкой изображений'
+        return PackedMask(bits=self.bits[index], shape=self.shape)
+
+
+PROFILE_MATCHES, PROFILE_FIRST_HIT, PROFILE_LAST_HIT, PROFILE_LONGEST_RUN, PROFILE_THICKNESS = (
+    range(5)
+)
+"""Номера столбцов радиального профиля"""
+
+PROFILE_MAX_THICKNESS_DEG: float = 30
+"""Максимальная угловая толщина линии, которая определяется по радиальному профилю"""
+
+
+@dataclass(frozen=True)
+class RadialProfile:
+    """
+    Радиальный профиль бинарной маски вдоль лучей сетки: для каждого угла количество совпавших
+    пикселей, радиусы первого и последнего совпавшего пикселя, длина самого длинного
+    непрерывного отрезка и угловая толщина линии. По профилю различаются стрелки: длинная тонкая
+    секундная, толстая короткая часовая
+    """
+
+    values: npt.NDArray[np.int32]
+    """
+    Значения профиля формы (количество углов, 5) или (количество изображений, количество углов, 5),
+    столбцы - ``PROFILE_MATCHES``, ``PROFILE_FIRST_HIT``, ``PROFILE_LAST_HIT``,
+    ``PROFILE_LONGEST_RUN``, ``PROFILE_THICKNESS``. Радиусы в пикселях, -1 - совпадений на луче
+    нет, толщина в шагах сетки
+    """
+    angles_deg: npt.NDArray[np.float64]
+    """ Углы лучей сетки в градусах """
+
+    @property
+    def match_values(self) -> npt.NDArray[np.int32]:
+        """Количество совпавших пикселей для каждого угла"""
+        return self.values[..., PROFILE_MATCHES]
+
+    @property
+    def angle_spacing_deg(self) -> float:
+        """Расстояние между соседними углами сетки в градусах"""
+        return 360 / (len(self.angles_deg) - 1)
+
+    def __getitem__(self, index: int) -> 'RadialProfile':
+        """
+        Профиль одного изображения из пачки
+
+        :param index: номер изображения в пачке
+        :return: радиальный профиль изображения
+        """
+        assert self.values.ndim == 3, 'Профиль не является пачкой изображений'
+        return RadialProfile(values=self.values[index], angles_deg=self.angles_deg)
+
+    def nearest_row(self, angle_deg: float) -> int:
+        """
+        Номер угла сетки рядом с заданным углом, на котором линия видна лучше всего: из двух
+        соседних углов выбирается угол с большим количеством совпадений. Используется для
+        уточненных углов, которые лежат между углами сетки
+
+        :param angle_deg: угол в градусах
+        :return: номер угла сетки
+        """
+        count_angles = len(self.angles_deg) - 1
+        lower = int(angle_deg // self.angle_spacing_deg) % count_angles
+        upper = (lower + 1) % count_angles
+        match_values = self.match_values
+        return upper if match_values[upper] > match_values[lower] else lower
+
+
+@dataclass(frozen=True)
+class RayOffsets:
+    """
+    Смещения отсчетов лучей относительно центра циферблата для радиусов от 0. Смещения не зависят
+    от центра и размеров изображения, поэтому одни смещения служат сеткам лучей для любого
+    положения циферблата
+    """
+
+    angles_deg: npt.NDArray[np.float64]
+    """ Углы лучей в градусах, форма (количество углов,) """
+    x_offsets: npt.NDArray[np.int16]
+    """ Смещения столбцов отсчетов, форма (количество углов, радиусы) """
+    y_offsets: npt.NDArray[np.int16]
+    """ Смещения строк отсчетов, форма (количество углов, радиусы) """
+
+    @property
+    def max_radius_pix(self) -> int:
+        """Количество радиусов, для которых рассчитаны смещения"""
+        return self.x_offsets.shape[1]
+
+
+@dataclass(frozen=True)
+class RayGrid:
+    """
+    Сетка лучей, исходящих из центра циферблата, для заданных размеров изображения, центра, шага
+    и диапазона радиусов. Позволяет за одну операцию выборки посчитать совпадения пикселей вдоль
+    всех лучей. Координаты отсчетов получаются сдвигом общих смещений ``RayOffsets`` на центр:
+    для выбранных углов - при каждом вызове, для всех углов - один раз при первой полной выборке
+    """
+
+    angles_deg: npt.NDArray[np.float64]
+    """ Углы лучей в градусах, форма (количество углов,) """
+    x_offsets: npt.NDArray[np.int16]
+    """ Смещения столбцов отсчетов относительно центра, форма (количество углов, радиусы) """
+    y_offsets: npt.NDArray[np.int16]
+    """ Смещения строк отсчетов относительно центра, форма (количество углов, радиусы) """
+    image_shape: tuple[int, int]
+    """ Высота и ширина изображения """
+    image_center: Point
+    """ Координаты центра циферблата """
+    min_radius_pix: int = 0
+    """ Радиус первого отсчета каждого луча """
+
+    @property
+    def angle_spacing_deg(self) -> float:
+        """Расстояние между соседними углами сетки в градусах"""
+        return 360 / (len(self.angles_deg) - 1)
+
+    def sample_indices(
+        self, rows: npt.NDArray[np.intp] | None = None
+    ) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.bool_] | None]:
+        """
+        Индексы отсчетов лучей в плоском представлении изображения. Отрицательные координаты
+        отсчитываются от противоположного края изображения, как при обычной индексации массива,
+        а координаты за пределами изображения не учитываются
+
+        :param rows: номера углов сетки, по умолчанию - все углы
+        :return: индексы пикселей формы (количество углов, радиусы) и маска отсчетов, попадающих
+          в изображение, None - в изображение попадают все отсчеты
+        """
+        if rows is None:
+            return self.flat_indices, self.in_bounds
+        if self._inside_image:
+            # Отсчеты не выходят за изображение, поэтому индексы - сдвиг смещений на центр
+            width = self.image_shape[1]
+            center_index = self.image_center[1] * width + self.image_center[0]
+            flat_indices: npt.NDArray[np.intp] = (
+                self.y_offsets[rows].astype(np.intp) * width + self.x_offsets[rows] + center_index
+            )
+            return flat_indices, None
+        return self._sample_indices(rows)
+
+    @cached_property
+    def _inside_image(self) -> bool:
+        """Все отсчеты лучей попадают в изображение без отсчета от противоположного края"""
+        height, width = self.image_shape
+        center_x, center_y = self.image_center
+        max_radius_pix = self.x_offsets.shape[1] + self.min_radius_pix
+        return (
+            max_radius_pix <= center_x < width - max_radius_pix
+            and max_radius_pix <= center_y < height - max_radius_pix
+        )
+
+    @cached_property
+    def _full_samples(self) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.bool_]]:
+        flat_indices, in_bounds = self._sample_indices(slice(None))
+        flat_indices.flags.writeable = False
+        in_bounds.flags.writeable = False
+        return flat_indices, in_bounds
+
+    @property
+    def flat_indices(self) -> npt.NDArray[np.intp]:
+        """Индексы пикселей всех лучей в плоском представлении изображения"""
+        return self._full_samples[0]
+
+    @property
+    def in_bounds(self) -> npt.NDArray[np.bool_]:
+        """Маска отсчетов всех лучей, попадающих в изображение"""
+        return self._full_samples[1]
+
+    def _sample_indices(
+        self, rows: slice | npt.NDArray[np.intp]
+    ) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.bool_]]:
+        height, width = self.image_shape
+        xs = self.image_center[0] + self.x_offsets[rows].astype(np.intp)
+        ys = self.image_center[1] + self.y_offsets[rows].astype(np.intp)
+        in_bounds = (xs >= -width) & (xs < width) & (ys >= -height) & (ys < height)
+        flat_indices: npt.NDArray[np.intp] = np.where(
+            in_bounds, (ys % height) * width + xs % width, 0
+        )
+        return flat_indices, in_bounds
+
+    def angle_window(
+        self, angle_deg: float, half_width_deg: float
+    ) -> tuple[npt.NDArray[np.intp], float]:
+        """
+        Номера углов сетки в окне вокруг заданного угла, упорядоченные по возрастанию угла, в том
+        числе при переходе через 0. Последний угол сетки (360) совпадает с первым (0) и в окно
+        не попадает, чтобы луч не учитывался дважды
+
+        :param angle_deg: центр окна в градусах
+        :param half_width_deg: полуширина окна в градусах
+        :return: номера углов сетки и угол первого из них, который может быть отрицательным или
+          больше 360 при переходе через 0
+        """
+        spacing_deg = self.angle_spacing_deg
+        first = int(np.ceil((angle_deg - half_width_deg) / spacing_deg))
+        last = int(np.floor((angle_deg + half_width_deg) / spacing_deg))
+        rows = np.arange(first, last + 1) % (len(self.angles_deg) - 1)
+        return rows, first * spacing_deg
+
+    @cached_property
+    def _byte_indices(self) -> npt.NDArray[np.intp]:
+        """Номера байтов упакованной маски для каждого отсчета"""
+        return self.flat_indices >> 3
+
+    @cached_property
+    def _bit_masks(self) -> npt.NDArray[np.uint8]:
+        """Маски битов внутри байта упакованной маски для каждого отсчета"""
+        return _bit_masks(self.flat_indices)
+
+    def count_matches(
+        self,
+        image: MatLike | PackedMask,
+        color: int = 255,
+        rows: npt.NDArray[np.intp] | None = None,
+    ) -> npt.NDArray[np.int64]:
+        """
+        Считает количество пикселей заданного цвета вдоль каждого луча сетки
+
+        :param image: одноканальная бинарная маска или упакованная маска, размеры которой
+          совпадают с размерами сетки. Может быть пачкой масок формы
+          (количество изображений, высота, ширина), тогда совпадения считаются одной выборкой для
+          всех изображений
+        :param color: цвет пикселя, учитывается только для неупакованной маски
+        :param rows: номера углов сетки, для которых нужно посчитать совпадения. По умолчанию
+          считаются все углы
+        :return: количество совпавших пикселей для каждого выбранного угла, для пачки форма
+          (количество изображений, количество углов)
+        """
+        in_bounds: npt.NDArray[np.bool_] | None
+        if isinstance(image, PackedMask):
+            if rows is None:
+                byte_indices, bit_masks, in_bounds = (
+                    self._byte_indices,
+                    self._bit_masks,
+                    self.in_bounds,
+                )
+            else:
+                flat_indices, in_bounds = self.sample_indices(rows)
+                byte_indices, bit_masks = flat_indices >> 3, _bit_masks(flat_indices)
+            hits = (image.bits[..., byte_indices] & bit_masks).astype(np.bool_)
+        else:
+            flat_indices, in_bounds = self.sample_indices(rows)
+            pixels = np.reshape(image, (*image.shape[:-2], -1))
+            hits = pixels[..., flat_indices] == color
+        if in_bounds is not None:
+            hits &= in_bounds
+        match_values: npt.NDArray[np.int64] = np.count_nonzero(hits, axis=-1)
+        return match_values
+
+    def radial_profile(
+        self, image: MatLike, color: int = 255, out: npt.NDArray[np.int32] | None = None
+    ) -> RadialProfile:
+        """
+        Строит радиальный профиль по всем углам сетки за одну выборку пикселей, ту же, что и
+        ``count_matches``: все значения профиля вычисляются по одному массиву совпадений формы
+        (углы, радиусы), поэтому различение стрелок не требует повторного обхода лучей
+
+        :param image: одноканальная бинарная маска, размеры которой совпадают с размерами сетки.
+          Может быть пачкой масок формы (количество изображений, высота, ширина)
+        :param color: цвет пикселя
+        :param out: заранее выделенный массив для значений профиля формы
+          (количество углов, 5) или (количество изображений, количество углов, 5)
+        :return: радиальный профиль
+        """
+        pixels = np.reshape(image, (*image.shape[:-2], -1))
+        hits = pixels[..., self.flat_indices] == color
+        hits &= self.in_bounds
+        if out is None:
+            out = np.empty((*hits.shape[:-1], 5), dtype=np.int32)
+        values = out.reshape(-1, 5)
+        rays = hits.reshape(-1, hits.shape[-1])
+
+        values[:, PROFILE_MATCHES] = np.count_nonzero(rays, axis=-1)
+        values[:, PROFILE_FIRST_HIT : PROFILE_LAST_HIT + 1] = -1
+        values[:, PROFILE_LONGEST_RUN] = 0
+        # Лучи дополняются несовпавшими отсчетами с обеих сторон, поэтому границы отрезков из
+        # совпавших отсчетов идут парами: начало отрезка и отсчет после его конца
+        count_samples = rays.shape[-1] + 1
+        padded = np.zeros((len(rays), count_samples + 1), dtype=np.bool_)
+        padded[:, 1:-1] = rays
+        edges = np.flatnonzero(padded[:, 1:] != padded[:, :-1])
+        run_starts, run_ends = edges[0::2], edges[1::2]
+        if len(run_starts) > 0:
+            # Отрезки упорядочены по лучам, поэтому отрезки каждого луча идут подряд
+            run_rays = run_starts // count_samples
+            first_runs = np.flatnonzero(np.diff(run_rays, prepend=-1))
+            last_runs = np.append(first_runs[1:], len(run_rays)) - 1
+            rays_with_runs = run_rays[first_runs]
+            values[rays_with_runs, PROFILE_FIRST_HIT] = (
+                self.min_radius_pix + run_starts[first_runs] % count_samples
+            )
+            values[rays_with_runs, PROFILE_LAST_HIT] = (
+                self.min_radius_pix + run_ends[last_runs] % count_samples - 1
+            )
+            values[rays_with_runs, PROFILE_LONGEST_RUN] = np.maximum.reduceat(
+                run_ends - run_starts, first_runs
+            )
+        out[..., PROFILE_THICKNESS] = self._thickness(out[..., PROFILE_MATCHES])
+        return RadialProfile(values=out, angles_deg=self.angles_deg)
+
+    def _thickness(self, match_values: npt.NDArray[np.int32]) -> npt.NDArray[np.int32]:
+        """
+        Угловая толщина линии для каждого угла: количество соседних углов подряд, количество
+        совпадений которых не меньше половины совпадений угла, вместе с самим углом. Последний
+        угол сетки (360) совпадает с первым (0), поэтому соседи берутся по кругу без него
+
+        :param match_values: количество совпадений для каждого угла, последняя ось - углы
+        :return: толщина в шагах сетки, 0 - совпадений нет
+        """
+        unique_values = match_values[..., :-1]
+        max_offset = int(PROFILE_MAX_THICKNESS_DEG / 2 / self.angle_spacing_deg)
+        circular = np.concatenate(
+            [unique_values[..., -max_offset:], unique_values, unique_values[..., :max_offset]],
+            axis=-1,
+        )
+        windows = np.lib.stride_tricks.sliding_window_view(circular, 2 * max_offset + 1, axis=-1)
+        wide = 2 * windows >= unique_values[..., np.newaxis]
+        # Количество соседей подряд с каждой стороны - номер первого узкого соседа, поэтому за
+        # последним соседом добавляется узкий
+        stop = np.zeros((*wide.shape[:-1], 1), dtype=np.bool_)
+        right = np.argmin(np.concatenate([wide[..., max_offset + 1 :], stop], axis=-1), axis=-1)
+        left = np.argmin(np.concatenate([wide[..., max_offset - 1 :: -1], stop], axis=-1), axis=-1)
+        thickness = (1 + left + right).astype(np.int32)
+        thickness[unique_values == 0] = 0
+        return np.concatenate([thickness, thickness[..., :1]], axis=-1)
+
+
+def angle_spacing_deg(angle_step_deg: float) -> float:
+    """
+    Фактическое расстояние между соседними углами сетки, построенной с заданным шагом
+
+    :param angle_step_deg: шаг поиска линии
+    :return: расстояние между соседними углами в градусах
+    """
+    return 360 / (int(360 // angle_step_deg) - 1)
+
+
+def _bit_masks(flat_indices: npt.NDArray[np.intp]) -> npt.NDArray[np.uint8]:
+    return (np.uint8(0x80) >> (flat_indices & 7)).astype(np.uint8)
+
+
+_OFFSETS_RADIUS_ALIGN = 64
+"""Кратность количества радиусов смещений, чтобы смещения не пересчитывались на каждый радиус"""
+
+_ray_offsets: dict[float, RayOffsets] = {}
+"""Смещения отсчетов лучей по шагам поиска в текущем процессе"""
+
+_ray_offsets_lock = threading.Lock()
+
+
+def get_ray_offsets(angle_step_deg: float, max_len_line_pix: int) -> RayOffsets:
+    """
+    Возвращает смещения отсчетов лучей для шага поиска. Смещения хранятся одни на шаг и
+    пересчитываются, только если нужен больший радиус, поэтому память не зависит от количества
+    положений циферблата
+
+    Координаты отсчетов совпадают с поточечным расчетом через ``polar_to_cartesian``: центр
+    целочисленный, поэтому округление смещения совпадает с округлением координаты
+
+    :param angle_step_deg: шаг поиска линии
+    :param max_len_line_pix: максимальная длина линии
+    :return: смещения отсчетов лучей
+    """
+    with _ray_offsets_lock:
+        offsets = _ray_offsets.get(angle_step_deg)
+        if offsets is not None and offsets.max_radius_pix >= max_len_line_pix:
+            return offsets
+
+        max_steps_angle = int(360 // angle_step_deg)
+        angles_deg = np.linspace(start=0, stop=360, num=max_steps_angle)
+        max_radius_pix = -(-max(max_len_line_pix, 1) // _OFFSETS_RADIUS_ALIGN)
+        radii = np.arange(max_radius_pix * _OFFSETS_RADIUS_ALIGN)
+        # Тригонометрия считается поэлементно, как в polar_to_cartesian, чтобы округление
+        # координат совпадало с поточечным расчетом бит в бит
+        cos_values = np.array([np.cos(np.radians(angle + 90)) for angle in angles_deg])
+        sin_values = np.array([np.sin(np.radians(angle + 90)) for angle in angles_deg])
+        x_offsets = np.rint(-radii[np.newaxis, :] * cos_values[:, np.newaxis]).astype(np.int16)
+        y_offsets = np.rint(-radii[np.newaxis, :] * sin_values[:, np.newaxis]).astype(np.int16)
+
+        for array in (angles_deg, x_offsets, y_offsets):
+            array.flags.writeable = False
+        offsets = RayOffsets(angles_deg=angles_deg, x_offsets=x_offsets, y_offsets=y_offsets)
+        _ray_offsets[angle_step_deg] = offsets
+        return offsets
+
+
+def make_ray_grid(
+    image_shape: tuple[int, int],
+    image_center: Point,
+    angle_step_deg: float,
+    min_len_line_pix: int,
+    max_len_line_pix: int,
+) -> RayGrid:
+    """
+    Создает сетку лучей для заданных параметров без кэширования, например для перебора многих
+    положений центра. Сетка ссылается на общие для шага смещения отсчетов
+
+    :param image_shape: высота и ширина изображения
+    :param image_center: координаты центра циферблата
+    :param angle_step_deg: шаг поиска линии
+    :param min_len_line_pix: минимальная длина линии
+    :param max_len_line_pix: максимальная длина линии
+    :return: сетка лучей
+    """
+    offsets = get_ray_offsets(angle_step_deg, max_len_line_pix)
+    radii = slice(min_len_line_pix, max(max_len_line_pix, min_len_line_pix))
+    return RayGrid(
+        angles_deg=offsets.angles_deg,
+        x_offsets=offsets.x_offsets[:, radii],
+        y_offsets=offsets.y_offsets[:, radii],
+        image_shape=image_shape,
+        image_center=image_center,
+        min_radius_pix=min_len_line_pix,
+    )
+
+
+@lru_cache(maxsize=32)
+def get_ray_grid(
+    image_shape: tuple[int, int],
+    image_center: Point,
+    angle_step_deg: float,
+    min_len_line_pix: int,
+    max_len_line_pix: int,
+) -> RayGrid:
+    """
+    Возвращает сетку лучей для заданных параметров. Сетки ссылаются на общие для шага смещения
+    отсчетов и кэшируются, поэтому при обработке изображений одного размера с одним положением
+    циферблата индексы отсчетов всех лучей считаются один раз, а сетки для других положений не
+    занимают память под смещения
+
+    :param image_shape: высота и ширина изображения
+    :param image_center: координаты центра циферблата
+    :param angle_step_deg: шаг поиска линии
+    :param min_len_line_pix: минимальная длина линии
+    :param max_len_line_pix: максимальная длина линии
+    :return: сетка лучей
+    """
+    return make_ray_grid(
+        image_shape, image_center, angle_step_deg, min_len_line_pix, max_len_line_pix
+    )
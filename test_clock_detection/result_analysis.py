@@ -1,21 +1,37 @@
+import json
+import math
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from dataclasses import asdict
 from pathlib import Path
+from typing import Any
 
+import numpy as np
+import numpy.typing as npt
 from tabulate import tabulate
 
-from test_clock_detection.const import PHOTO_EXTENSION
-from test_clock_detection.data_types import DetectTimeResult
+from test_clock_detection.const import (
+    ERROR_PERCENTILES,
+    ERROR_SKETCH_RESOLUTION_SEC,
+    PHOTO_EXTENSION,
+    STAGE_TIME_PERCENTILES,
+    TIMING_SKETCH_RELATIVE_ACCURACY,
+)
+from test_clock_detection.data_types import DetectTimeResult, ErrorSummary, ImageTestResult
+from test_clock_detection.results_store import read_results
 
 
-def _take_result_from_data(data_folder: Path) -> list[float]:
+def _take_result_from_data(data_folder: Path, image_extension: str) -> list[float]:
     """
     Парсит результаты тестирования из директории с изображениями.
 
     :param data_folder: путь до директории с результатами тестирования
+    :param image_extension: расширение изображений с результатами
     :return: список с результатами тестирования
     """
 
     test_results = []
-    for image in data_folder.glob(f'*.{PHOTO_EXTENSION}'):
+    for image in data_folder.glob(f'*.{image_extension}'):
         image_name = image.stem
         result = DetectTimeResult.from_str(image_name)
         test_results.append(result.error_sec)
@@ -26,45 +42,283 @@ def _take_result_from_data(data_folder: Path) -> list[float]:
     return test_results
 
 
-def _make_stats(error_accuracy: list[float], test_results: list[float]) -> dict[float, float]:
+def _take_result_from_store(results_path: Path) -> tuple['ErrorSketch', dict[str, 'TimingSketch']]:
     """
-    Создает словарь формата {предел погрешности: процент результатов удовлетворяющих погрешности}
+    Читает результаты тестирования из хранилища результатов. Погрешности и время выполнения этапов
+    сразу добавляются в потоковые гистограммы, поэтому не хранятся в памяти списками.
 
-    :param error_accuracy: пределы погрешностей
-    :param test_results: список с результатами тестирования
-    :return: словарь с пределами погрешностей и процентов результатов, входящих в эту погрешность
+    :param results_path: путь до файла хранилища результатов
+    :return: гистограмма погрешностей и гистограммы времени выполнения этапов по их именам
+      в порядке выполнения алгоритма
+    """
+
+    error_sketch = ErrorSketch()
+    stage_sketches: dict[str, TimingSketch] = {}
+    for result in read_results(results_path):
+        error_sketch.add(result.detect_result.error_sec)
+        for stage_name, timing in result.stage_timings.items():
+            stage_sketches.setdefault(stage_name, TimingSketch()).add(timing.wall_ms, timing.cpu_ms)
+
+    assert error_sketch.count > 0, f'Не найден ни один результат в хранилище: {results_path}'
+
+    return error_sketch, stage_sketches
+
+
+class ErrorSketch:
+    """
+    Потоковая гистограмма погрешностей определения времени. Хранит только количество результатов
+    в каждом интервале шириной ``resolution_sec``, поэтому занимаемая память не зависит от
+    количества результатов. Статистику можно получать в любой момент, пока результаты еще
+    добавляются, а гистограммы разных частей выборки (например, разных запусков) объединяются
+    сложением
+    """
+
+    def __init__(self, resolution_sec: float = ERROR_SKETCH_RESOLUTION_SEC) -> None:
+        """
+        :param resolution_sec: ширина интервала гистограммы в секундах
+        """
+        self.resolution_sec = resolution_sec
+        """Ширина интервала гистограммы в секундах"""
+        self.bucket_counts: Counter[int] = Counter()
+        """Количество результатов по номерам интервалов"""
+        self.count = 0
+        """Количество результатов"""
+        self.total_sec = 0.0
+        """Сумма погрешностей"""
+        self.max_sec = 0.0
+        """Максимальная погрешность"""
+
+    def add(self, error_sec: float) -> None:
+        """
+        Добавляет погрешность одного результата
+
+        :param error_sec: погрешность в секундах
+        :return:
+        """
+        self.bucket_counts[self._bucket(error_sec)] += 1
+        self.count += 1
+        self.total_sec += error_sec
+        self.max_sec = max(self.max_sec, error_sec)
+
+    def update(self, errors_sec: Iterable[float]) -> None:
+        """
+        Добавляет погрешности нескольких результатов
+
+        :param errors_sec: погрешности в секундах, может быть генератором
+        :return:
+        """
+        for error_sec in errors_sec:
+            self.add(error_sec)
+
+    def merge(self, other: 'ErrorSketch') -> None:
+        """
+        Добавляет результаты другой гистограммы с тем же разрешением
+
+        :param other: гистограмма другой части выборки
+        :return:
+        """
+        assert (
+            other.resolution_sec == self.resolution_sec
+        ), f'Разрешения гистограмм не совпадают: {self.resolution_sec}, {other.resolution_sec}'
+        self.bucket_counts.update(other.bucket_counts)
+        self.count += other.count
+        self.total_sec += other.total_sec
+        self.max_sec = max(self.max_sec, other.max_sec)
+
+    def count_within(self, error_sec: float) -> int:
+        """
+        Количество результатов, погрешность которых не превышает заданную
+
+        :param error_sec: предел погрешности в секундах
+        :return: количество результатов
+        """
+        last_bucket = self._bucket(error_sec)
+        return sum(count for bucket, count in self.bucket_counts.items() if bucket <= last_bucket)
+
+    def summarize(
+        self, error_accuracy: Sequence[float], percentiles: Sequence[int] = ERROR_PERCENTILES
+    ) -> ErrorSummary:
+        """
+        Рассчитывает сводную статистику погрешностей. Перцентили считаются по ближайшему рангу,
+        как ``summarize_errors``
+
+        :param error_accuracy: пределы погрешностей
+        :param percentiles: номера перцентилей
+        :return: сводная статистика
+        """
+        assert self.count > 0, 'В гистограмме нет результатов'
+        buckets = np.array(sorted(self.bucket_counts))
+        cumulative_counts = np.cumsum([self.bucket_counts[bucket] for bucket in buckets])
+
+        last_buckets = [self._bucket(error) for error in error_accuracy]
+        within_indices = np.searchsorted(buckets, last_buckets, side='right')
+        counts_within = np.concatenate([[0], cumulative_counts])[within_indices]
+
+        ranks = np.ceil(np.asarray(percentiles) / 100 * self.count).clip(min=1)
+        percentile_buckets = buckets[np.searchsorted(cumulative_counts, ranks)]
+        return ErrorSummary(
+            count=self.count,
+            mean_sec=self.total_sec / self.count,
+            max_sec=self.max_sec,
+            percentiles_sec={
+                percentile: round(float(bucket) * self.resolution_sec, 6)
+                for percentile, bucket in zip(percentiles, percentile_buckets, strict=True)
+            },
+            counts_within={
+                error: int(count)
+                for error, count in zip(error_accuracy, counts_within, strict=True)
+            },
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Формирует словарь для сохранения гистограммы, например для объединения результатов
+        частей выборки, обработанных отдельно
+
+        :return: словарь с простыми типами, который можно сохранить в JSON
+        """
+        return {
+            'resolution_sec': self.resolution_sec,
+            'bucket_counts': {str(bucket): count for bucket, count in self.bucket_counts.items()},
+            'count': self.count,
+            'total_sec': self.total_sec,
+            'max_sec': self.max_sec,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'ErrorSketch':
+        """
+        Восстанавливает гистограмму из словаря, созданного ``to_dict``
+
+        :param data: словарь с гистограммой
+        :return: гистограмма погрешностей
+        """
+        error_sketch = cls(data['resolution_sec'])
+        error_sketch.bucket_counts.update({
+            int(bucket): count for bucket, count in data['bucket_counts'].items()
+        })
+        error_sketch.count = data['count']
+        error_sketch.total_sec = data['total_sec']
+        error_sketch.max_sec = data['max_sec']
+        return error_sketch
+
+    def _bucket(self, error_sec: float) -> int:
+        return round(error_sec / self.resolution_sec)
+
+
+class TimingSketch:
     """
+    Потоковая гистограмма времени выполнения. Ширина интервалов растет вместе со временем, поэтому
+    перцентили рассчитываются с заданной относительной точностью при любом разбросе времени, а
+    занимаемая память не зависит от количества замеров
+    """
+
+    def __init__(self, relative_accuracy: float = TIMING_SKETCH_RELATIVE_ACCURACY) -> None:
+        """
+        :param relative_accuracy: относительная точность перцентилей
+        """
+        self.relative_accuracy = relative_accuracy
+        """Относительная точность перцентилей"""
+        self.bucket_counts: Counter[int] = Counter()
+        """Количество замеров по номерам интервалов"""
+        self.count = 0
+        """Количество замеров"""
+        self.total_wall_ms = 0.0
+        """Суммарное астрономическое время"""
+        self.total_cpu_ms = 0.0
+        """Суммарное процессорное время"""
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        """Логарифм отношения границ соседних интервалов"""
+
+    def add(self, wall_ms: float, cpu_ms: float = 0) -> None:
+        """
+        Добавляет один замер времени
+
+        :param wall_ms: астрономическое время в миллисекундах
+        :param cpu_ms: процессорное время в миллисекундах
+        :return:
+        """
+        self.bucket_counts[self._bucket(wall_ms)] += 1
+        self.count += 1
+        self.total_wall_ms += wall_ms
+        self.total_cpu_ms += cpu_ms
+
+    def percentiles(self, percentiles: Sequence[int]) -> dict[int, float]:
+        """
+        Рассчитывает перцентили астрономического времени по ближайшему рангу
+
+        :param percentiles: номера перцентилей
+        :return: время в миллисекундах по номерам перцентилей
+        """
+        assert self.count > 0, 'В гистограмме нет замеров'
+        buckets = np.array(sorted(self.bucket_counts))
+        cumulative_counts = np.cumsum([self.bucket_counts[bucket] for bucket in buckets])
+        ranks = np.ceil(np.asarray(percentiles) / 100 * self.count).clip(min=1)
+        percentile_buckets = buckets[np.searchsorted(cumulative_counts, ranks)]
+        return {
+            percentile: self._bucket_value(int(bucket))
+            for percentile, bucket in zip(percentiles, percentile_buckets, strict=True)
+        }
 
-    count_results_in_accuracy = {}
-    for error in error_accuracy:
-        count_results_in_accuracy[error] = 0
+    def _bucket(self, value_ms: float) -> int:
+        return math.ceil(math.log(max(value_ms, _MIN_TIMING_MS)) / self._log_gamma)
 
-    for result in test_results:
-        for error in error_accuracy:
-            if result <= error:
-                count_results_in_accuracy[error] += 1
+    def _bucket_value(self, bucket: int) -> float:
+        # Середина интервала в смысле относительной погрешности: отличается от любого значения
+        # интервала не больше чем на relative_accuracy
+        return 2 * math.exp(bucket * self._log_gamma) / (math.exp(self._log_gamma) + 1)
 
-    percent_results_in_accuracy = {}
-    for error, count in count_results_in_accuracy.items():
-        percent_in_accuracy = round(count / len(test_results) * 100, 2)
-        percent_results_in_accuracy[error] = percent_in_accuracy
 
-    return percent_results_in_accuracy
+_MIN_TIMING_MS = 1e-6
+"""Время, до которого округляются нулевые замеры, чтобы взять логарифм"""
 
 
-def _print_result_analysis(percent_results_in_accuracy: dict[float, float], data_size: int) -> None:
+def summarize_errors(
+    errors_sec: Sequence[float] | npt.NDArray[np.float64],
+    error_accuracy: Sequence[float],
+    percentiles: Sequence[int] = ERROR_PERCENTILES,
+) -> ErrorSummary:
     """
-    Выводит в консоль результаты анализа
+    Рассчитывает точную сводную статистику погрешностей, когда все погрешности находятся в памяти
 
-    :param percent_results_in_accuracy: словарь с погрешностями и процентом вошедших в них
-    результатов
+    :param errors_sec: погрешности в секундах в любом порядке
+    :param error_accuracy: пределы погрешностей
+    :param percentiles: номера перцентилей
+    :return: сводная статистика
+    """
+    errors = np.sort(np.asarray(errors_sec, dtype=np.float64))
+    assert len(errors) > 0, 'Нет результатов тестирования'
+    counts_within = np.searchsorted(errors, error_accuracy, side='right')
+    percentile_values = np.percentile(errors, percentiles, method='inverted_cdf')
+    return ErrorSummary(
+        count=len(errors),
+        mean_sec=float(errors.mean()),
+        max_sec=float(errors[-1]),
+        percentiles_sec={
+            percentile: float(value)
+            for percentile, value in zip(percentiles, percentile_values, strict=True)
+        },
+        counts_within={
+            error: int(count) for error, count in zip(error_accuracy, counts_within, strict=True)
+        },
+    )
+
+
+def _print_result_analysis(error_summary: ErrorSummary) -> None:
+    """
+    Выводит в консоль результаты анализа: процент результатов, уложившихся в каждый предел
+    погрешности, среднюю и максимальную погрешность, перцентили и гистограмму погрешностей
+
+    :param error_summary: сводная статистика погрешностей
     :return:
     """
 
+    data_size = error_summary.count
     print(f'Размер выборки: {data_size}')
     table = []
+    percent_results_in_accuracy = error_summary.percent_within()
     for accuracy, percent in percent_results_in_accuracy.items():
-        error_count = data_size - round(data_size * percent / 100)
+        error_count = data_size - error_summary.counts_within[accuracy]
         table.append([f'{accuracy} c.', f'{percent} %', error_count])
     print(
         tabulate(
@@ -74,18 +328,98 @@ def _print_result_analysis(percent_results_in_accuracy: dict[float, float], data
         )
     )
 
+    percentiles = ', '.join(
+        f'p{percentile}: {value:g} c.'
+        for percentile, value in error_summary.percentiles_sec.items()
+    )
+    print(
+        f'Средняя погрешность: {error_summary.mean_sec:.3f} c., '
+        f'максимальная: {error_summary.max_sec:g} c., {percentiles}'
+    )
+
+    histogram = []
+    previous_error: float | None = None
+    previous_count = 0
+    for error, count in error_summary.counts_within.items():
+        interval = f'до {error} c.' if previous_error is None else f'{previous_error} - {error} c.'
+        histogram.append([interval, count - previous_count])
+        previous_error, previous_count = error, count
+    histogram.append([f'больше {previous_error} c.', data_size - previous_count])
+    print(tabulate(histogram, headers=['Интервал погрешности', 'Количество'], tablefmt='github'))
+
+
+def _print_stage_timings(stage_sketches: dict[str, TimingSketch]) -> None:
+    """
+    Выводит в консоль перцентили времени выполнения этапов алгоритма на одно изображение и
+    суммарное время этапов по всем изображениям
+
+    :param stage_sketches: гистограммы времени выполнения этапов по их именам
+    :return:
+    """
+
+    if len(stage_sketches) == 0:
+        return
+
+    table = []
+    for stage_name, sketch in stage_sketches.items():
+        percentiles_ms = sketch.percentiles(STAGE_TIME_PERCENTILES).values()
+        table.append([
+            stage_name,
+            sketch.count,
+            *(round(value, 3) for value in percentiles_ms),
+            round(sketch.total_wall_ms, 1),
+            round(sketch.total_cpu_ms, 1),
+        ])
+
+    percentile_headers = [f'p{percentile} мс' for percentile in STAGE_TIME_PERCENTILES]
+    print(
+        tabulate(
+            table,
+            headers=['Этап', 'Изображений', *percentile_headers, 'Всего мс', 'Процессор мс'],
+            tablefmt='github',
+        )
+    )
+
+
+def save_stage_timings(path: Path, test_results: Iterable[ImageTestResult]) -> None:
+    """
+    Сохраняет время выполнения этапов алгоритма для каждого изображения в JSON файл формата
+    {имя изображения: {имя этапа: {wall_ms, cpu_ms, calls}}}
+
+    :param path: путь до JSON файла
+    :param test_results: результаты тестирования изображений, может быть генератором
+    :return:
+    """
+
+    data = {
+        result.image_name: {name: asdict(timing) for name, timing in result.stage_timings.items()}
+        for result in test_results
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+
 
-def create_report_of_test(path_to_data: Path, error_accuracy: list[float]) -> None:
+def create_report_of_test(
+    path_to_data: Path, error_accuracy: list[float], image_extension: str = PHOTO_EXTENSION
+) -> None:
     """
-    Изменяет заданный csv файл, внося в него результаты пределы погрешностей и проценты
-    результатов, удовлетворяющих погрешностям.
+    Выводит в консоль пределы погрешностей и проценты результатов, удовлетворяющих
+    погрешностям, а также время выполнения этапов алгоритма, если оно сохранено.
 
-    :param path_to_data: путь до директории с результатами
+    :param path_to_data: путь до файла хранилища результатов (см. ``ResultsStore``) или до
+      директории с итоговыми изображениями, имена которых содержат результаты
     :param error_accuracy: список погрешностей
+    :param image_extension: расширение изображений с результатами, используется только для
+      директории с изображениями
     :return:
     """
 
-    test_results = _take_result_from_data(path_to_data)
-    percent_results_in_accuracy = _make_stats(error_accuracy, test_results)
-    data_size = len(test_results)
-    _print_result_analysis(percent_results_in_accuracy, data_size)
+    stage_sketches: dict[str, TimingSketch] = {}
+    if path_to_data.is_dir():
+        test_results = _take_result_from_data(path_to_data, image_extension)
+        error_summary = summarize_errors(test_results, error_accuracy)
+    else:
+        error_sketch, stage_sketches = _take_result_from_store(path_to_data)
+        error_summary = error_sketch.summarize(error_accuracy)
+    _print_result_analysis(error_summary)
+    _print_stage_timings(stage_sketches)
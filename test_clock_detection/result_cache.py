@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from test_clock_detection.const import (
+    ANGLE_STEP_SCHEDULE_DEG,
+    RESULT_CACHE_MAX_SIZE_BYTES,
+    RESULT_CACHE_VERSION,
+)
+from test_clock_detection.data_types import Detection
+
+_ALGORITHM_MODULES = (
+    'data_types.py',
+    'detect_time.py',
+    'dial_locator.py',
+    'image_reader.py',
+    'ray_grid.py',
+    'utils.py',
+)
+"""Модули алгоритма, изменение которых делает кэшированные результаты недействительными"""
+
+
+@lru_cache(maxsize=1)
+def algorithm_fingerprint() -> str:
+    """
+    Отпечаток текущей версии алгоритма: хэш исходного кода модулей алгоритма, шагов поиска и
+    версии формата кэша. При изменении алгоритма или его параметров отпечаток меняется, и
+    кэшированные результаты перестают использоваться
+
+    :return: шестнадцатеричная строка отпечатка
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{RESULT_CACHE_VERSION}:{ANGLE_STEP_SCHEDULE_DEG}'.encode())
+    package_folder = Path(__file__).parent
+    for module_name in _ALGORITHM_MODULES:
+        digest.update((package_folder / module_name).read_bytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш результатов алгоритма на диске. Ключ результата - хэш содержимого изображения и отпечаток
+    алгоритма, поэтому при повторном запуске не обрабатываются изображения, которые не менялись,
+    если не менялся и алгоритм. Каждый результат хранится в отдельном файле, поэтому кэшем могут
+    одновременно пользоваться несколько процессов. При превышении заданного размера удаляются
+    результаты, которые дольше всего не использовались
+    """
+
+    def __init__(self, folder: Path, max_size_bytes: int = RESULT_CACHE_MAX_SIZE_BYTES) -> None:
+        """
+        :param folder: папка кэша
+        :param max_size_bytes: максимальный размер кэша в байтах
+        """
+        self.folder = folder
+        """Папка кэша"""
+        self.max_size_bytes = max_size_bytes
+        """Максимальный размер кэша в байтах"""
+
+    def make_key(self, image_data: npt.NDArray[np.uint8]) -> str:
+        """
+        Создает ключ результата для изображения по содержимому его файла
+
+        :param image_data: байты файла изображения, например отображенные в память
+        :return: ключ результата
+        """
+        digest = hashlib.blake2b(image_data.data)
+        digest.update(algorithm_fingerprint().encode())
+        return digest.hexdigest()[:40]
+
+    def make_frame_key(self, frame: npt.NDArray[np.uint8], context: str = '') -> str:
+        """
+        Создает ключ результата для кадра из архива кадров
+
+        :param frame: кадр
+        :param context: дополнительные данные, от которых зависит результат, например положение
+          циферблата на кадре
+        :return: ключ результата
+        """
+        digest = hashlib.blake2b(f'{frame.shape}:{context}'.encode())
+        digest.update(np.ascontiguousarray(frame).data)
+        digest.update(algorithm_fingerprint().encode())
+        return digest.hexdigest()[:40]
+
+    def get(self, key: str) -> Detection | None:
+        """
+        Возвращает кэшированный результат и отмечает его как недавно использованный
+
+        :param key: ключ результата
+        :return: результат алгоритма или None, если результата нет в кэше или его не удалось
+          прочитать
+        """
+        entry_path = self._entry_path(key)
+        try:
+            data = json.loads(entry_path.read_text(encoding='utf-8'))
+            detection = Detection.from_dict(data)
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Поврежденный или записанный другой версией формата результат считается отсутствующим
+            return None
+        return detection
+
+    def put(self, key: str, detection: Detection) -> None:
+        """
+        Сохраняет результат в кэш. Файл записывается во временный файл и затем переименовывается,
+        поэтому другие процессы не прочитают частично записанный результат
+
+        :param key: ключ результата
+        :param detection: результат алгоритма
+        :return:
+        """
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=entry_path.parent, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            json.dump(detection.to_dict(), file)
+        os.replace(temp_path, entry_path)
+
+    def evict(self) -> int:
+        """
+        Удаляет результаты, которые дольше всего не использовались, пока размер кэша превышает
+        максимальный
+
+        :return: количество удаленных результатов
+        """
+        entries = []
+        total_size = 0
+        for entry_path in self.folder.glob('*/*.json'):
+            stat = entry_path.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_size += stat.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
+            removed += 1
+        return removed
+
+    def _entry_path(self, key: str) -> Path:
+        return self.folder / key[:2] / f'{key}.json'
@@ -0,0 +1,84 @@
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+from test_clock_detection.const import RESULTS_FLUSH_EVERY
+from test_clock_detection.data_types import ImageTestResult
+
+
+class ResultsStore:
+    """
+    Хранилище результатов тестирования в формате JSON Lines: одна строка - результат одного
+    изображения. Результаты только дописываются в конец файла и записываются на диск пачками,
+    поэтому при прерывании тестирования сохраняются все записанные пачки, а чтение результатов
+    не требует обхода папки с изображениями
+    """
+
+    def __init__(
+        self, path: Path, flush_every: int = RESULTS_FLUSH_EVERY, append: bool = False
+    ) -> None:
+        """
+        :param path: путь до файла с результатами
+        :param flush_every: количество результатов, после которого они записываются на диск
+        :param append: дописывать результаты в существующий файл. По умолчанию файл создается
+          заново
+        """
+        assert flush_every > 0, f'Размер пачки должен быть положительным, получено: {flush_every}'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        """Путь до файла с результатами"""
+        self.flush_every = flush_every
+        """Количество результатов, после которого они записываются на диск"""
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')  # noqa: SIM115
+        """Открытый файл с результатами"""
+        self._pending: list[str] = []
+        """Строки результатов, еще не записанные на диск"""
+
+    def append(self, result: ImageTestResult) -> None:
+        """
+        Добавляет результат тестирования изображения
+
+        :param result: результат тестирования изображения
+        :return:
+        """
+        self._pending.append(json.dumps(result.to_dict(), ensure_ascii=False))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Записывает на диск все добавленные результаты
+        """
+        if len(self._pending) == 0:
+            return
+        self._file.write('\n'.join(self._pending) + '\n')
+        self._file.flush()
+        self._pending.clear()
+
+    def close(self) -> None:
+        """
+        Записывает оставшиеся результаты и закрывает файл
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def read_results(path: Path) -> Iterator[ImageTestResult]:
+    """
+    Читает результаты тестирования из хранилища по одному, не загружая файл целиком
+
+    :param path: путь до файла с результатами
+    :return: генератор результатов тестирования
+    """
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield ImageTestResult.from_dict(json.loads(line))
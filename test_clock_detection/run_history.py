@@ -0,0 +1,448 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from tabulate import tabulate
+
+from test_clock_detection.const import (
+    CALCULATED_ERRORS,
+    REGRESSION_ACCURACY_TOLERANCE_PERCENT,
+    REGRESSION_THROUGHPUT_TOLERANCE,
+    STAGE_TIME_PERCENTILES,
+)
+from test_clock_detection.result_analysis import ErrorSketch, TimingSketch
+from test_clock_detection.result_cache import algorithm_fingerprint
+from test_clock_detection.results_store import read_results
+
+RUNS_FILE_NAME = 'Запуски.jsonl'
+"""Имя файла со сводками запусков в папке истории, одна строка - один запуск"""
+
+IMAGE_ERRORS_FOLDER_NAME = 'Погрешности'
+"""Имя папки истории с погрешностями изображений каждого запуска"""
+
+
+@dataclass
+class RunSummary:
+    """Сводка одного запуска тестирования"""
+
+    run_id: str
+    """ Идентификатор запуска - время начала """
+    git_revision: str | None
+    """ Ревизия git, None - каталог не является репозиторием git """
+    git_dirty: bool
+    """ В рабочем каталоге есть незафиксированные изменения """
+    algorithm_fingerprint: str
+    """ Отпечаток модулей алгоритма, меняется и при незафиксированных изменениях """
+    parameters: dict[str, Any]
+    """ Параметры запуска и алгоритма """
+    count: int
+    """ Количество изображений """
+    count_from_cache: int
+    """ Количество изображений, результаты которых взяты из кэша """
+    wall_sec: float
+    """ Время обработки всех изображений """
+    latency_percentiles_ms: dict[int, float]
+    """ Перцентили суммарного времени этапов на изображение, без изображений из кэша """
+    mean_error_sec: float
+    """ Средняя погрешность """
+    max_error_sec: float
+    """ Максимальная погрешность """
+    percent_within: dict[float, float] = field(default_factory=dict)
+    """ Процент изображений, уложившихся в погрешность, по пределам ``CALCULATED_ERRORS`` """
+
+    @property
+    def images_per_sec(self) -> float:
+        return self.count / self.wall_sec if self.wall_sec > 0 else 0
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Формирует словарь для записи в JSON
+
+        :return: словарь с простыми типами
+        """
+        data = asdict(self)
+        data['images_per_sec'] = self.images_per_sec
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'RunSummary':
+        """
+        Восстанавливает сводку из словаря, созданного ``to_dict``. Ключи словарей в JSON - строки,
+        поэтому перцентили и пределы погрешностей переводятся обратно в числа
+
+        :param data: словарь со сводкой
+        :return: сводка запуска
+        """
+        data = dict(data)
+        data.pop('images_per_sec', None)
+        data['latency_percentiles_ms'] = {
+            int(percentile): value for percentile, value in data['latency_percentiles_ms'].items()
+        }
+        data['percent_within'] = {
+            float(error): percent for error, percent in data['percent_within'].items()
+        }
+        return cls(**data)
+
+
+def _git_revision(repo_root: Path) -> tuple[str | None, bool]:
+    """
+    :param repo_root: корневая папка проекта
+    :return: ревизия git и признак незафиксированных изменений, None - git недоступен
+    """
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=repo_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return revision, len(status.strip()) > 0
+
+
+def summarize_run(
+    results_path: Path, wall_sec: float, parameters: dict[str, Any], repo_root: Path
+) -> tuple[RunSummary, dict[str, float]]:
+    """
+    Составляет сводку запуска по хранилищу результатов. Результаты читаются по одному
+
+    :param results_path: путь до файла хранилища результатов запуска
+    :param wall_sec: время обработки всех изображений
+    :param parameters: параметры запуска и алгоритма
+    :param repo_root: корневая папка проекта для определения ревизии git
+    :return: сводка запуска и погрешности изображений по их именам
+    """
+    error_sketch = ErrorSketch()
+    image_errors: dict[str, float] = {}
+    latency_sketch = TimingSketch()
+    count_from_cache = 0
+    for result in read_results(results_path):
+        error_sketch.add(result.detect_result.error_sec)
+        image_errors[result.image_name] = result.detect_result.error_sec
+        if result.from_cache:
+            count_from_cache += 1
+        else:
+            latency_sketch.add(sum(timing.wall_ms for timing in result.stage_timings.values()))
+    assert error_sketch.count > 0, f'Не найден ни один результат в хранилище: {results_path}'
+
+    error_summary = error_sketch.summarize(CALCULATED_ERRORS)
+    latency_percentiles_ms = {}
+    if latency_sketch.count > 0:
+        latency_percentiles_ms = {
+            percentile: round(value, 3)
+            for percentile, value in latency_sketch.percentiles(STAGE_TIME_PERCENTILES).items()
+        }
+    git_revision, git_dirty = _git_revision(repo_root)
+    summary = RunSummary(
+        run_id=datetime.now().strftime('%Y%m%d-%H%M%S-%f'),
+        git_revision=git_revision,
+        git_dirty=git_dirty,
+        algorithm_fingerprint=algorithm_fingerprint(),
+        parameters=parameters,
+        count=error_summary.count,
+        count_from_cache=count_from_cache,
+        wall_sec=wall_sec,
+        latency_percentiles_ms=latency_percentiles_ms,
+        mean_error_sec=round(error_summary.mean_sec, 6),
+        max_error_sec=error_summary.max_sec,
+        percent_within=error_summary.percent_within(),
+    )
+    return summary, image_errors
+
+
+class RunHistory:
+    """
+    История запусков тестирования: сводки дописываются в конец *Запуски.jsonl*, а погрешности
+    изображений каждого запуска хранятся в отдельном файле, чтобы список запусков читался быстро
+    независимо от размера выборки
+    """
+
+    def __init__(self, folder: Path) -> None:
+        """
+        :param folder: папка истории запусков
+        """
+        self.folder = folder
+        """Папка истории запусков"""
+
+    def append(self, summary: RunSummary, image_errors: dict[str, float]) -> None:
+        """
+        Добавляет запуск в историю
+
+        :param summary: сводка запуска
+        :param image_errors: погрешности изображений по их именам
+        :return:
+        """
+        errors_folder = self.folder / IMAGE_ERRORS_FOLDER_NAME
+        errors_folder.mkdir(parents=True, exist_ok=True)
+        (errors_folder / f'{summary.run_id}.json').write_text(
+            json.dumps(image_errors, ensure_ascii=False), encoding='utf-8'
+        )
+        # Строка записывается одним вызовом, поэтому запуски частей в отдельных процессах не
+        # перемешивают строки друг друга
+        with open(self.folder / RUNS_FILE_NAME, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(summary.to_dict(), ensure_ascii=False) + '\n')
+
+    def runs(self) -> list[RunSummary]:
+        """
+        :return: сводки запусков в порядке их добавления
+        """
+        runs_path = self.folder / RUNS_FILE_NAME
+        if not runs_path.exists():
+            return []
+        with open(runs_path, encoding='utf-8') as file:
+            return [RunSummary.from_dict(json.loads(line)) for line in file if line.strip()]
+
+    def find(self, reference: str) -> RunSummary:
+        """
+        Находит запуск по идентификатору или по номеру с конца истории
+
+        :param reference: идентификатор запуска или отрицательный номер, например *-1* -
+          последний запуск
+        :return: сводка запуска
+        """
+        runs = self.runs()
+        # Идентификатор запуска начинается с даты из цифр, поэтому номером считается только
+        # отрицательное число
+        if reference.startswith('-') and reference[1:].isdigit():
+            index = int(reference)
+            assert -len(runs) <= index, f'В истории {len(runs)} запусков, запуска {reference} нет'
+            return runs[index]
+        matches = [run for run in runs if run.run_id.startswith(reference)]
+        assert len(matches) == 1, f'Запуск {reference} не найден или не однозначен'
+        return matches[0]
+
+    def image_errors(self, run_id: str) -> dict[str, float]:
+        """
+        :param run_id: идентификатор запуска
+        :return: погрешности изображений запуска по их именам
+        """
+        errors_path = self.folder / IMAGE_ERRORS_FOLDER_NAME / f'{run_id}.json'
+        errors: dict[str, float] = json.loads(errors_path.read_text(encoding='utf-8'))
+        return errors
+
+
+def find_regressions(
+    base: RunSummary,
+    new: RunSummary,
+    throughput_tolerance: float = REGRESSION_THROUGHPUT_TOLERANCE,
+    accuracy_tolerance_percent: float = REGRESSION_ACCURACY_TOLERANCE_PERCENT,
+) -> list[str]:
+    """
+    Сравнивает скорость и точность нового запуска с базовым
+
+    :param base: базовый запуск
+    :param new: новый запуск
+    :param throughput_tolerance: допустимое относительное снижение скорости, например 0.1 - на
+      10 %
+    :param accuracy_tolerance_percent: допустимое снижение процента изображений, уложившихся в
+      каждую погрешность, в процентных пунктах
+    :return: описания ухудшений, пустой список - ухудшений нет
+    """
+    regressions = []
+    if new.images_per_sec < base.images_per_sec * (1 - throughput_tolerance):
+        regressions.append(
+            f'Скорость снизилась с {base.images_per_sec:.2f} до {new.images_per_sec:.2f} изобр./с'
+        )
+    for error, base_percent in base.percent_within.items():
+        new_percent = new.percent_within.get(error)
+        if new_percent is not None and new_percent < base_percent - accuracy_tolerance_percent:
+            regressions.append(
+                f'В погрешность {error} c. уложилось {new_percent} % вместо {base_percent} %'
+            )
+    return regressions
+
+
+def _print_comparison(base: RunSummary, new: RunSummary) -> None:
+    """
+    Выводит в консоль таблицу показателей двух запусков и различающиеся параметры
+
+    :param base: базовый запуск
+    :param new: новый запуск
+    :return:
+    """
+    table = [
+        ['Ревизия', _describe_revision(base), _describe_revision(new)],
+        ['Изображений', base.count, new.count],
+        ['Из кэша', base.count_from_cache, new.count_from_cache],
+        ['Изобр./с', round(base.images_per_sec, 2), round(new.images_per_sec, 2)],
+        *(
+            [f'p{percentile} мс', base.latency_percentiles_ms.get(percentile), value]
+            for percentile, value in new.latency_percentiles_ms.items()
+        ),
+        ['Средняя погрешность с', base.mean_error_sec, new.mean_error_sec],
+        ['Максимальная погрешность с', base.max_error_sec, new.max_error_sec],
+        *(
+            [f'Уложилось в {error} c. %', base.percent_within.get(error), percent]
+            for error, percent in new.percent_within.items()
+        ),
+    ]
+    print(tabulate(table, headers=['', base.run_id, new.run_id], tablefmt='github'))
+
+    changed_parameters = [
+        [name, base.parameters.get(name), new.parameters.get(name)]
+        for name in dict.fromkeys([*base.parameters, *new.parameters])
+        if base.parameters.get(name) != new.parameters.get(name)
+    ]
+    if len(changed_parameters) > 0:
+        print('Различающиеся параметры:')
+        print(
+            tabulate(
+                changed_parameters, headers=['Параметр', 'Базовый', 'Новый'], tablefmt='github'
+            )
+        )
+    if base.count_from_cache > 0 or new.count_from_cache > 0:
+        print('Часть результатов взята из кэша, скорость запусков может быть несравнима')
+
+
+def _print_image_changes(
+    base_errors: dict[str, float], new_errors: dict[str, float], count_shown: int
+) -> None:
+    """
+    Выводит в консоль изменения погрешностей отдельных изображений
+
+    :param base_errors: погрешности изображений базового запуска
+    :param new_errors: погрешности изображений нового запуска
+    :param count_shown: количество выводимых изображений с наибольшим изменением погрешности
+    :return:
+    """
+    common_names = base_errors.keys() & new_errors.keys()
+    changes = sorted(
+        (
+            (round(new_errors[name] - base_errors[name], 6), name)
+            for name in common_names
+            if new_errors[name] != base_errors[name]
+        ),
+        reverse=True,
+    )
+    count_worse = sum(1 for delta, _ in changes if delta > 0)
+    print(
+        f'Общих изображений: {len(common_names)}, погрешность увеличилась: {count_worse}, '
+        f'уменьшилась: {len(changes) - count_worse}'
+    )
+    only_base = len(base_errors.keys() - common_names)
+    only_new = len(new_errors.keys() - common_names)
+    if only_base > 0 or only_new > 0:
+        print(f'Только в базовом запуске: {only_base}, только в новом: {only_new}')
+
+    worst_changes = [change for change in changes if change[0] > 0][:count_shown]
+    if len(worst_changes) > 0:
+        table = [
+            [name, base_errors[name], new_errors[name], f'{delta:+g}']
+            for delta, name in worst_changes
+        ]
+        print(
+            tabulate(
+                table,
+                headers=['Изображение', 'Было с', 'Стало с', 'Изменение с'],
+                tablefmt='github',
+            )
+        )
+
+
+def _describe_revision(summary: RunSummary) -> str:
+    if summary.git_revision is None:
+        return 'нет'
+    return summary.git_revision[:10] + (' (изменен)' if summary.git_dirty else '')
+
+
+def _print_runs(runs: Sequence[RunSummary]) -> None:
+    """
+    Выводит в консоль таблицу запусков
+
+    :param runs: сводки запусков
+    :return:
+    """
+    table = [
+        [
+            run.run_id,
+            _describe_revision(run),
+            run.count,
+            round(run.images_per_sec, 2),
+            run.mean_error_sec,
+            run.max_error_sec,
+        ]
+        for run in runs
+    ]
+    print(
+        tabulate(
+            table,
+            headers=['Запуск', 'Ревизия', 'Изображений', 'Изобр./с', 'Средняя с', 'Макс. с'],
+            tablefmt='github',
+        )
+    )
+
+
+def main() -> None:
+    repo_root = Path(os.path.abspath(__file__)).parent.parent
+    parser = argparse.ArgumentParser(description='История запусков тестирования')
+    parser.add_argument(
+        '--history',
+        type=Path,
+        default=repo_root / 'files' / 'История запусков',
+        help='папка истории запусков',
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='вывести запуски')
+
+    compare_parser = commands.add_parser(
+        'compare', help='сравнить два запуска, код возврата 1 - скорость или точность ухудшились'
+    )
+    compare_parser.add_argument(
+        'base', nargs='?', default='-2', help='базовый запуск, по умолчанию - предпоследний'
+    )
+    compare_parser.add_argument(
+        'new', nargs='?', default='-1', help='новый запуск, по умолчанию - последний'
+    )
+    compare_parser.add_argument(
+        '--throughput-tolerance',
+        type=float,
+        default=REGRESSION_THROUGHPUT_TOLERANCE,
+        help='допустимое относительное снижение скорости, например 0.1 - на 10 %%',
+    )
+    compare_parser.add_argument(
+        '--accuracy-tolerance',
+        type=float,
+        default=REGRESSION_ACCURACY_TOLERANCE_PERCENT,
+        help='допустимое снижение процента изображений, уложившихся в погрешность, в пунктах',
+    )
+    compare_parser.add_argument(
+        '--show',
+        type=int,
+        default=10,
+        help='количество выводимых изображений с наибольшим увеличением погрешности',
+    )
+    args = parser.parse_args()
+
+    history = RunHistory(args.history)
+    if args.command == 'list':
+        _print_runs(history.runs())
+        return
+
+    base = history.find(args.base)
+    new = history.find(args.new)
+    _print_comparison(base, new)
+    _print_image_changes(
+        history.image_errors(base.run_id), history.image_errors(new.run_id), args.show
+    )
+    regressions = find_regressions(base, new, args.throughput_tolerance, args.accuracy_tolerance)
+    for regression in regressions:
+        print(f'Ухудшение: {regression}')
+    if len(regressions) > 0:
+        sys.exit(1)
+    print('Ухудшений нет')
+
+
+if __name__ == '__main__':
+    main()
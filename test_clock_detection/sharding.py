@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+from test_clock_detection.const import CALCULATED_ERRORS, RESULTS_FILE_NAME
+from test_clock_detection.result_analysis import create_report_of_test
+from test_clock_detection.results_store import ResultsStore, read_results
+
+_SHARD_RESULTS_PATTERN = re.compile(r' \(часть (\d+) из (\d+)\)$')
+"""Окончание имени файла результатов части без расширения"""
+
+CHECK_FOLDER_NAME = 'Проверка разбиения'
+"""
+Папка в папке с результатами для результатов локальной проверки разбиения, чтобы проверка не
+перезаписывала результаты последнего запуска тестирования
+"""
+
+CHECK_MERGED_FILE_NAME = 'Результаты (объединенные части).jsonl'
+"""Имя файла объединенных результатов частей при локальной проверке разбиения"""
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    Часть набора изображений для тестирования на нескольких машинах. Изображение попадает в часть
+    по хэшу имени, поэтому разбиение одинаково на всех машинах и не зависит от порядка файлов в
+    каталоге, а добавление изображений не переносит остальные изображения между частями
+    """
+
+    index: int
+    """ Номер части от 1 до ``count`` """
+    count: int
+    """ Количество частей """
+
+    def __post_init__(self) -> None:
+        assert 1 <= self.index <= self.count, f'Номер части должен быть от 1 до {self.count}'
+
+    @classmethod
+    def parse(cls, text: str) -> 'Shard':
+        """
+        :param text: часть в формате *номер/количество*, например *1/4*
+        :return: часть набора изображений
+        """
+        index, separator, count = text.partition('/')
+        assert separator == '/', f'Часть должна быть задана как номер/количество: {text}'
+        return cls(int(index), int(count))
+
+    def contains(self, image_name: str) -> bool:
+        """
+        Проверяет, относится ли изображение к части. Используется хэш blake2b, а не ``hash``,
+        значение которого для строк меняется между запусками интерпретатора
+
+        :param image_name: имя изображения без расширения
+        :return: True, если изображение относится к части
+        """
+        digest = hashlib.blake2b(image_name.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') % self.count == self.index - 1
+
+    @property
+    def results_file_name(self) -> str:
+        """
+        Имя файла хранилища результатов части в папке с результатами
+        """
+        stem, extension = os.path.splitext(RESULTS_FILE_NAME)
+        return f'{stem} (часть {self.index} из {self.count}){extension}'
+
+    def __str__(self) -> str:
+        return f'{self.index}/{self.count}'
+
+
+def find_shard_results(results_folder: Path) -> list[Path]:
+    """
+    Находит файлы результатов частей в папке с результатами и проверяет, что есть все части
+    одного разбиения
+
+    :param results_folder: папка с результатами
+    :return: пути до файлов результатов частей в порядке номеров частей
+    """
+    stem, extension = os.path.splitext(RESULTS_FILE_NAME)
+    shard_paths: dict[Shard, Path] = {}
+    for path in results_folder.glob(f'{stem} (часть * из *){extension}'):
+        match = _SHARD_RESULTS_PATTERN.search(path.stem)
+        if match is not None:
+            shard_paths[Shard(int(match[1]), int(match[2]))] = path
+    assert len(shard_paths) > 0, f'В папке {results_folder} нет результатов частей'
+
+    counts = {shard.count for shard in shard_paths}
+    assert len(counts) == 1, f'Результаты разных разбиений на части: {sorted(counts)}'
+    count = counts.pop()
+    missing = [index for index in range(1, count + 1) if Shard(index, count) not in shard_paths]
+    assert len(missing) == 0, f'Нет результатов частей {missing} из {count}'
+    return [shard_paths[Shard(index, count)] for index in range(1, count + 1)]
+
+
+def merge_results(shard_paths: Iterable[Path], output_path: Path) -> int:
+    """
+    Объединяет результаты частей в одно хранилище результатов. Результаты читаются и
+    записываются по одному, поэтому части не загружаются в память целиком
+
+    :param shard_paths: пути до файлов результатов частей
+    :param output_path: путь до объединенного файла результатов
+    :return: количество объединенных результатов
+    """
+    image_names: set[str] = set()
+    with ResultsStore(output_path) as results_store:
+        for shard_path in shard_paths:
+            assert shard_path != output_path, f'Часть совпадает с объединенным файлом: {shard_path}'
+            for result in read_results(shard_path):
+                assert (
+                    result.image_name not in image_names
+                ), f'Изображение {result.image_name} есть в нескольких частях'
+                image_names.add(result.image_name)
+                results_store.append(result)
+    return len(image_names)
+
+
+def check_shards(count: int, check_folder: Path, run_args: Sequence[str] = ()) -> list[str]:
+    """
+    Проверяет разбиение на одной машине: запускает тестирование всех частей одновременно
+    отдельными процессами, объединяет их результаты и сравнивает с тестированием всего набора
+    одним запуском. Рабочие процессы алгоритма делятся между частями поровну, кэш результатов не
+    используется, чтобы каждая часть выполнила алгоритм. Все запуски записывают результаты в
+    папку ``check_folder``, которая перед проверкой очищается. Результаты частей остаются только в
+    объединенном файле ``CHECK_MERGED_FILE_NAME``
+
+    :param count: количество частей
+    :param check_folder: папка для результатов проверки
+    :param run_args: дополнительные аргументы программы тестирования, например ``--archive``
+    :return: имена изображений, результаты которых в частях и в общем запуске различаются или
+      есть только в одном из них. Пустой список - разбиение дает тот же результат
+    """
+    shutil.rmtree(check_folder, ignore_errors=True)
+    command = [sys.executable, '-m', 'test_clock_detection', *run_args]
+    command += ['--no-history', '--no-cache', '--results-folder', str(check_folder)]
+    jobs = max(1, (os.cpu_count() or 1) // count)
+    shards = [Shard(index, count) for index in range(1, count + 1)]
+    processes = [
+        subprocess.Popen(
+            [*command, '--jobs', str(jobs), '--shard', str(shard)], stdout=subprocess.DEVNULL
+        )
+        for shard in shards
+    ]
+    for shard, process in zip(shards, processes, strict=True):
+        assert process.wait() == 0, f'Тестирование части {shard} завершилось с ошибкой'
+    subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+
+    # Файлы частей удаляются после объединения, иначе команда merge без аргументов найдет в папке
+    # части разных разбиений
+    merged_path = check_folder / CHECK_MERGED_FILE_NAME
+    shard_paths = [check_folder / shard.results_file_name for shard in shards]
+    merge_results(shard_paths, merged_path)
+    for shard_path in shard_paths:
+        shard_path.unlink()
+    merged = {
+        result.image_name: (result.detect_result, result.hand_angles_deg)
+        for result in read_results(merged_path)
+    }
+    single = {
+        result.image_name: (result.detect_result, result.hand_angles_deg)
+        for result in read_results(check_folder / RESULTS_FILE_NAME)
+    }
+    return sorted(
+        image_name
+        for image_name in merged.keys() | single.keys()
+        if merged.get(image_name) != single.get(image_name)
+    )
+
+
+def main() -> None:
+    repo_root = Path(os.path.abspath(__file__)).parent.parent
+    results_folder = repo_root / 'files' / 'Результаты'
+
+    parser = argparse.ArgumentParser(description='Объединение результатов тестирования частей')
+    commands = parser.add_subparsers(dest='command', required=True)
+    merge_parser = commands.add_parser(
+        'merge', help='объединить результаты частей и вывести общий отчет'
+    )
+    merge_parser.add_argument(
+        'shards',
+        type=Path,
+        nargs='*',
+        help='файлы результатов частей, по умолчанию - все части в папке с результатами',
+    )
+    merge_parser.add_argument(
+        '--output',
+        type=Path,
+        default=results_folder / RESULTS_FILE_NAME,
+        help='объединенный файл результатов',
+    )
+    check_parser = commands.add_parser(
+        'check',
+        help='проверить разбиение локально: запустить части отдельными процессами и сравнить '
+        'их объединенные результаты с запуском на одной машине, код возврата 1 - различаются',
+    )
+    check_parser.add_argument('count', type=int, help='количество частей')
+    check_parser.add_argument(
+        'run_args',
+        nargs=argparse.REMAINDER,
+        help='аргументы программы тестирования, например --archive "files/Архив кадров"',
+    )
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        check_folder = results_folder / CHECK_FOLDER_NAME
+        mismatches = check_shards(args.count, check_folder, args.run_args)
+        for image_name in mismatches:
+            print(f'Результат различается: {image_name}')
+        if len(mismatches) > 0:
+            sys.exit(1)
+        print(f'Объединенные результаты {args.count} частей совпадают с запуском на одной машине')
+        create_report_of_test(check_folder / CHECK_MERGED_FILE_NAME, CALCULATED_ERRORS)
+        return
+
+    shard_paths = args.shards if len(args.shards) > 0 else find_shard_results(results_folder)
+    count_results = merge_results(shard_paths, args.output)
+    print(f'Объединено результатов: {count_results} из частей: {len(shard_paths)}')
+    create_report_of_test(args.output, CALCULATED_ERRORS)
+
+
+if __name__ == '__main__':
+    main()
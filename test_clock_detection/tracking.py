@@ -0,0 +1,239 @@
+from collections.abc import Hashable
+from dataclasses import replace
+
+import numpy as np
+from cv2.typing import MatLike, Point
+
+from test_clock_detection.algorithm_debugger import Debugger, DebugLevel, DummyDebugger
+from test_clock_detection.const import RESULT_IMAGE_NAME
+from test_clock_detection.data_types import ClockTime, DialGeometry, Line
+from test_clock_detection.detect_time import (
+    DEFAULT_DETECT_PARAMS,
+    DetectParams,
+    _convert_angle_to_time,
+    _prepare_dial_image,
+    _refine_lines,
+    _search_hands,
+)
+from test_clock_detection.ray_grid import RayGrid, get_ray_grid
+
+HAND_SPEEDS_DEG_PER_MS: tuple[float, float, float] = (
+    360 / (12 * 60 * 60 * 1000),
+    360 / (60 * 60 * 1000),
+    360 / (60 * 1000),
+)
+"""Скорости вращения часовой, минутной и секундной стрелок в градусах за миллисекунду"""
+
+
+class ClockTracker:
+    """
+    Определение времени по последовательным кадрам видео. Запоминает углы стрелок на предыдущем
+    кадре и ищет каждую стрелку только в узком окне вокруг предсказанного положения. Полный поиск
+    по всем углам выполняется на первом кадре, после большого разрыва между кадрами и при падении
+    качества совпадения стрелки. Циферблат, область поиска и различение стрелок при полном поиске
+    те же, что и в ``detect_time_from_image``, поэтому полный поиск дает тот же результат.
+    Пока предсказанные углы стрелок ближе ``min_angle_diff_deg``, одна стрелка может закрывать
+    другую, и стрелки в окнах могут поменяться местами. Поэтому на таких кадрах выполняется полный
+    поиск, а углы стрелок продолжают предсказываться по кадру до сближения. Когда стрелки
+    расходятся, полный поиск заново различает их, и отслеживание продолжается. Если при полном
+    поиске самая слабая линия намного слабее самой сильной, закрытая стрелка, скорее всего,
+    подменена другой линией, и отслеживание с такого кадра не начинается
+    """
+
+    def __init__(
+        self,
+        dial: DialGeometry | None = None,
+        params: DetectParams = DEFAULT_DETECT_PARAMS,
+        window_deg: float = 3,
+        min_match_ratio: float = 0.8,
+        min_hand_match_ratio: float = 0.1,
+        max_frame_gap_ms: float = 2000,
+        camera_id: Hashable = None,
+    ) -> None:
+        """
+        :param dial: положение циферблата на кадрах. Если не задано, циферблат ищется по кадрам
+        :param params: параметры алгоритма. Первый шаг ``angle_steps_deg`` - шаг поиска в окне,
+          остальные - шаги уточнения угла
+        :param window_deg: полуширина окна поиска вокруг предсказанного угла стрелки в градусах
+        :param min_match_ratio: минимальная доля совпадения стрелки в окне относительно совпадения
+          при последнем полном поиске. При меньшем совпадении выполняется полный поиск
+        :param min_hand_match_ratio: минимальная доля совпадения самой слабой стрелки относительно
+          самой сильной при полном поиске. При меньшей доле одна из найденных линий считается не
+          стрелкой, и следующий кадр тоже обрабатывается полным поиском
+        :param max_frame_gap_ms: максимальный интервал между кадрами, при котором стрелки
+          отслеживаются. При большем интервале выполняется полный поиск
+        :param camera_id: идентификатор камеры, см. ``detect_time_from_image``
+        """
+        self.dial = dial
+        """Положение циферблата на кадрах, None - ищется по кадрам"""
+        self.params = params
+        """Параметры алгоритма"""
+        self.window_deg = window_deg
+        """Полуширина окна поиска вокруг предсказанного угла стрелки"""
+        self.min_match_ratio = min_match_ratio
+        """Минимальная доля совпадения стрелки относительно последнего полного поиска"""
+        self.min_hand_match_ratio = min_hand_match_ratio
+        """Минимальная доля совпадения самой слабой стрелки относительно самой сильной"""
+        self.max_frame_gap_ms = max_frame_gap_ms
+        """Максимальный интервал между кадрами для отслеживания стрелок"""
+        self.camera_id = camera_id
+        """Идентификатор камеры, для которой запоминается положение циферблата"""
+        self.full_search_count = 0
+        """Количество кадров, обработанных полным поиском"""
+        self.tracked_count = 0
+        """Количество кадров, обработанных поиском в окнах"""
+
+        self._hands: list[Line] | None = None
+        """Часовая, минутная и секундная стрелки на предыдущем кадре"""
+        self._reference_match_values: list[int] = []
+        """Совпадения стрелок при последнем полном поиске"""
+        self._timestamp_ms = 0.0
+        """Время предыдущего кадра"""
+        self._hands_close = False
+        """Предсказанные углы стрелок на предыдущем кадре были ближе ``min_angle_diff_deg``"""
+
+    def detect(
+        self, image: MatLike, timestamp_ms: float, debug_mode: None | Debugger = None
+    ) -> ClockTime:
+        """
+        Определяет время на очередном кадре
+
+        :param image: цветное изображение кадра в формате BGR или серое изображение
+        :param timestamp_ms: время кадра от начала записи в миллисекундах
+        :param debug_mode: режим отладки
+        :return: время на часах
+        """
+        debugger = debug_mode if debug_mode is not None else DummyDebugger()
+        image_binary, image_center, line_lengths = _prepare_dial_image(
+            image, debugger, self.dial, self.params, self.camera_id
+        )
+        grid = self._get_grid(image_binary, image_center, line_lengths)
+
+        hands = None
+        trackable = True
+        predicted_hands = None
+        frame_gap_ms = timestamp_ms - self._timestamp_ms
+        if self._hands is not None and 0 < frame_gap_ms <= self.max_frame_gap_ms:
+            predicted_hands = _predict_hands(self._hands, frame_gap_ms)
+        hands_close = (
+            predicted_hands is not None
+            and _min_angle_diff_deg(predicted_hands) < self.params.min_angle_diff_deg
+        )
+        if predicted_hands is not None and not hands_close and not self._hands_close:
+            with debugger.measure_stage('Поиск линий'):
+                hands = self._track_hands(image_binary, image_center, grid, predicted_hands)
+        if hands is not None:
+            with debugger.measure_stage('Уточнение углов'):
+                hands = _refine_lines(
+                    image_binary, hands, self.params.angle_steps_deg, *line_lengths, 255
+                )
+            self.tracked_count += 1
+        else:
+            hands = list(
+                _search_hands(image_binary, image_center, line_lengths, self.params, debugger)
+            )
+            self._reference_match_values = self._count_hand_matches(image_binary, grid, hands)
+            trackable = min(self._reference_match_values) >= self.min_hand_match_ratio * max(
+                self._reference_match_values
+            )
+            self.full_search_count += 1
+
+        # Пока стрелки близко, полный поиск может принять за стрелку другую линию, поэтому
+        # запоминаются предсказанные углы
+        if hands_close:
+            self._hands = predicted_hands
+        else:
+            self._hands = hands if trackable else None
+        self._hands_close = hands_close
+        self._timestamp_ms = timestamp_ms
+        debugger.save_image_with_lines(RESULT_IMAGE_NAME, image_binary, hands, DebugLevel.RESULT)
+        return _convert_angle_to_time(*hands)
+
+    def reset(self) -> None:
+        """
+        Сбрасывает запомненные положения стрелок, следующий кадр будет обработан полным поиском
+        """
+        self._hands = None
+        self._hands_close = False
+
+    @staticmethod
+    def _count_hand_matches(image_binary: MatLike, grid: RayGrid, hands: list[Line]) -> list[int]:
+        """
+        Совпадения стрелок на ближайших к их углам лучах сетки поиска в окнах
+
+        :param image_binary: бинарное изображение области циферблата
+        :param grid: сетка поиска в окнах
+        :param hands: часовая, минутная и секундная стрелки
+        :return: совпадения стрелок
+        """
+        angles_deg = np.array([hand.angle_deg for hand in hands])
+        rows = np.rint(angles_deg / grid.angle_spacing_deg).astype(np.intp)
+        rows %= len(grid.angles_deg) - 1
+        match_values: list[int] = grid.count_matches(image_binary, 255, rows).tolist()
+        return match_values
+
+    def _track_hands(
+        self, image_binary: MatLike, image_center: Point, grid: RayGrid, predicted_hands: list[Line]
+    ) -> list[Line] | None:
+        """
+        Поиск стрелок в окнах вокруг положений, предсказанных по предыдущему кадру
+
+        :param image_binary: бинарное изображение области циферблата
+        :param image_center: центр циферблата в области
+        :param grid: сетка поиска в окнах
+        :param predicted_hands: часовая, минутная и секундная стрелки, предсказанные по
+          предыдущему кадру
+        :return: часовая, минутная и секундная стрелки или None, если хотя бы одна стрелка
+          не найдена в своем окне
+        """
+        hands = []
+        for hand, reference in zip(predicted_hands, self._reference_match_values, strict=True):
+            rows, _ = grid.angle_window(hand.angle_deg, self.window_deg)
+            if rows.size == 0:
+                return None
+            match_values = grid.count_matches(image_binary, 255, rows)
+
+            best = int(np.argmax(match_values))
+            if match_values[best] < self.min_match_ratio * reference:
+                return None
+            hands.append(
+                replace(
+                    hand,
+                    line_start=image_center,
+                    angle_deg=grid.angles_deg[rows[best]],
+                    match_value=int(match_values[best]),
+                )
+            )
+        return hands
+
+    def _get_grid(
+        self, image_binary: MatLike, image_center: Point, line_lengths: tuple[int, int]
+    ) -> RayGrid:
+        return get_ray_grid(
+            image_binary.shape[:2], image_center, self.params.angle_steps_deg[0], *line_lengths
+        )
+
+
+def _predict_hands(hands: list[Line], frame_gap_ms: float) -> list[Line]:
+    """
+    :param hands: часовая, минутная и секундная стрелки на предыдущем кадре
+    :param frame_gap_ms: интервал между кадрами
+    :return: стрелки, повернутые на угол, который они проходят за интервал между кадрами
+    """
+    return [
+        replace(hand, angle_deg=(hand.angle_deg + speed * frame_gap_ms) % 360)
+        for hand, speed in zip(hands, HAND_SPEEDS_DEG_PER_MS, strict=True)
+    ]
+
+
+def _min_angle_diff_deg(hands: list[Line]) -> float:
+    """
+    :param hands: стрелки
+    :return: наименьшая разница углов между стрелками с учетом перехода через 0
+    """
+    diffs = [
+        abs(first.angle_deg - second.angle_deg) % 360
+        for index, first in enumerate(hands)
+        for second in hands[index + 1 :]
+    ]
+    return min(min(diff, 360 - diff) for diff in diffs)
@@ -43,3 +43,16 @@ def check_result(
         return delta_sec, True
     else:
         return delta_sec, False
+
+
+def expected_time_from_name(image_name: str) -> datetime:
+    """
+    Возвращает фактическое время на изображении по имени файла формата *ЧЧ:ММ:СС.мс*. Часы
+    переводятся в 12-часовой формат, так как стрелочные часы не различают первую и вторую половину
+    суток
+
+    :param image_name: имя изображения без расширения
+    :return: фактическое время на изображении
+    """
+    excepted_time_24h = datetime.strptime(image_name, '%H:%M:%S.%f')
+    return datetime.strptime(excepted_time_24h.strftime('%I:%M:%S.%f'), '%I:%M:%S.%f')
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import cv2
+import pytest
+from cv2.typing import MatLike
+
+from test_clock_detection.detect_time import BINARY_THRESHOLD
+from tests.samples import IMAGE_PATHS, read_gray
+
+
+@pytest.fixture(params=IMAGE_PATHS, ids=[path.stem for path in IMAGE_PATHS])
+def image_path(request: pytest.FixtureRequest) -> Path:
+    """Путь до каждого примера изображения"""
+    path: Path = request.param
+    return path
+
+
+@pytest.fixture
+def image_gray(image_path: Path) -> MatLike:
+    """Серое изображение каждого примера"""
+    return read_gray(image_path)
+
+
+@pytest.fixture
+def image_binary(image_gray: MatLike) -> MatLike:
+    """Бинарное изображение каждого примера с порогом алгоритма"""
+    return cv2.threshold(image_gray, BINARY_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
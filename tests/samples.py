@@ -0,0 +1,55 @@
+from datetime import timedelta
+from pathlib import Path
+
+import cv2
+from cv2.typing import MatLike
+
+from test_clock_detection.data_types import DetectTimeResult, ImageTestResult, StageTiming
+from test_clock_detection.utils import check_result, expected_time_from_name
+
+IMAGES_FOLDER = Path(__file__).parents[1] / 'files' / 'Изображения'
+"""Папка с примерами изображений часов"""
+
+IMAGE_PATHS = sorted(IMAGES_FOLDER.glob('*.bmp'))
+"""Примеры изображений часов, имя изображения - фактическое время на нем"""
+
+
+def read_gray(image_path: Path) -> MatLike:
+    """
+    :param image_path: путь до изображения
+    :return: серое изображение, прочитанное через OpenCV
+    """
+    return cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+
+
+def make_test_result(image_name: str, error_sec: float, wall_ms: float = 10) -> ImageTestResult:
+    """
+    Результат тестирования изображения с заданной погрешностью
+
+    :param image_name: имя изображения без расширения, фактическое время на нем
+    :param error_sec: на сколько определенное время больше фактического
+    :param wall_ms: время выполнения единственного этапа алгоритма
+    :return: результат тестирования изображения
+    """
+    expected_time = expected_time_from_name(image_name)
+    detected_time = expected_time + timedelta(seconds=error_sec)
+    delta_sec, success_detection = check_result(expected_time, detected_time, 1)
+    return ImageTestResult(
+        image_name=image_name,
+        detect_result=DetectTimeResult(
+            int(success_detection), delta_sec, detected_time, expected_time
+        ),
+        stage_timings={'Поиск линий': StageTiming(wall_ms=wall_ms, cpu_ms=wall_ms, calls=1)},
+        hand_angles_deg=[10.5, 120.25, 300],
+        match_values=[150, 90, 60],
+    )
+
+
+def make_test_results() -> list[ImageTestResult]:
+    """
+    :return: результаты тестирования примеров изображений с погрешностями от 0 до 1.8 с
+    """
+    return [
+        make_test_result(image_path.stem, 0.2 * index)
+        for index, image_path in enumerate(IMAGE_PATHS)
+    ]
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from cv2.typing import MatLike
+
+from test_clock_detection.const import ANGLE_STEP_SCHEDULE_DEG
+from test_clock_detection.data_types import Line
+from test_clock_detection.detect_time import (
+    _downscale_binary,
+    _interpolate_peak,
+    _refine_lines,
+    detect_time_from_image,
+)
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.utils import check_result, expected_time_from_name, polar_to_cartesian
+
+CENTER = (320, 240)
+"""Центр линий на синтетических изображениях"""
+
+
+@pytest.mark.parametrize(
+    ('match_values', 'peak_index', 'expected'),
+    [
+        ([1, 5, 9, 5, 1], 2, 2),
+        ([1, 5, 9, 9, 5, 1], 2, 2.5),
+        ([1, 3, 9, 7, 1], 2, 2.25),
+        ([0, 0, 9, 9, 0], 2, 2.5),
+        ([9, 5, 1], 0, 0),
+        ([1, 9, 9], 1, 1.5),
+    ],
+    ids=['symmetric', 'plateau', 'shifted', 'clamped', 'first', 'last-plateau'],
+)
+def test_interpolate_peak(match_values: list[int], peak_index: int, expected: float) -> None:
+    assert _interpolate_peak(np.array(match_values), peak_index) == pytest.approx(expected)
+
+
+def _line_image(angle_deg: float, width: int) -> MatLike:
+    image = np.zeros((480, 640), dtype=np.uint8)
+    end_x, end_y = polar_to_cartesian(angle_deg, 200, CENTER, 90)
+    cv2.line(image, CENTER, (end_x, end_y), (255,), width)
+    return image
+
+
+@pytest.mark.parametrize('angle_deg', [37.45, 151.6, 359.55])
+@pytest.mark.parametrize('width', [1, 3])
+def test_refine_lines_finds_sub_degree_angle(angle_deg: float, width: int) -> None:
+    image = _line_image(angle_deg, width)
+    coarse_line = Line(name='', line_start=CENTER, angle_deg=round(angle_deg) % 360, len_line=200)
+
+    (line,) = _refine_lines(image, [coarse_line], ANGLE_STEP_SCHEDULE_DEG, 0, 200, 255)
+
+    # Точность ограничена растеризацией линии, но меньше шага грубого поиска
+    error_deg = abs((line.angle_deg - angle_deg + 180) % 360 - 180)
+    assert error_deg < ANGLE_STEP_SCHEDULE_DEG[1]
+    assert line.match_value > 0
+
+
+def test_downscale_keeps_thin_lines(image_binary: MatLike) -> None:
+    downscaled = _downscale_binary(image_binary, 2)
+
+    height, width = downscaled.shape
+    blocks = image_binary[: height * 2, : width * 2].reshape(height, 2, width, 2)
+    assert np.array_equal(downscaled == 255, blocks.max(axis=(1, 3)) == 255)
+
+
+def test_detect_time_from_image_matches_name(image_path: Path) -> None:
+    result_time = detect_time_from_image(read_image(image_path))
+
+    result_dt = expected_time_from_name(str(result_time))
+    delta_sec, _ = check_result(expected_time_from_name(image_path.stem), result_dt, 1)
+    assert delta_sec <= 0.4
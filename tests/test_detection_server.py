@@ -0,0 +1,110 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+from cv2.typing import MatLike
+
+from test_clock_detection import detection_server
+from test_clock_detection.data_types import BatchMatchResult, ClockTime, Detection
+from test_clock_detection.detect_time import detect_time_batch, detect_time_from_image
+from test_clock_detection.detection_server import DetectionServer, _detect_frames, query_server
+from test_clock_detection.image_reader import read_image
+from tests.samples import IMAGE_PATHS, read_gray
+
+
+def _expected_times() -> list[ClockTime]:
+    return [detect_time_from_image(read_image(image_path)) for image_path in IMAGE_PATHS]
+
+
+def test_detect_frames_equals_single_detection() -> None:
+    sources: list[MatLike | Path] = [*IMAGE_PATHS, *(read_gray(path) for path in IMAGE_PATHS)]
+
+    results = _detect_frames(sources, [None for _ in sources])
+
+    expected = _expected_times()
+    assert all(isinstance(result, Detection) for result in results)
+    assert [result.clock_time for result in results if isinstance(result, Detection)] == [
+        *expected,
+        *expected,
+    ]
+
+
+def test_errors_reach_only_failing_frames(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def fail_on_black_frames(
+        images_gray: npt.NDArray[np.uint8], **kwargs: Any
+    ) -> tuple[list[ClockTime], BatchMatchResult]:
+        assert images_gray.reshape(len(images_gray), -1).any(axis=1).all(), 'Черный кадр'
+        return detect_time_batch(images_gray, **kwargs)
+
+    monkeypatch.setattr(detection_server, 'detect_time_batch', fail_on_black_frames)
+    black = np.zeros((480, 640), dtype=np.uint8)
+    sources: list[MatLike | Path] = [
+        IMAGE_PATHS[0],
+        tmp_path / 'Нет файла.bmp',
+        black,
+        np.zeros((2, 2), dtype=np.uint8),
+        IMAGE_PATHS[1],
+    ]
+
+    results = _detect_frames(sources, [None for _ in sources])
+
+    expected = _expected_times()
+    assert isinstance(results[0], Detection) and results[0].clock_time == expected[0]
+    assert isinstance(results[4], Detection) and results[4].clock_time == expected[1]
+    assert isinstance(results[1], str) and results[1].startswith('FileNotFoundError')
+    assert isinstance(results[2], str) and results[2].startswith('AssertionError: Черный кадр')
+    assert isinstance(results[3], str)
+
+
+def test_concurrent_requests_are_batched(tmp_path: Path) -> None:
+    server = DetectionServer(max_batch_size=len(IMAGE_PATHS) + 1, max_wait_ms=200)
+
+    async def detect_all() -> list[Detection | BaseException]:
+        batcher = asyncio.create_task(server._run_batches())
+        try:
+            return await asyncio.gather(
+                *(server.detect(path) for path in [*IMAGE_PATHS, tmp_path / 'Нет файла.bmp']),
+                return_exceptions=True,
+            )
+        finally:
+            batcher.cancel()
+
+    results = asyncio.run(detect_all())
+
+    assert [
+        result.clock_time for result in results[:-1] if isinstance(result, Detection)
+    ] == _expected_times()
+    assert isinstance(results[-1], ValueError)
+    assert server.stats.batches == 1
+    assert server.stats.requests == len(IMAGE_PATHS) + 1
+    assert server.stats.errors == 1
+
+
+def test_protocol_over_unix_socket(tmp_path: Path) -> None:
+    socket_path = tmp_path / 'Сервер.sock'
+    requests: list[dict[str, Any]] = [
+        *({'path': path.as_posix()} for path in IMAGE_PATHS),
+        {'path': (tmp_path / 'Нет файла.bmp').as_posix()},
+        {'command': 'stats'},
+    ]
+
+    async def query() -> list[dict[str, Any]]:
+        serving = asyncio.create_task(DetectionServer().serve(socket_path, 'localhost', 0))
+        try:
+            while not socket_path.exists():
+                await asyncio.sleep(0.01)
+            return await asyncio.to_thread(query_server, requests, socket_path)
+        finally:
+            serving.cancel()
+
+    responses = asyncio.run(query())
+
+    assert [response['time'] for response in responses[: len(IMAGE_PATHS)]] == [
+        str(clock_time) for clock_time in _expected_times()
+    ]
+    assert 'error' in responses[-2]
+    assert responses[-1]['requests'] == len(IMAGE_PATHS) + 1
+    assert responses[-1]['errors'] == 1
@@ -0,0 +1,107 @@
+import math
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from cv2.typing import MatLike
+
+from test_clock_detection.benchmark import SyntheticClockParams, render_clock
+from test_clock_detection.data_types import ClockTime, DialCalibration, DialGeometry
+from test_clock_detection.detect_time import (
+    CALIBRATED_DIAL,
+    DIAL_TICK_OFFSET_PIX,
+    detect_time_from_image,
+    dial_calibration,
+)
+from test_clock_detection.dial_locator import (
+    DialLocator,
+    get_dial_locator,
+    locate_dial,
+    refine_dial,
+)
+from tests.samples import IMAGE_PATHS, read_gray
+
+
+def _shift(image: MatLike, shift_x: int, shift_y: int) -> MatLike:
+    height, width = image.shape[:2]
+    matrix = np.array([[1, 0, shift_x], [0, 1, shift_y]], dtype=np.float32)
+    return cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+
+def test_refine_snaps_to_calibrated_dial(image_gray: MatLike) -> None:
+    found = locate_dial(image_gray)
+    assert found is not None
+
+    assert refine_dial(image_gray, found, dial_calibration(image_gray.shape)) == CALIBRATED_DIAL
+
+
+def test_refine_without_calibration_finds_tick_center(image_gray: MatLike) -> None:
+    found = locate_dial(image_gray)
+    assert found is not None
+
+    dial = refine_dial(image_gray, found)
+
+    tick_center = (
+        CALIBRATED_DIAL.center[0] + DIAL_TICK_OFFSET_PIX[0],
+        CALIBRATED_DIAL.center[1] + DIAL_TICK_OFFSET_PIX[1],
+    )
+    assert math.dist(dial.center, tick_center) <= 1.5
+    assert dial.radius == pytest.approx(CALIBRATED_DIAL.radius, rel=0.05)
+
+
+def test_shifted_camera_uses_its_calibration() -> None:
+    image = _shift(read_gray(IMAGE_PATHS[0]), 12, -7)
+    shifted_dial = DialGeometry(center=(327, 243), radius=CALIBRATED_DIAL.radius)
+    calibration = DialCalibration(dial=shifted_dial, tick_offset=DIAL_TICK_OFFSET_PIX)
+    found = locate_dial(image)
+    assert found is not None
+
+    assert refine_dial(image, found, calibration) == shifted_dial
+
+
+@pytest.mark.parametrize(
+    ('center_ratio', 'radius_ratio'), [((0.5, 0.5), 0.4), ((0.45, 0.55), 0.35)]
+)
+def test_locator_finds_synthetic_dial(
+    center_ratio: tuple[float, float], radius_ratio: float
+) -> None:
+    params = SyntheticClockParams(dial_center_ratio=center_ratio, dial_radius_ratio=radius_ratio)
+    image = render_clock(ClockTime(hours=3, minutes=20, seconds=40, ms=0), params)
+
+    dial = DialLocator(None).locate(image)
+
+    assert dial.center == params.dial_center
+    assert dial.radius == pytest.approx(params.dial_radius, rel=0.1)
+
+
+def test_locator_searches_again_only_when_camera_moves() -> None:
+    images = [read_gray(image_path) for image_path in IMAGE_PATHS]
+    locator = DialLocator(dial_calibration(images[0].shape), revalidate_every=1)
+
+    for image in images:
+        assert locator.locate(image) == CALIBRATED_DIAL
+    assert locator.count_searches == 1
+
+    moved = locator.locate(_shift(images[0], 40, 25))
+    assert locator.count_searches == 2
+    assert math.dist(moved.center, (355, 275)) <= 1.5
+
+
+def test_locators_are_shared_per_camera() -> None:
+    shape = (480, 640)
+    calibration = dial_calibration(shape)
+
+    locator = get_dial_locator(shape, calibration, 'Камера 1')
+
+    assert get_dial_locator(shape, calibration, 'Камера 1') is locator
+    assert get_dial_locator(shape, calibration, 'Камера 2') is not locator
+    assert get_dial_locator((240, 320), calibration, 'Камера 1') is not locator
+
+
+def test_detection_with_located_dial_equals_calibrated(image_path: Path) -> None:
+    image = read_gray(image_path)
+
+    result = detect_time_from_image(image)
+
+    assert result == detect_time_from_image(image, dial=CALIBRATED_DIAL)
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from test_clock_detection.algorithm_debugger import DebugSettings
+from test_clock_detection.detect_time import CALIBRATED_DIAL, detect_time_from_image
+from test_clock_detection.frame_archive import open_frame_archive, pack_images, unpack_archive
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.pipeline_stages import detect_frames, prefetch_archive
+from test_clock_detection.utils import expected_time_from_name
+from tests.samples import IMAGE_PATHS, IMAGES_FOLDER
+
+
+def test_pack_and_open(tmp_path: Path) -> None:
+    pack_images(IMAGES_FOLDER, tmp_path / 'Архив')
+
+    archive = open_frame_archive(tmp_path / 'Архив')
+
+    assert archive.names == [image_path.stem for image_path in IMAGE_PATHS]
+    assert archive.dial is None
+    assert not archive.frames.flags.writeable
+    for index, image_path in enumerate(IMAGE_PATHS):
+        assert np.array_equal(archive.frames[index], read_image(image_path))
+        assert archive.expected_time(index) == expected_time_from_name(image_path.stem)
+
+
+def test_pack_unpack_round_trip(tmp_path: Path) -> None:
+    pack_images(IMAGES_FOLDER, tmp_path / 'Архив')
+
+    count_images = unpack_archive(tmp_path / 'Архив', tmp_path / 'Изображения')
+
+    assert count_images == len(IMAGE_PATHS)
+    unpacked_paths = sorted((tmp_path / 'Изображения').glob('*.bmp'))
+    assert [path.name for path in unpacked_paths] == [path.name for path in IMAGE_PATHS]
+    for unpacked_path, image_path in zip(unpacked_paths, IMAGE_PATHS, strict=True):
+        assert np.array_equal(read_image(unpacked_path), read_image(image_path))
+
+
+def test_gray_archive(tmp_path: Path) -> None:
+    pack_images(IMAGES_FOLDER, tmp_path / 'Архив', gray=True)
+
+    archive = open_frame_archive(tmp_path / 'Архив')
+
+    assert archive.frames.shape == (len(IMAGE_PATHS), 480, 640)
+    for frame, image_path in zip(archive.frames, IMAGE_PATHS, strict=True):
+        assert np.array_equal(frame, cv2.cvtColor(read_image(image_path), cv2.COLOR_BGR2GRAY))
+
+
+def test_cropped_archive_keeps_detection(tmp_path: Path) -> None:
+    pack_images(IMAGES_FOLDER, tmp_path / 'Архив', gray=True, crop_dial=True)
+
+    archive = open_frame_archive(tmp_path / 'Архив')
+
+    assert archive.dial is not None
+    assert archive.frames.shape[1:] < (480, 640)
+    for frame, image_path in zip(archive.frames, IMAGE_PATHS, strict=True):
+        result = detect_time_from_image(frame, dial=archive.dial)
+        assert result == detect_time_from_image(read_image(image_path), dial=CALIBRATED_DIAL)
+
+
+def test_archive_frames_in_pipeline(tmp_path: Path) -> None:
+    archive_folder = tmp_path / 'Архив'
+    pack_images(IMAGES_FOLDER, archive_folder, gray=True, crop_dial=True)
+    archive = open_frame_archive(archive_folder)
+
+    frames = prefetch_archive(archive_folder, None, list(range(len(archive))))
+    assert all(frame.image is None and frame.frame_index is not None for frame in frames)
+    frames = detect_frames(
+        frames, tmp_path / 'По шагам', DebugSettings(), False, archive.dial, archive_folder
+    )
+
+    for index, frame in enumerate(frames):
+        assert frame.name == archive.names[index]
+        assert frame.expected_time == archive.expected_time(index)
+        assert frame.detection is not None
+        expected = detect_time_from_image(archive.frames[index], dial=archive.dial)
+        assert frame.detection.clock_time == expected
@@ -0,0 +1,101 @@
+import struct
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+import pytest
+from cv2.typing import MatLike
+
+from test_clock_detection.image_reader import (
+    decode_bmp,
+    decode_image,
+    read_bmp,
+    read_image,
+    read_image_data,
+)
+
+
+def _imread(image_path: Path) -> MatLike:
+    return cv2.imread(image_path.as_posix(), cv2.IMREAD_COLOR)
+
+
+def _random_image(height: int, width: int, channels: int) -> npt.NDArray[np.uint8]:
+    generator = np.random.default_rng(height * width * channels)
+    return generator.integers(0, 256, (height, width, channels), dtype=np.uint8)
+
+
+def _top_down_bmp(image: npt.NDArray[np.uint8]) -> bytes:
+    """Несжатый 24-битный BMP, строки которого хранятся сверху вниз (отрицательная высота)"""
+    height, width = image.shape[:2]
+    row_stride = (width * 3 + 3) // 4 * 4
+    rows = np.zeros((height, row_stride), dtype=np.uint8)
+    rows[:, : width * 3] = image.reshape(height, width * 3)
+    file_header = struct.pack('<2sI4xI', b'BM', 54 + rows.nbytes, 54)
+    info_header = struct.pack('<IiiHHIIiiII', 40, width, -height, 1, 24, 0, rows.nbytes, 0, 0, 0, 0)
+    return file_header + info_header + rows.tobytes()
+
+
+def test_read_bmp_equals_imread(image_path: Path) -> None:
+    image = read_bmp(image_path)
+
+    assert image is not None
+    assert not image.flags.writeable
+    assert np.array_equal(image, _imread(image_path))
+
+
+@pytest.mark.parametrize('memory_map', [True, False])
+def test_decode_image_equals_imread(image_path: Path, memory_map: bool) -> None:
+    data = read_image_data(image_path, memory_map)
+
+    assert np.array_equal(decode_image(data, memory_map), _imread(image_path))
+    assert np.array_equal(read_image(image_path, memory_map), _imread(image_path))
+
+
+@pytest.mark.parametrize(('height', 'width'), [(7, 13), (5, 16), (1, 1)])
+@pytest.mark.parametrize('channels', [3, 4])
+def test_padded_rows_and_32_bit_pixels(
+    tmp_path: Path, height: int, width: int, channels: int
+) -> None:
+    image_path = tmp_path / 'Изображение.bmp'
+    cv2.imwrite(image_path.as_posix(), _random_image(height, width, channels))
+
+    image = read_bmp(image_path)
+
+    assert image is not None
+    assert np.array_equal(image, _imread(image_path))
+
+
+def test_top_down_rows(tmp_path: Path) -> None:
+    expected = _random_image(6, 11, 3)
+    image_path = tmp_path / 'Изображение.bmp'
+    image_path.write_bytes(_top_down_bmp(expected))
+
+    image = read_bmp(image_path)
+
+    assert image is not None
+    assert np.array_equal(image, expected)
+    assert np.array_equal(image, _imread(image_path))
+
+
+def test_unsupported_files_fall_back_to_opencv(tmp_path: Path) -> None:
+    gray_path = tmp_path / 'Серое.bmp'
+    cv2.imwrite(gray_path.as_posix(), _random_image(8, 8, 1))
+    png_path = tmp_path / 'Сжатое.bmp'
+    png_path.write_bytes(cv2.imencode('.png', _random_image(8, 8, 3))[1].tobytes())
+
+    for image_path in (gray_path, png_path):
+        assert read_bmp(image_path) is None
+        assert np.array_equal(read_image(image_path), _imread(image_path))
+        data = read_image_data(image_path)
+        assert np.array_equal(decode_image(data), _imread(image_path))
+
+
+def test_truncated_file_is_not_decoded(tmp_path: Path, image_path: Path) -> None:
+    data = np.fromfile(image_path, dtype=np.uint8)
+
+    assert decode_bmp(data[:-1]) is None
+    assert decode_bmp(data[:20]) is None
+    truncated_path = tmp_path / 'Обрезанное.bmp'
+    truncated_path.write_bytes(b'BM')
+    assert read_bmp(truncated_path) is None
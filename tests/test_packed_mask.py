@@ -0,0 +1,49 @@
+import numpy as np
+import numpy.typing as npt
+from cv2.typing import MatLike
+
+from test_clock_detection.detect_time import IMAGE_CENTER, detect_time_batch
+from test_clock_detection.ray_grid import PackedMask, make_ray_grid
+from tests.samples import IMAGE_PATHS, read_gray
+
+
+def test_round_trip(image_binary: MatLike) -> None:
+    mask = PackedMask.from_image(image_binary)
+
+    assert mask.bits.nbytes == -(-image_binary.size // 8)
+    assert np.array_equal(mask.to_image(), image_binary)
+
+
+def test_round_trip_batch(image_binary: MatLike) -> None:
+    batch = np.stack([image_binary, np.zeros_like(image_binary), image_binary[::-1]])
+
+    mask = PackedMask.from_image(batch)
+
+    assert len(mask) == 3
+    assert np.array_equal(mask.to_image(), batch)
+    assert np.array_equal(mask[2].to_image(), batch[2])
+
+
+def test_count_matches_packed_equals_unpacked(image_binary: MatLike) -> None:
+    height, width = image_binary.shape
+    mask = PackedMask.from_image(image_binary)
+    for center in (IMAGE_CENTER, (20, 460)):
+        grid = make_ray_grid((height, width), center, 1, 0, 200)
+        rows, _ = grid.angle_window(0, 10)
+
+        assert np.array_equal(grid.count_matches(mask), grid.count_matches(image_binary))
+        assert np.array_equal(
+            grid.count_matches(mask, rows=rows), grid.count_matches(image_binary, rows=rows)
+        )
+
+
+def test_detect_time_batch_packed_equals_unpacked() -> None:
+    images_gray: npt.NDArray[np.uint8] = np.stack([
+        read_gray(image_path) for image_path in IMAGE_PATHS
+    ])
+
+    packed_times, packed_matches = detect_time_batch(images_gray, packed=True)
+    times, matches = detect_time_batch(images_gray, packed=False)
+
+    assert packed_times == times
+    assert np.array_equal(packed_matches.match_values, matches.match_values)
@@ -0,0 +1,107 @@
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+import pytest
+
+from test_clock_detection.const import FAIL_DELTA_THRESHOLD_SECONDS
+from test_clock_detection.detect_time import (
+    CALIBRATED_DIAL,
+    DEFAULT_DETECT_PARAMS,
+    DetectParams,
+    detect_time_from_image,
+)
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.parameter_sweep import (
+    SweepResult,
+    fastest_meeting_bar,
+    make_param_grid,
+    run_sweep,
+    share_frames,
+)
+from test_clock_detection.utils import check_result, expected_time_from_name
+from tests.samples import IMAGE_PATHS, read_gray
+
+
+def test_param_grid_contains_all_combinations() -> None:
+    grid = make_param_grid({'binary_threshold': [150, 170, 190], 'min_angle_diff_deg': [3.0, 5.0]})
+
+    assert len(grid) == 6
+    assert {(params.binary_threshold, params.min_angle_diff_deg) for params in grid} == {
+        (threshold, diff) for threshold in (150, 170, 190) for diff in (3.0, 5.0)
+    }
+    assert all(params.max_len_line_pix == DEFAULT_DETECT_PARAMS.max_len_line_pix for params in grid)
+
+
+def test_random_param_grid_is_reproducible_subset() -> None:
+    values = {'binary_threshold': list(range(100, 200, 10)), 'min_len_line_pix': [20, 30, 40]}
+    grid = make_param_grid(values)
+
+    sample = make_param_grid(values, count_random=5, seed=1)
+
+    assert len(set(sample)) == 5
+    assert set(sample) <= set(grid)
+    assert make_param_grid(values, count_random=5, seed=1) == sample
+    assert make_param_grid(values, count_random=100) == grid
+
+
+def test_shared_frames_are_gray_and_released() -> None:
+    images = [read_image(image_path) for image_path in IMAGE_PATHS]
+
+    with share_frames(images, (len(images), 480, 640)) as shared:
+        memory = SharedMemory(name=shared.memory_name)
+        frames: npt.NDArray[np.uint8] = np.ndarray(shared.shape, dtype=np.uint8, buffer=memory.buf)
+        for frame, image in zip(frames, images, strict=True):
+            assert np.array_equal(frame, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        del frames
+        memory.close()
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=shared.memory_name)
+
+
+def test_shared_frames_must_have_same_size() -> None:
+    images = [read_gray(IMAGE_PATHS[0]), read_gray(IMAGE_PATHS[1])[:240]]
+
+    with pytest.raises(AssertionError), share_frames(images, (2, 480, 640)):
+        pass
+
+
+def test_sweep_equals_direct_detection() -> None:
+    images = [read_gray(image_path) for image_path in IMAGE_PATHS]
+    expected_times = [expected_time_from_name(image_path.stem) for image_path in IMAGE_PATHS]
+    param_grid = make_param_grid({'binary_threshold': [150, 190]})
+
+    with share_frames(images, (len(images), 480, 640)) as shared:
+        results = run_sweep(
+            shared, expected_times, param_grid, CALIBRATED_DIAL, jobs=2, chunk_size=3
+        )
+
+    assert [result.params for result in results] == param_grid
+    for result in results:
+        assert result.cpu_ms > 0
+        assert result.errors_sec == [
+            check_result(
+                expected_time,
+                datetime.strptime(
+                    str(detect_time_from_image(image, dial=CALIBRATED_DIAL, params=result.params)),
+                    '%H:%M:%S.%f',
+                ),
+                FAIL_DELTA_THRESHOLD_SECONDS,
+            )[0]
+            for image, expected_time in zip(images, expected_times, strict=True)
+        ]
+
+
+def test_fastest_meeting_bar() -> None:
+    accurate = SweepResult(DetectParams(binary_threshold=150), [0.1, 0.2, 0.4, 0.5], cpu_ms=40)
+    fast = SweepResult(DetectParams(binary_threshold=170), [0.1, 0.2, 0.3, 2.0], cpu_ms=20)
+    fastest = SweepResult(DetectParams(binary_threshold=190), [0.1, 3.0, 4.0, 5.0], cpu_ms=10)
+    results = [accurate, fast, fastest]
+
+    assert fastest_meeting_bar(results, 0.5, 100) is accurate
+    assert fastest_meeting_bar(results, 0.5, 75) is fast
+    assert fastest_meeting_bar(results, 0.5, 25) is fastest
+    assert fastest_meeting_bar(results, 0.1, 50) is None
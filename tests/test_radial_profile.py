@@ -0,0 +1,173 @@
+import cv2
+import numpy as np
+import pytest
+from cv2.typing import MatLike, Point
+
+from test_clock_detection.data_types import Line
+from test_clock_detection.detect_time import BINARY_THRESHOLD, IMAGE_CENTER, _classify_hands
+from test_clock_detection.ray_grid import (
+    PROFILE_FIRST_HIT,
+    PROFILE_MATCHES,
+    PROFILE_MAX_THICKNESS_DEG,
+    PROFILE_THICKNESS,
+    RadialProfile,
+    RayGrid,
+    get_ray_grid,
+    make_ray_grid,
+)
+from test_clock_detection.utils import polar_to_cartesian
+from tests.samples import IMAGE_PATHS, read_gray
+
+
+def _ray_hits(image: MatLike, image_center: Point, angle_deg: float, radii: range) -> list[bool]:
+    """Поточечная выборка пикселей луча, как в исходной реализации ``_find_line``"""
+    hits = []
+    for radius in radii:
+        x, y = polar_to_cartesian(angle_deg, radius, image_center, 90)
+        try:
+            hits.append(bool(image[y][x] == 255))
+        except IndexError:
+            hits.append(False)
+    return hits
+
+
+def _longest_run(hits: list[bool]) -> int:
+    longest = current = 0
+    for hit in hits:
+        current = current + 1 if hit else 0
+        longest = max(longest, current)
+    return longest
+
+
+def _thickness_per_angle(match_values: list[int], grid: RayGrid) -> list[int]:
+    """Поточечный подсчет соседних углов подряд с не меньше чем половиной совпадений"""
+    unique_values = match_values[:-1]
+    count_angles = len(unique_values)
+    max_offset = int(PROFILE_MAX_THICKNESS_DEG / 2 / grid.angle_spacing_deg)
+    thickness = []
+    for index, value in enumerate(unique_values):
+        if value == 0:
+            thickness.append(0)
+            continue
+        width = 1
+        for direction in (1, -1):
+            for offset in range(1, max_offset + 1):
+                if 2 * unique_values[(index + direction * offset) % count_angles] < value:
+                    break
+                width += 1
+        thickness.append(width)
+    return [*thickness, thickness[0]]
+
+
+def _profile_per_ray(
+    image: MatLike, grid: RayGrid, image_center: Point, max_len_line_pix: int
+) -> list[list[int]]:
+    radii = range(grid.min_radius_pix, max_len_line_pix)
+    rows = []
+    for angle_deg in grid.angles_deg:
+        hits = _ray_hits(image, image_center, angle_deg, radii)
+        hit_radii = [radius for radius, hit in zip(radii, hits, strict=True) if hit]
+        rows.append([
+            len(hit_radii),
+            hit_radii[0] if hit_radii else -1,
+            hit_radii[-1] if hit_radii else -1,
+            _longest_run(hits),
+        ])
+    thickness = _thickness_per_angle([row[PROFILE_MATCHES] for row in rows], grid)
+    return [[*row, width] for row, width in zip(rows, thickness, strict=True)]
+
+
+def _assert_profile_equals_per_ray_loop(
+    image_binary: MatLike, image_center: Point, min_len_line_pix: int, max_len_line_pix: int
+) -> None:
+    height, width = image_binary.shape
+    grid = make_ray_grid((height, width), image_center, 2, min_len_line_pix, max_len_line_pix)
+
+    profile = grid.radial_profile(image_binary)
+
+    expected = _profile_per_ray(image_binary, grid, image_center, max_len_line_pix)
+    assert profile.values.tolist() == expected
+    assert profile.match_values.tolist() == grid.count_matches(image_binary).tolist()
+
+
+def test_radial_profile_equals_per_ray_loop(image_binary: MatLike) -> None:
+    _assert_profile_equals_per_ray_loop(image_binary, IMAGE_CENTER, 0, 200)
+
+
+@pytest.mark.parametrize(
+    ('image_center', 'min_len_line_pix', 'max_len_line_pix'),
+    [(IMAGE_CENTER, 30, 320), ((20, 460), 0, 200)],
+    ids=['beyond-edges', 'corner'],
+)
+def test_radial_profile_beyond_image_equals_per_ray_loop(
+    image_center: Point, min_len_line_pix: int, max_len_line_pix: int
+) -> None:
+    image_gray = read_gray(IMAGE_PATHS[0])
+    image_binary = cv2.threshold(image_gray, BINARY_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+
+    _assert_profile_equals_per_ray_loop(
+        image_binary, image_center, min_len_line_pix, max_len_line_pix
+    )
+
+
+def test_radial_profile_batch_equals_single_images(image_binary: MatLike) -> None:
+    height, width = image_binary.shape
+    grid = get_ray_grid((height, width), IMAGE_CENTER, 1, 0, 200)
+    batch = np.stack([image_binary, cv2.bitwise_not(image_binary)])
+    out = np.full((2, len(grid.angles_deg), 5), 7, dtype=np.int32)
+
+    profile = grid.radial_profile(batch, out=out)
+
+    assert profile.values is out
+    for index in range(len(batch)):
+        assert profile[index].values.tolist() == grid.radial_profile(batch[index]).values.tolist()
+
+
+def test_nearest_row_prefers_better_neighbour() -> None:
+    angles_deg = np.linspace(0, 360, 361)
+    values = np.zeros((361, 5), dtype=np.int32)
+    values[[10, 11, 359], PROFILE_MATCHES] = [5, 8, 3]
+    profile = RadialProfile(values=values, angles_deg=angles_deg)
+
+    assert profile.nearest_row(10.4) == 11
+    assert profile.nearest_row(9.6) == 10
+    # Угол 360 совпадает с углом 0
+    assert profile.nearest_row(359.5) == 359
+    assert profile.nearest_row(360.2) == 0
+
+
+def test_classify_hands_by_thickness() -> None:
+    image = np.zeros((480, 640), dtype=np.uint8)
+    # Часовая - толстая и короткая, минутная - средняя, секундная - тонкая и длинная
+    hands = {'hours': (75.0, 110, 9), 'minutes': (200.0, 170, 5), 'seconds': (310.0, 190, 1)}
+    for angle_deg, length, thickness in hands.values():
+        end = polar_to_cartesian(angle_deg, length, IMAGE_CENTER, 90)
+        cv2.line(image, IMAGE_CENTER, end, (255,), thickness)
+    grid = get_ray_grid((480, 640), IMAGE_CENTER, 1, 0, 200)
+    profile = grid.radial_profile(image)
+    lines = sorted(
+        (
+            Line(
+                name,
+                IMAGE_CENTER,
+                angle_deg,
+                200,
+                int(profile.match_values[profile.nearest_row(angle_deg)]),
+            )
+            for name, (angle_deg, _, _) in hands.items()
+        ),
+        key=lambda line: -line.match_value,
+    )
+
+    hours_arrow, minutes_arrow, seconds_arrow = _classify_hands(lines, profile, 1)
+
+    assert [hours_arrow.name, minutes_arrow.name, seconds_arrow.name] == list(hands)
+    arrows = (hours_arrow, minutes_arrow, seconds_arrow)
+    for arrow, (_, length, thickness) in zip(arrows, hands.values(), strict=True):
+        # Концы толстых линий скруглены на половину толщины
+        assert abs(arrow.len_line - length) <= thickness // 2 + 1
+    hours_row, minutes_row, seconds_row = (
+        profile.values[profile.nearest_row(angle_deg)] for angle_deg, _, _ in hands.values()
+    )
+    assert hours_row[PROFILE_THICKNESS] > minutes_row[PROFILE_THICKNESS] > 1
+    assert seconds_row[PROFILE_FIRST_HIT] == 0
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+import pytest
+from cv2.typing import MatLike, Point
+
+from test_clock_detection.detect_time import IMAGE_CENTER
+from test_clock_detection.ray_grid import get_ray_grid, make_ray_grid
+from test_clock_detection.utils import polar_to_cartesian
+
+
+def _find_line_per_pixel(
+    image: MatLike,
+    image_center: Point,
+    angle_step_deg: float,
+    min_len_line_pix: int,
+    max_len_line_pix: int,
+) -> list[int]:
+    """
+    Поточечный подсчет совпадений вдоль лучей, как в исходной реализации ``_find_line``
+
+    :param image: одноканальное бинарное изображение
+    :param image_center: координаты центра циферблата
+    :param angle_step_deg: шаг поиска линии
+    :param min_len_line_pix: минимальная длина линии
+    :param max_len_line_pix: максимальная длина линии
+    :return: количество белых пикселей для каждого угла
+    """
+    match_values = []
+    for theta in np.linspace(start=0, stop=360, num=int(360 // angle_step_deg)):
+        color_pixels = 0
+        for radius in range(min_len_line_pix, max_len_line_pix):
+            x, y = polar_to_cartesian(theta, radius, image_center, 90)
+            try:
+                if image[y][x] == 255:
+                    color_pixels += 1
+            except IndexError:
+                continue
+        match_values.append(color_pixels)
+    return match_values
+
+
+@pytest.mark.parametrize(
+    ('image_center', 'min_len_line_pix', 'max_len_line_pix'),
+    [(IMAGE_CENTER, 0, 200), (IMAGE_CENTER, 30, 320), ((20, 460), 0, 200)],
+    ids=['dial', 'beyond-edges', 'corner'],
+)
+def test_count_matches_equals_per_pixel_loop(
+    image_binary: MatLike, image_center: Point, min_len_line_pix: int, max_len_line_pix: int
+) -> None:
+    height, width = image_binary.shape
+    grid = make_ray_grid((height, width), image_center, 2, min_len_line_pix, max_len_line_pix)
+
+    expected = _find_line_per_pixel(
+        image_binary, image_center, 2, min_len_line_pix, max_len_line_pix
+    )
+    assert grid.count_matches(image_binary).tolist() == expected
+
+
+def test_count_matches_rows_equals_all_rows(image_binary: MatLike) -> None:
+    height, width = image_binary.shape
+    grid = make_ray_grid((height, width), (20, 460), 1, 0, 200)
+    rows, _ = grid.angle_window(0, 10)
+
+    all_rows = grid.count_matches(image_binary)
+    assert grid.count_matches(image_binary, rows=rows).tolist() == all_rows[rows].tolist()
+
+
+def test_count_matches_batch_equals_single_images(image_binary: MatLike) -> None:
+    height, width = image_binary.shape
+    grid = get_ray_grid((height, width), IMAGE_CENTER, 1, 0, 200)
+    batch = np.stack([image_binary, cv2.bitwise_not(image_binary)])
+
+    match_values = grid.count_matches(batch)
+    assert match_values[0].tolist() == grid.count_matches(image_binary).tolist()
+    assert match_values[1].tolist() == grid.count_matches(batch[1]).tolist()
+
+
+def test_angle_window_wraps_around_zero() -> None:
+    grid = make_ray_grid((480, 640), IMAGE_CENTER, 1, 0, 200)
+
+    rows, first_angle_deg = grid.angle_window(0, 2.5)
+
+    spacing_deg = grid.angle_spacing_deg
+    assert first_angle_deg == pytest.approx(-2 * spacing_deg)
+    assert rows.tolist() == [len(grid.angles_deg) - 3, len(grid.angles_deg) - 2, 0, 1, 2]
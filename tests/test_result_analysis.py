@@ -0,0 +1,119 @@
+import json
+import math
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from test_clock_detection.const import CALCULATED_ERRORS, ERROR_PERCENTILES
+from test_clock_detection.data_types import ErrorSummary
+from test_clock_detection.result_analysis import (
+    ErrorSketch,
+    TimingSketch,
+    _take_result_from_store,
+    summarize_errors,
+)
+from test_clock_detection.results_store import ResultsStore
+from tests.samples import make_test_results
+
+
+def _errors_sec(count: int, seed: int) -> list[float]:
+    """Погрешности, округленные до 0.1 с, как в ``check_result``"""
+    generator = random.Random(seed)
+    return [round(generator.expovariate(3), 1) for _ in range(count)]
+
+
+def _nearest_rank(values: list[float], percentile: int) -> float:
+    rank = max(1, math.ceil(percentile / 100 * len(values)))
+    return sorted(values)[rank - 1]
+
+
+def _assert_same_summary(summary: ErrorSummary, expected: ErrorSummary) -> None:
+    assert summary.count == expected.count
+    assert summary.mean_sec == pytest.approx(expected.mean_sec)
+    assert summary.max_sec == expected.max_sec
+    assert summary.counts_within == expected.counts_within
+    assert summary.percentiles_sec == expected.percentiles_sec
+
+
+def test_summarize_errors_equals_direct_count() -> None:
+    errors = _errors_sec(1000, seed=1)
+
+    summary = summarize_errors(errors, CALCULATED_ERRORS)
+
+    assert summary.count == len(errors)
+    assert summary.mean_sec == pytest.approx(sum(errors) / len(errors))
+    assert summary.max_sec == max(errors)
+    assert summary.counts_within == {
+        limit: sum(error <= limit for error in errors) for limit in CALCULATED_ERRORS
+    }
+    assert summary.percentiles_sec == {
+        percentile: _nearest_rank(errors, percentile) for percentile in ERROR_PERCENTILES
+    }
+
+
+def test_error_sketch_equals_exact_summary() -> None:
+    errors = _errors_sec(1000, seed=2)
+    sketch = ErrorSketch()
+    sketch.update(errors)
+
+    summary = sketch.summarize(CALCULATED_ERRORS)
+
+    _assert_same_summary(summary, summarize_errors(errors, CALCULATED_ERRORS))
+
+
+def test_error_sketch_merge_equals_single_sketch() -> None:
+    errors = _errors_sec(1000, seed=3)
+    whole = ErrorSketch()
+    whole.update(errors)
+    parts = [ErrorSketch() for _ in range(3)]
+    for index, error in enumerate(errors):
+        parts[index % 3].add(error)
+
+    merged = ErrorSketch()
+    for part in parts:
+        # Гистограммы частей передаются между машинами в JSON
+        merged.merge(ErrorSketch.from_dict(json.loads(json.dumps(part.to_dict()))))
+
+    assert merged.bucket_counts == whole.bucket_counts
+    assert merged.count == whole.count
+    assert merged.total_sec == pytest.approx(whole.total_sec)
+    assert merged.max_sec == whole.max_sec
+    _assert_same_summary(merged.summarize(CALCULATED_ERRORS), whole.summarize(CALCULATED_ERRORS))
+
+
+def test_error_sketch_merge_requires_same_resolution() -> None:
+    with pytest.raises(AssertionError):
+        ErrorSketch(0.1).merge(ErrorSketch(0.5))
+
+
+def test_timing_sketch_percentiles_within_relative_accuracy() -> None:
+    generator = random.Random(4)
+    timings_ms = [generator.lognormvariate(3, 1) for _ in range(2000)]
+    sketch = TimingSketch()
+    for timing_ms in timings_ms:
+        sketch.add(timing_ms)
+
+    percentiles = sketch.percentiles([50, 95, 99])
+
+    for percentile, value_ms in percentiles.items():
+        exact_ms = float(np.percentile(timings_ms, percentile, method='inverted_cdf'))
+        assert value_ms == pytest.approx(exact_ms, rel=sketch.relative_accuracy)
+
+
+def test_take_result_from_store(tmp_path: Path) -> None:
+    results = make_test_results()
+    path = tmp_path / 'Результаты.jsonl'
+    with ResultsStore(path) as store:
+        for result in results:
+            store.append(result)
+
+    error_sketch, stage_sketches = _take_result_from_store(path)
+
+    errors = [result.detect_result.error_sec for result in results]
+    _assert_same_summary(
+        error_sketch.summarize(CALCULATED_ERRORS), summarize_errors(errors, CALCULATED_ERRORS)
+    )
+    assert list(stage_sketches) == ['Поиск линий']
+    assert stage_sketches['Поиск линий'].count == len(results)
@@ -0,0 +1,125 @@
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from test_clock_detection import result_cache
+from test_clock_detection.data_types import ClockTime, Detection
+from test_clock_detection.image_reader import read_image_data
+from test_clock_detection.pipeline_stages import prefetch_images
+from test_clock_detection.result_cache import ResultCache, algorithm_fingerprint
+from tests.samples import IMAGE_PATHS
+
+DETECTION = Detection(
+    clock_time=ClockTime(hours=2, minutes=37, seconds=20, ms=411),
+    hand_angles_deg=[78.5, 222.1, 122.5],
+    match_values=[150, 90, 60],
+)
+"""Результат алгоритма для сохранения в кэш"""
+
+
+@pytest.fixture(autouse=True)
+def _fresh_fingerprint() -> Iterator[None]:
+    """Отпечаток алгоритма пересчитывается в каждом тесте и после него"""
+    algorithm_fingerprint.cache_clear()
+    yield
+    algorithm_fingerprint.cache_clear()
+
+
+def test_key_depends_only_on_file_content(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path)
+    keys = [cache.make_key(read_image_data(image_path)) for image_path in IMAGE_PATHS]
+
+    assert len(set(keys)) == len(IMAGE_PATHS)
+    copy_path = tmp_path / 'Копия.bmp'
+    copy_path.write_bytes(IMAGE_PATHS[0].read_bytes())
+    assert cache.make_key(read_image_data(copy_path)) == keys[0]
+    assert cache.make_key(read_image_data(IMAGE_PATHS[0], memory_map=False)) == keys[0]
+
+
+@pytest.mark.parametrize(
+    ('constant', 'value'), [('RESULT_CACHE_VERSION', 2), ('ANGLE_STEP_SCHEDULE_DEG', (1, 0.5))]
+)
+def test_key_changes_with_parameters(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, constant: str, value: object
+) -> None:
+    cache = ResultCache(tmp_path)
+    image_data = read_image_data(IMAGE_PATHS[0])
+    key = cache.make_key(image_data)
+
+    monkeypatch.setattr(result_cache, constant, value)
+    algorithm_fingerprint.cache_clear()
+
+    assert cache.make_key(image_data) != key
+
+
+def test_key_changes_with_algorithm_source(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = ResultCache(tmp_path)
+    image_data = read_image_data(IMAGE_PATHS[0])
+    key = cache.make_key(image_data)
+    read_bytes = Path.read_bytes
+
+    def read_changed_source(path: Path) -> bytes:
+        data = read_bytes(path)
+        return data + b'\n# changed\n' if path.name == 'detect_time.py' else data
+
+    monkeypatch.setattr(Path, 'read_bytes', read_changed_source)
+    algorithm_fingerprint.cache_clear()
+
+    assert cache.make_key(image_data) != key
+
+
+def test_put_and_get(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path)
+    key = cache.make_key(read_image_data(IMAGE_PATHS[0]))
+
+    assert cache.get(key) is None
+    cache.put(key, DETECTION)
+    assert cache.get(key) == DETECTION
+    assert ResultCache(tmp_path).get(key) == DETECTION
+
+
+def test_damaged_entry_is_missing(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path)
+    cache.put('ab01', DETECTION)
+    entry_path = next(tmp_path.glob('*/*.json'))
+
+    entry_path.write_text('{"clock_time"', encoding='utf-8')
+    assert cache.get('ab01') is None
+
+    entry_path.write_text('{"version": 2}', encoding='utf-8')
+    assert cache.get('ab01') is None
+
+
+def test_evict_removes_least_recently_used(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path)
+    keys = ['aa01', 'bb02', 'cc03']
+    for index, key in enumerate(keys):
+        cache.put(key, DETECTION)
+        entry_path = tmp_path / key[:2] / f'{key}.json'
+        os.utime(entry_path, (1000 + index, 1000 + index))
+    # Чтение отмечает результат как недавно использованный
+    assert cache.get(keys[0]) == DETECTION
+    entry_size = (tmp_path / 'aa' / 'aa01.json').stat().st_size
+
+    cache.max_size_bytes = 2 * entry_size
+
+    assert cache.evict() == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == DETECTION
+    assert cache.get(keys[2]) == DETECTION
+
+
+def test_prefetch_skips_decoding_of_cached_images(tmp_path: Path) -> None:
+    frames = prefetch_images(IMAGE_PATHS[:2], tmp_path)
+    assert all(frame.image is not None and frame.detection is None for frame in frames)
+    ResultCache(tmp_path).put(frames[0].cache_key, DETECTION)
+
+    frames = prefetch_images(IMAGE_PATHS[:2], tmp_path)
+
+    assert frames[0].detection == DETECTION
+    assert frames[0].image is None
+    assert frames[0].read_timing is None
+    assert frames[1].detection is None
+    assert frames[1].image is not None
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from test_clock_detection.results_store import ResultsStore, read_results
+from tests.samples import make_test_results
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    results = make_test_results()
+    path = tmp_path / 'Результаты.jsonl'
+
+    with ResultsStore(path) as store:
+        for result in results:
+            store.append(result)
+
+    assert list(read_results(path)) == results
+    assert len(path.read_text(encoding='utf-8').splitlines()) == len(results)
+
+
+def test_results_written_in_batches(tmp_path: Path) -> None:
+    results = make_test_results()
+    path = tmp_path / 'Результаты.jsonl'
+    store = ResultsStore(path, flush_every=4)
+
+    for result in results[:3]:
+        store.append(result)
+    assert list(read_results(path)) == []
+
+    store.append(results[3])
+    assert list(read_results(path)) == results[:4]
+
+    store.append(results[4])
+    store.close()
+    assert list(read_results(path)) == results[:5]
+
+
+def test_append_keeps_previous_results(tmp_path: Path) -> None:
+    results = make_test_results()
+    path = tmp_path / 'Результаты.jsonl'
+    with ResultsStore(path) as store:
+        store.append(results[0])
+
+    with ResultsStore(path, append=True) as store:
+        store.append(results[1])
+    assert list(read_results(path)) == results[:2]
+
+    with ResultsStore(path) as store:
+        store.append(results[2])
+    assert list(read_results(path)) == results[2:3]
+
+
+def test_blank_lines_are_skipped(tmp_path: Path) -> None:
+    results = make_test_results()[:2]
+    path = tmp_path / 'Результаты.jsonl'
+    with ResultsStore(path) as store:
+        store.append(results[0])
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('\n')
+    with ResultsStore(path, append=True) as store:
+        store.append(results[1])
+
+    assert list(read_results(path)) == results
@@ -0,0 +1,111 @@
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from test_clock_detection.const import CALCULATED_ERRORS
+from test_clock_detection.result_analysis import summarize_errors
+from test_clock_detection.results_store import ResultsStore
+from test_clock_detection.run_history import RunHistory, RunSummary, find_regressions, summarize_run
+from tests.samples import IMAGE_PATHS, make_test_results
+
+REPO_ROOT = Path(__file__).parents[1]
+"""Корневая папка проекта"""
+
+
+def _run(
+    count: int, percent_within_05: float, run_id: str = '20240101-000000-000000'
+) -> RunSummary:
+    """Запуск, обработавший ``count`` изображений за секунду"""
+    return RunSummary(
+        run_id=run_id,
+        git_revision=None,
+        git_dirty=False,
+        algorithm_fingerprint='0' * 32,
+        parameters={'jobs': 4},
+        count=count,
+        count_from_cache=0,
+        wall_sec=1,
+        latency_percentiles_ms={50: 10.0, 95: 12.5},
+        mean_error_sec=0.3,
+        max_error_sec=1.8,
+        percent_within={0.5: percent_within_05, 1: 100},
+    )
+
+
+def _write_results(path: Path) -> None:
+    results = make_test_results()
+    results[0] = replace(results[0], from_cache=True)
+    with ResultsStore(path) as store:
+        for result in results:
+            store.append(result)
+
+
+def test_summarize_run(tmp_path: Path) -> None:
+    results_path = tmp_path / 'Результаты.jsonl'
+    _write_results(results_path)
+
+    summary, image_errors = summarize_run(results_path, 2.0, {'jobs': 4}, REPO_ROOT)
+
+    results = make_test_results()
+    errors_summary = summarize_errors(
+        [result.detect_result.error_sec for result in results], CALCULATED_ERRORS
+    )
+    assert summary.count == len(IMAGE_PATHS)
+    assert summary.count_from_cache == 1
+    assert summary.images_per_sec == len(IMAGE_PATHS) / 2
+    assert summary.mean_error_sec == pytest.approx(errors_summary.mean_sec)
+    assert summary.max_error_sec == errors_summary.max_sec
+    assert summary.percent_within == errors_summary.percent_within()
+    # Время этапов изображений из кэша не входит в задержку
+    assert summary.latency_percentiles_ms[50] == pytest.approx(10, rel=0.01)
+    assert summary.git_revision is not None
+    assert image_errors == {result.image_name: result.detect_result.error_sec for result in results}
+
+
+def test_summarize_run_outside_git(tmp_path: Path) -> None:
+    results_path = tmp_path / 'Результаты.jsonl'
+    _write_results(results_path)
+
+    summary, _ = summarize_run(results_path, 2.0, {}, tmp_path)
+
+    assert summary.git_revision is None
+    assert not summary.git_dirty
+
+
+def test_history_round_trip(tmp_path: Path) -> None:
+    history = RunHistory(tmp_path / 'История')
+    assert history.runs() == []
+    first = _run(100, 95, run_id='20240101-100000-000000')
+    second = _run(90, 94, run_id='20240102-100000-000000')
+
+    history.append(first, {'01:00:00.000': 0.1})
+    history.append(second, {'01:00:00.000': 0.4})
+
+    assert RunHistory(tmp_path / 'История').runs() == [first, second]
+    assert history.find('-1') == second
+    assert history.find('-2') == first
+    assert history.find('20240101') == first
+    assert history.image_errors(second.run_id) == {'01:00:00.000': 0.4}
+    for reference in ('-3', '2024', '20250101'):
+        with pytest.raises(AssertionError):
+            history.find(reference)
+
+
+@pytest.mark.parametrize(
+    ('new_count', 'new_percent', 'count_regressions'),
+    [(100, 95, 0), (90, 94, 0), (89, 95, 1), (100, 93.9, 1), (80, 90, 2)],
+)
+def test_regression_thresholds(new_count: int, new_percent: float, count_regressions: int) -> None:
+    # Допустимо снижение скорости на 10 % и процента уложившихся в погрешность на 1 пункт
+    regressions = find_regressions(_run(100, 95), _run(new_count, new_percent))
+
+    assert len(regressions) == count_regressions
+
+
+def test_regression_custom_tolerance() -> None:
+    base = _run(100, 95)
+    new = _run(85, 92)
+
+    assert find_regressions(base, new, throughput_tolerance=0.2, accuracy_tolerance_percent=3) == []
+    assert len(find_regressions(base, new, throughput_tolerance=0.1)) == 2
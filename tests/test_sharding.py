@@ -0,0 +1,125 @@
+from pathlib import Path
+
+import pytest
+
+from test_clock_detection.const import RESULTS_FILE_NAME
+from test_clock_detection.data_types import ImageTestResult
+from test_clock_detection.results_store import ResultsStore, read_results
+from test_clock_detection.sharding import (
+    CHECK_MERGED_FILE_NAME,
+    Shard,
+    check_shards,
+    find_shard_results,
+    merge_results,
+)
+from tests.samples import IMAGE_PATHS, make_test_results
+
+IMAGE_NAMES = [f'{hours:02}:{minutes:02}:17.250' for hours in range(12) for minutes in range(60)]
+"""Имена изображений для проверки разбиения"""
+
+
+def _write_shards(
+    folder: Path, results: list[ImageTestResult], count: int
+) -> dict[Shard, list[ImageTestResult]]:
+    shard_results = {}
+    for index in range(1, count + 1):
+        shard = Shard(index, count)
+        shard_results[shard] = [result for result in results if shard.contains(result.image_name)]
+        with ResultsStore(folder / shard.results_file_name) as store:
+            for result in shard_results[shard]:
+                store.append(result)
+    return shard_results
+
+
+@pytest.mark.parametrize('count', [1, 3, 7])
+def test_each_image_belongs_to_one_shard(count: int) -> None:
+    shards = [Shard(index, count) for index in range(1, count + 1)]
+
+    for image_name in IMAGE_NAMES:
+        assert sum(shard.contains(image_name) for shard in shards) == 1
+
+
+def test_shards_are_balanced() -> None:
+    shards = [Shard(index, 4) for index in range(1, 5)]
+
+    sizes = [sum(shard.contains(image_name) for image_name in IMAGE_NAMES) for shard in shards]
+
+    assert min(sizes) >= len(IMAGE_NAMES) / 4 * 0.8
+
+
+def test_shard_does_not_depend_on_interpreter_hash() -> None:
+    # Значение blake2b постоянно, поэтому части совпадают на всех машинах и во всех запусках
+    assert [image_name for image_name in IMAGE_NAMES[:12] if Shard(2, 3).contains(image_name)] == [
+        '00:00:17.250',
+        '00:01:17.250',
+        '00:04:17.250',
+        '00:05:17.250',
+        '00:08:17.250',
+        '00:10:17.250',
+    ]
+
+
+def test_parse_and_names() -> None:
+    shard = Shard.parse('2/5')
+
+    assert shard == Shard(2, 5)
+    assert str(shard) == '2/5'
+    assert shard.results_file_name == 'Результаты (часть 2 из 5).jsonl'
+    for text in ('0/3', '4/3', '2-3'):
+        with pytest.raises(AssertionError):
+            Shard.parse(text)
+
+
+def test_find_shard_results(tmp_path: Path) -> None:
+    _write_shards(tmp_path, make_test_results(), 3)
+    (tmp_path / RESULTS_FILE_NAME).touch()
+
+    assert find_shard_results(tmp_path) == [
+        tmp_path / Shard(index, 3).results_file_name for index in range(1, 4)
+    ]
+
+    (tmp_path / Shard(2, 3).results_file_name).unlink()
+    with pytest.raises(AssertionError, match=r'\[2\]'):
+        find_shard_results(tmp_path)
+
+    (tmp_path / Shard(2, 3).results_file_name).touch()
+    (tmp_path / Shard(1, 2).results_file_name).touch()
+    with pytest.raises(AssertionError):
+        find_shard_results(tmp_path)
+
+
+def test_merged_results_equal_full_run(tmp_path: Path) -> None:
+    results = make_test_results()
+    shard_results = _write_shards(tmp_path, results, 3)
+    merged_path = tmp_path / RESULTS_FILE_NAME
+
+    count_results = merge_results(find_shard_results(tmp_path), merged_path)
+
+    assert count_results == len(IMAGE_PATHS)
+    assert list(read_results(merged_path)) == [
+        result for shard_part in shard_results.values() for result in shard_part
+    ]
+    merged = sorted(read_results(merged_path), key=lambda result: result.image_name)
+    assert merged == sorted(results, key=lambda result: result.image_name)
+
+
+def test_merge_rejects_image_in_several_shards(tmp_path: Path) -> None:
+    results = make_test_results()
+    with ResultsStore(tmp_path / 'Первая.jsonl') as store:
+        store.append(results[0])
+    with ResultsStore(tmp_path / 'Вторая.jsonl') as store:
+        store.append(results[1])
+        store.append(results[0])
+
+    with pytest.raises(AssertionError, match='нескольких частях'):
+        merge_results(
+            [tmp_path / 'Первая.jsonl', tmp_path / 'Вторая.jsonl'], tmp_path / RESULTS_FILE_NAME
+        )
+
+
+def test_check_shards_matches_single_run(tmp_path: Path) -> None:
+    mismatches = check_shards(2, tmp_path)
+
+    assert mismatches == []
+    assert len(list(read_results(tmp_path / CHECK_MERGED_FILE_NAME))) == len(IMAGE_PATHS)
+    assert not (tmp_path / Shard(1, 2).results_file_name).exists()
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from test_clock_detection.benchmark import SyntheticClockParams, render_clock
+from test_clock_detection.data_types import ClockTime
+from test_clock_detection.detect_time import detect_time_from_image
+from test_clock_detection.image_reader import read_image
+from test_clock_detection.tracking import ClockTracker
+from test_clock_detection.utils import expected_time_from_name
+from tests.samples import IMAGE_PATHS
+
+
+def _clock_time(time: datetime) -> ClockTime:
+    return ClockTime(
+        hours=time.hour % 12, minutes=time.minute, seconds=time.second, ms=time.microsecond // 1000
+    )
+
+
+def _error_sec(result: ClockTime, expected: datetime) -> float:
+    result_dt = datetime.strptime(str(result), '%H:%M:%S.%f')
+    delta = abs((result_dt - expected.replace(year=1900, month=1, day=1)).total_seconds())
+    return min(delta, 12 * 3600 - delta)
+
+
+def test_sequence_equals_single_image() -> None:
+    tracker = ClockTracker()
+    start = expected_time_from_name(IMAGE_PATHS[0].stem)
+    for image_path in IMAGE_PATHS:
+        image = read_image(image_path)
+        timestamp_ms = (expected_time_from_name(image_path.stem) - start).total_seconds() * 1000
+
+        assert tracker.detect(image, timestamp_ms) == detect_time_from_image(image)
+
+    # Первые три изображения сняты с интервалом 200 мс
+    assert tracker.tracked_count >= 2
+    assert tracker.full_search_count + tracker.tracked_count == len(IMAGE_PATHS)
+
+
+def test_gap_and_reset_use_full_search() -> None:
+    images = [read_image(image_path) for image_path in IMAGE_PATHS[:3]]
+    tracker = ClockTracker(max_frame_gap_ms=500)
+
+    tracker.detect(images[0], 0)
+    tracker.detect(images[1], 200)
+    assert (tracker.full_search_count, tracker.tracked_count) == (1, 1)
+
+    tracker.detect(images[2], 1000)
+    assert (tracker.full_search_count, tracker.tracked_count) == (2, 1)
+
+    tracker.reset()
+    tracker.detect(images[2], 1200)
+    assert (tracker.full_search_count, tracker.tracked_count) == (3, 1)
+
+
+def test_hands_keep_identities_when_crossing() -> None:
+    params = SyntheticClockParams()
+    tracker = ClockTracker()
+    # Секундная стрелка проходит минутную стрелку в 01:20:20
+    start = datetime(2000, 1, 1, 1, 20, 14)
+    results = []
+    for index in range(100):
+        time = start + timedelta(milliseconds=200 * index)
+        image = render_clock(_clock_time(time), params)
+        result = tracker.detect(image, 200 * index)
+        results.append((time, result))
+
+        seconds_angle_deg = (time.second + time.microsecond / 1e6) * 6
+        minutes_angle_deg = (time.minute + time.second / 60) * 6
+        if abs(seconds_angle_deg - minutes_angle_deg) < tracker.params.min_angle_diff_deg:
+            # Пока стрелки близко, кадр обрабатывается так же, как одиночное изображение
+            assert result == detect_time_from_image(image)
+
+    # После расхождения стрелок минутная стрелка не следует за секундной
+    assert tracker.tracked_count > 0
+    for time, result in results[-20:]:
+        assert _error_sec(result, time) < 1